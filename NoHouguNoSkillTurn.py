@@ -15,8 +15,8 @@ class NoHouguNoSkillTurn(Turn):
         logger.info(f'Turn {turn} Stage {self.stage} StageTurn {self.stageTurn} {[i[0]for i in self.servant]}')
         if self.stageTurn==1:Detect.cache.setupEnemyGird()
         self.enemy=[Detect.cache.getEnemyHp(i)for i in range(6)]
-        fgoDevice.device.perform(' ',(2100,))
-        fgoDevice.device.perform(self.selectCard(),(300,300,2300,1300,6000))
+        timing.perform(' ',(2100,),'attack')
+        timing.perform(self.selectCard(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
 
     @logit(logger,logging.INFO)
     def selectCard(self):
@@ -34,18 +34,12 @@ class NoHouguNoSkillTurn(Turn):
             self.enemy[self.target]=max(0,self.enemy[self.target]-48000)
             if any(self.enemy)and self.enemy[self.target]==0:self.target=next(i for i in range(5,-1,-1)if self.enemy[i])
 
-        def evaluate(card):
-            # 0: Represents the "Arts" card color.
-            # 1: Represents the "Quick" card color.
-            # 2: Represents the "Buster" card color.
-            mark = 0.
-            if group[card[0]] != group[card[1]]:
-                mark += 1
-            if group[card[1]] != group[card[2]]:
-                mark += 1
-            if color[card[0]] == 2:
-                mark *= 2
-            return mark
-
-        card=list(max(permutations(range(5),3),key=lambda x:evaluate(list(x))))
+        # Scores all 60 chains at once: +1 for each servant switch, doubled if a Buster card (color 2) goes first.
+        # 0: Represents the "Arts" card color.
+        # 1: Represents the "Quick" card color.
+        # 2: Represents the "Buster" card color.
+        card=fgoCardScore.CHAIN[0]
+        chainGroup=numpy.array(group)[card]
+        mark=(0.+(chainGroup[:,0]!=chainGroup[:,1])+(chainGroup[:,1]!=chainGroup[:,2]))*(1+(numpy.array(color)[card[:,0]]==2))
+        card=card[numpy.argmax(mark)].tolist()
         return''.join(['12345678'[i]for i in card+list({0,1,2,3,4}-set(card))])
@@ -26,11 +26,11 @@ class Summer890PPTurn(Turn):
                 self.castSingleOrNoTargetServantSkill(1, 1, 0)      # 汇呆2技能给1号位水摩根
                 self.castMasterSkill(0,)                                            # 御主礼装加攻击
 
-                fgoDevice.device.perform(' ',(2100,))
-                fgoDevice.device.perform(self.selectCard_s1_st1(),(300,300,2300,1300,6000))
+                timing.perform(' ',(2100,),'attack')
+                timing.perform(self.selectCard_s1_st1(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
             else:
-                fgoDevice.device.perform(' ',(2100,))
-                fgoDevice.device.perform(self.selectCard_s1_st2(),(300,300,2300,1300,6000))
+                timing.perform(' ',(2100,),'attack')
+                timing.perform(self.selectCard_s1_st2(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
         elif self.stage == 2:
             if self.stageTurn == 1:
                 self.castSingleOrNoTargetServantSkill(0, 2, 0)
@@ -38,21 +38,21 @@ class Summer890PPTurn(Turn):
                 self.castSingleOrNoTargetServantSkill(2, 2, 1)
                 self.castSingleOrNoTargetServantSkill(1, 2, 0)
 
-                fgoDevice.device.perform(' ',(2100,))
-                fgoDevice.device.perform(self.selectCard_s2_st1(),(300,300,2300,1300,6000))
+                timing.perform(' ',(2100,),'attack')
+                timing.perform(self.selectCard_s2_st1(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
             else:
-                fgoDevice.device.perform(' ',(2100,))
-                fgoDevice.device.perform(self.selectCard(),(300,300,2300,1300,6000))
+                timing.perform(' ',(2100,),'attack')
+                timing.perform(self.selectCard(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
         else:
             if self.stageTurn == 1:
                 self.castSingleOrNoTargetServantSkill(2, 1, 1)
                 self.castSingleOrNoTargetServantSkill(1, 0, 0)
 
-                fgoDevice.device.perform(' ',(2100,))
-                fgoDevice.device.perform(self.selectCard_s3_st1(),(300,300,2300,1300,6000))
+                timing.perform(' ',(2100,),'attack')
+                timing.perform(self.selectCard_s3_st1(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
             else:
-                fgoDevice.device.perform(' ',(2100,))
-                fgoDevice.device.perform(self.selectCard(),(300,300,2300,1300,6000))
+                timing.perform(' ',(2100,),'attack')
+                timing.perform(self.selectCard(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
 
     def castSingleOrNoTargetServantSkill(self,pos,skill,target):
         fgoDevice.device.press(('ASD','FGH','JKL')[pos][skill])
@@ -64,9 +64,9 @@ class Summer890PPTurn(Turn):
             logger.warning(f'Skill {pos} {skill} Cast Failed')
             self.countDown[0][pos][skill]=1
             fgoDevice.device.press('J')
-        elif t:=Detect.cache.getSkillTargetCount():fgoDevice.device.perform('234'[target]+'\x08',(300,700))
-        else:fgoDevice.device.perform('\x08',(700,))
-        while not Detect().isTurnBegin():pass
+        elif t:=Detect.cache.getSkillTargetCount():timing.perform('234'[target]+'\x08',(300,700),'cast')
+        else:timing.perform('\x08',(700,),'cast')
+        wait_until(lambda d:d.isTurnBegin())
         Detect(.5)
 
     # targets expect a list, even when the master skill applies to a single servant
@@ -77,13 +77,13 @@ class Summer890PPTurn(Turn):
         self.countDown[1][skill]=15
         fgoDevice.device.perform('Q'+'WER'[skill],(300,300))
         if len(targets) == 2:
-            fgoDevice.device.perform(('TYUIOP'[targets[0]],'TYUIOP'[targets[1]],'Z'),(300,300,2600))
-            fgoDevice.device.perform('\x08',(2300,))
-            while not Detect().isTurnBegin():pass
+            timing.perform(('TYUIOP'[targets[0]],'TYUIOP'[targets[1]],'Z'),(300,300,2600),'exchange')
+            timing.perform('\x08',(2300,),'exchangeClose')
+            wait_until(lambda d:d.isTurnBegin())
         elif len(targets) == 1:
             if targets[0] >= 3: return
             if not Detect.cache.isServantDead(targets[0]):
-                fgoDevice.device.perform(('TYUIOP'[targets[0]]),(2600,))
+                timing.perform(('TYUIOP'[targets[0]]),(2600,),'cast')
 
     @logit(logger,logging.INFO)
     def selectCard(self):
@@ -100,17 +100,7 @@ class Summer890PPTurn(Turn):
         for _ in houguTargeted:
             self.enemy[self.target]=max(0,self.enemy[self.target]-48000)
             if any(self.enemy)and self.enemy[self.target]==0:self.target=next(i for i in range(5,-1,-1)if self.enemy[i])
-        def evaluate(card):return(lambda chainError:(lambda colorChain:(lambda firstBonus:
-            sum(
-                ((.3*bool(firstBonus&4)+.1*bool(firstBonus&1)+[1.,1.2,1.4][i]*[1,.8,1.1][color[j]])*(1+min(1,critical[j]+.2*bool(firstBonus&2)))+bool(colorChain==2))*resist[j]*(not sealed[j])
-                for i,j in enumerate(card)if j<5
-            )
-            +4*(len([i for i in self.enemy if i])>1)*(self.enemy[self.target]<20000)*sum(bool(i)for i in numpy.diff([group[i]for i in card if i<5]))
-            +(1.8 if colorChain==-1 else 3)*(not chainError and len({group[i]for i in card})==1)*resist[card[0]]
-            +2.3*(colorChain==0)*len({group[i]for i in card if i<5 and np[group[i]]})
-            +3*(colorChain==1)
-            )(7 if colorChain==3 else 1<<color[0]))(-1 if chainError else{(0,):0,(1):1,(2,):2,(0,1,2):3}.get(tuple(set(color[i]for i in card)),-1)))(any(sealed[i]for i in card if i<5))
-        card=list(max(permutations(range(5),3-len(hougu)),key=lambda x:evaluate(hougu+list(x))))
+        card=fgoCardScore.selectChain(hougu,color,sealed,np,resist,critical,group,len([i for i in self.enemy if i])>1 and self.enemy[self.target]<20000)
         return''.join(['12345678'[i]for i in hougu+card+list({0,1,2,3,4}-set(card))])
 
     @logit(logger,logging.INFO)
@@ -0,0 +1,112 @@
+"""
+Timing benchmark of the pixel stages of XDetectBase.getAP: the red "AP not enough" test above the slash and the
+brightening of the current AP before OCR, per-pixel Python loops (before) against NumPy masks (now).
+Both are checked to give the same result on every screenshot.
+
+Usage: python benchmarks/bench_ap_reader.py [--region base|cn] [--repeat 20] [screenshot.png ...]
+
+Screenshots are 1280x720 captures of the quest confirmation screen, e.g. the ones Detect.save() writes.
+Without any, synthetic frames with random digits around the slash are used.
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy
+
+SLASH_PNG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "slash.png")
+# the apRegion table of fgoDetect.py in diff_v21.0.2.patch
+AP_REGION = {"base": ((656, 363, 800, 432), 728, 656), "cn": ((662, 328, 800, 365), 662, 662)}
+
+
+def findSlash(im, slash, rect):
+    match = cv2.matchTemplate(im[rect[1]:rect[3], rect[0]:rect[2]], slash, cv2.TM_SQDIFF_NORMED)
+    x, y = cv2.minMaxLoc(match)[2]
+    return rect[0] + x + (slash.shape[1] >> 1), rect[1] + y + (slash.shape[0] >> 1)
+
+
+def brighten(cur_ap_im):
+    blank = numpy.zeros(cur_ap_im.shape, cur_ap_im.dtype)
+    dst = numpy.clip(cv2.addWeighted(cur_ap_im, 0.5, blank, 1 - 0.5, 150), 0, 255).astype(numpy.uint8)
+    return cv2.cvtColor(dst, cv2.COLOR_BGR2HSV)
+
+
+def loopStages(im, top, btm, slash_left, cost_left, current_left):
+    ap_enough = True
+    for i in range(top - 36, top):
+        for j in range(cost_left, 800):
+            if im[i, j, 0] < 10 and im[i, j, 1] < 10 and im[i, j, 2] > 200:
+                ap_enough = False
+                break
+    dst = brighten(im[top:btm, current_left:slash_left])
+    for i in range(dst.shape[0]):
+        for j in range(dst.shape[1]):
+            if dst[i, j, 2] > 200:
+                dst[i, j, 2] = 255
+    return ap_enough, dst
+
+
+def maskStages(im, top, btm, slash_left, cost_left, current_left):
+    cost_im = im[top - 36:top, cost_left:800]
+    red = cost_im[..., 2] > 200
+    ap_enough = not (red.any() and (red & (cost_im[..., 0] < 10) & (cost_im[..., 1] < 10)).any())
+    dst = brighten(im[top:btm, current_left:slash_left])
+    value = dst[..., 2]
+    value[value > 200] = 255
+    return ap_enough, dst
+
+
+def syntheticFrames(slash, region, count):
+    rng = numpy.random.default_rng(0)
+    (left, top, right, bottom), cost_left, _ = region
+    frames = []
+    for k in range(count):
+        im = rng.integers(0, 60, (720, 1280, 3), dtype=numpy.uint8)
+        y, x = (top + bottom - slash.shape[0]) >> 1, (left + right - slash.shape[1]) >> 1
+        im[y:y + slash.shape[0], x:x + slash.shape[1]] = slash
+        cv2.putText(im, str(rng.integers(0, 150)), (left, y + slash.shape[0]), cv2.FONT_HERSHEY_SIMPLEX, .8, (255, 255, 255), 2)
+        cv2.putText(im, str(rng.integers(0, 50)), (cost_left, y - 8), cv2.FONT_HERSHEY_SIMPLEX, .8,
+                    (0, 0, 255) if k % 2 else (255, 255, 255), 2)
+        frames.append(im)
+    return frames
+
+
+def timeStages(stages, jobs, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [stages(*job) for job in jobs]
+        best = min(best, time.perf_counter() - start)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized AP reader against the per-pixel loops")
+    parser.add_argument("screenshots", nargs='*', help="Screenshots of the quest confirmation screen")
+    parser.add_argument("--region", choices=sorted(AP_REGION), default="base", help="AP region of the server")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs over all screenshots, the best one is reported")
+    args = parser.parse_args()
+
+    slash = cv2.imread(SLASH_PNG)
+    region = AP_REGION[args.region]
+    frames = [cv2.imread(path) for path in args.screenshots] or syntheticFrames(slash, region, 8)
+    jobs = []
+    for im in frames:
+        x, y = findSlash(im, slash, region[0])
+        jobs.append((im, y - (slash.shape[0] >> 1), y + (slash.shape[0] >> 1), x - (slash.shape[1] >> 1), region[1], region[2]))
+
+    loop_time, loop_results = timeStages(loopStages, jobs, args.repeat)
+    mask_time, mask_results = timeStages(maskStages, jobs, args.repeat)
+    mismatches = sum(a[0] != b[0] or not numpy.array_equal(a[1], b[1]) for a, b in zip(loop_results, mask_results))
+
+    print(f"{'implementation':>16} {'us/frame':>10}")
+    print(f"{'pixel loops':>16} {loop_time / len(jobs) * 1e6:>10.1f}")
+    print(f"{'numpy masks':>16} {mask_time / len(jobs) * 1e6:>10.1f}")
+    print(f"speedup: {loop_time / mask_time:.1f}x on {len(jobs)} frame(s), mismatching results: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Cost of the diagnostic frames of the Fuse on the automation thread and in memory: Detect.save writing a png
+synchronously and self.log keeping the last Detect objects (before), against runtime/fgoCapture.py queuing the writes
+to a background thread and keeping the frames downscaled and jpeg-encoded in a FrameRing (now).
+
+Usage: python benchmarks/bench_capture.py [--frames 60] [--slots 10] [--budget 16]
+
+Frames are random noise over a synthetic battle-like background, which compresses worse than a real screenshot, so the
+ring sizes printed are an upper bound.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+import types
+
+import cv2
+import numpy
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+RUNTIME_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), "runtime")
+
+
+def loadCapture():
+    fgo_logging = types.ModuleType("fgoLogging")
+    fgo_logging.getLogger = lambda name: logging.getLogger("fgo" + name)
+    sys.modules.setdefault("fgoLogging", fgo_logging)
+    sys.path.insert(0, RUNTIME_DIR)
+    import fgoCapture
+    return fgoCapture
+
+
+def makeFrames(count):
+    rng = numpy.random.default_rng(0)
+    background = cv2.resize(rng.integers(0, 256, (45, 80, 3), numpy.uint8), (1280, 720), interpolation=cv2.INTER_CUBIC)
+    return [types.SimpleNamespace(im=numpy.clip(background + rng.integers(-8, 9, background.shape), 0, 255).astype(numpy.uint8))
+            for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the diagnostic captures of the Fuse")
+    parser.add_argument("--frames", type=int, default=60, help="Detect frames the fuse is reset with (default: %(default)s)")
+    parser.add_argument("--slots", type=int, default=10, help="Frames of the ring, the logsize of Fuse (default: %(default)s)")
+    parser.add_argument("--budget", type=int, default=16, help="Memory budget of the ring in MiB (default: %(default)s)")
+    args = parser.parse_args()
+    fgo_capture = loadCapture()
+    detects = makeFrames(args.frames)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fgo_capture.capture.directory = tmp_dir
+        start = time.perf_counter()
+        for i, detect in enumerate(detects):
+            cv2.imwrite(os.path.join(tmp_dir, f"sync{i}.png"), detect.im)
+        sync_save = (time.perf_counter() - start) / len(detects) * 1000
+
+        log = [None] * args.slots
+        start = time.perf_counter()
+        for i, detect in enumerate(detects):
+            log[i % args.slots] = detect
+        list_set = (time.perf_counter() - start) / len(detects) * 1000
+
+        ring = fgo_capture.FrameRing(args.slots, args.budget << 20)
+        start = time.perf_counter()
+        for i, detect in enumerate(detects):
+            ring[i % args.slots] = detect
+        ring_set = (time.perf_counter() - start) / len(detects) * 1000
+        fgo_capture.capture.flush(60)
+        start = time.perf_counter()
+        for detect in detects:
+            fgo_capture.capture.save(detect, "async")
+        async_save = (time.perf_counter() - start) / len(detects) * 1000
+        start = time.perf_counter()
+        fgo_capture.capture.flush(60)
+        drain = time.perf_counter() - start
+
+        print(f"{'automation thread':<36} {'before ms':>10} {'now ms':>10}")
+        print(f"{'save a frame':<36} {sync_save:>10.2f} {async_save:>10.3f}")
+        print(f"{'keep a frame in self.log':<36} {list_set:>10.3f} {ring_set:>10.3f}")
+        print(f"background writer drained the queue {drain * 1000:.0f}ms after the last save, {fgo_capture.capture}")
+        print(f"memory of self.log: {sum(i.im.nbytes for i in detects[-args.slots:]) >> 10}KiB of Detect frames before, "
+              f"{ring} now")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+Timing benchmark of the vectorized card chain scoring (runtime/fgoCardScore.py) against the evaluate() closure
+CustomTurn.selectCard used before, on random hands. Every hand is checked to pick the very same chain.
+
+Usage: python benchmarks/bench_card_score.py [--hands 2000] [--seed 0]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from itertools import permutations
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "runtime"))
+from fgoCardScore import selectChain
+
+
+def referenceSelectChain(hougu, color, sealed, np, resist, critical, group, spread):
+    """The scoring of CustomTurn.selectCard in diff_v21.0.2.patch before it was vectorized."""
+    def evaluate(card):return(lambda chainError:(lambda colorChain:(lambda firstBonus:
+        sum(
+            ((.3*bool(firstBonus&4)+.1*bool(firstBonus&1)+[1.,1.2,1.4][i]*[1,.8,1.1][color[j]])*(1+min(1,critical[j]+.2*bool(firstBonus&2)))+bool(colorChain==2))*resist[j]*(not sealed[j])
+            for i,j in enumerate(card)if j<5
+        )
+        +4*spread*sum(bool(i)for i in numpy.diff([group[i]for i in card if i<5]))
+        +(1.8 if colorChain==-1 else 3)*(not chainError and len({group[i]for i in card})==1)*resist[card[0]]
+        +2.3*(colorChain==0)*len({group[i]for i in card if i<5 and np[group[i]]})
+        +3*(colorChain==1)
+        )(7 if colorChain==3 else 1<<color[0]))(-1 if chainError else{(0,):0,(1):1,(2,):2,(0,1,2):3}.get(tuple(set(color[i]for i in card)),-1)))(any(sealed[i]for i in card if i<5))
+    return list(max(permutations(range(5),3-len(hougu)),key=lambda x:evaluate(hougu+list(x))))
+
+
+def randomHand(rng):
+    servantColor = [rng.randrange(3) for _ in range(3)]
+    return (
+        [5 + i for i in rng.sample(range(3), rng.choice([0, 0, 0, 1, 1, 2, 3]))],
+        [rng.randrange(3) for _ in range(5)] + servantColor,
+        [rng.random() < .05 for _ in range(5)],
+        [rng.random() < .7 for _ in range(3)],
+        # resist is looked up at card[0], which is a hougu card when one is chosen
+        [rng.choice([1, 1, 1, 1.7, .6]) for _ in range(8)],
+        [rng.randrange(11) / 10 for _ in range(5)],
+        [rng.randrange(3) for _ in range(5)] + [0, 1, 2],
+        rng.random() < .5,
+    )
+
+
+def timeSelection(select, hands):
+    start = time.perf_counter()
+    choices = [select(*hand) for hand in hands]
+    return time.perf_counter() - start, choices
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized card chain scoring against the reference")
+    parser.add_argument("--hands", type=int, default=2000, help="Number of random hands")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    hands = [randomHand(rng) for _ in range(args.hands)]
+    reference_time, reference = timeSelection(referenceSelectChain, hands)
+    vectorized_time, vectorized = timeSelection(selectChain, hands)
+    mismatches = [i for i, (a, b) in enumerate(zip(reference, vectorized)) if a != b]
+
+    print(f"{'implementation':>16} {'us/hand':>10}")
+    print(f"{'reference':>16} {reference_time / len(hands) * 1e6:>10.1f}")
+    print(f"{'vectorized':>16} {vectorized_time / len(hands) * 1e6:>10.1f}")
+    print(f"speedup: {reference_time / vectorized_time:.1f}x, mismatching choices: {len(mismatches)}/{len(hands)}")
+    for i in mismatches[:5]:
+        print(f"  hand {hands[i]}: reference {reference[i]}, vectorized {vectorized[i]}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Turns per clear of the hougu decisions of CustomTurn: the former constants (area hougu dealing 18000, targeted ones
+48000, cast above 12000 and 23000+8000*area HP), against runtime/fgoDamage.py predicting the damage from servantData.
+
+Usage: python benchmarks/bench_clear.py [-r recording.json ...] [--synthetic 200] [--seed 0] [--noise 0.2]
+
+The stages of each battle start with the enemy HP its recording shows on their first turn (the format is that of
+replay.py). Without -r, random farming quests are fought by 3 of 12 random servants (attack 7000 to 15000, mostly
+area hougu): two stages of 1 to 3 enemies of 8000 to 60000 HP, and a last one adding an enemy of 80000 to 200000 HP.
+The stages are fought by CustomTurn.dispatchHougu of the patch, loaded the way replay.py loads it. The true damage of a hougu or a card chain is the damage model's prediction scaled by
+a lognormal error of sigma --noise, every servant gains 10 to 40% NP a turn, and a hougu drains it. The simulation
+therefore measures what predicting from the attack of the servants gains over constants, not how right the model's
+formula is for a real party; a recording of a real farming party is the way to judge that.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+
+import numpy
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+CUSTOMIZATION_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, CUSTOMIZATION_DIR)
+import replay
+
+TURN_LIMIT = 30     # turns a battle may take before it counts as not cleared
+
+
+def legacyDispatchHougu(self, hougu):
+    # the hougu decisions of CustomTurn.selectCard before the damage model
+    houguTargeted, houguArea, houguSupport = [[j for j in range(3) if hougu[j] and self.servant[j][0] and self.servant[j][5][0] == i] for i in range(3)]
+    houguArea = houguArea if self.stage == self.stageTotal or sum(i > 0 for i in self.enemy) > 1 and sum(self.enemy) > 12000 else []
+    houguTargeted = houguTargeted if self.stage == self.stageTotal or max(self.enemy) > 23000 + 8000 * len(houguArea) else []
+    if self.stageTurn == 1 or houguTargeted or self.enemy[self.target] == 0:
+        self.target = numpy.argmax(self.enemy)
+    self.enemy = [max(0, i - 18000 * len(houguArea)) for i in self.enemy]
+    if any(self.enemy) and self.enemy[self.target] == 0:
+        self.target = next(i for i in range(5, -1, -1) if self.enemy[i])
+    for _ in houguTargeted:
+        self.enemy[self.target] = max(0, self.enemy[self.target] - 48000)
+        if any(self.enemy) and self.enemy[self.target] == 0:
+            self.target = next(i for i in range(5, -1, -1) if self.enemy[i])
+    return [i + 5 for i in houguSupport + houguArea + houguTargeted]
+
+
+def loadTurnClasses():
+    clock = replay.VirtualClock()
+    namespace = replay.install_stand_ins(replay.Replay(clock), clock)
+    exec(compile(replay.custom_turn_source(), "CustomTurn", "exec"), namespace)
+    custom_turn = namespace["CustomTurn"]
+    return {"constants (before)": type("LegacyTurn", (custom_turn,), {"dispatchHougu": legacyDispatchHougu}),
+            "damage model (now)": custom_turn}, namespace["damageModel"]
+
+
+def stages(battle):
+    """The enemy HP on the first turn of each stage of a recorded battle, and the field servants"""
+    waves = {}
+    for turn in battle["turns"]:
+        waves.setdefault(turn["turn"]["getStage"], turn["turn"]["getEnemyHp"])
+    party = battle["turns"][0]["turn"]["getFieldServant"]
+    return [hp for _, hp in sorted(waves.items()) if any(hp)], party
+
+
+def farmingBattles(count, rng):
+    pool = range(201, 213)
+    recording = {"servantData": {str(i): [rng.randint(1, 7), rng.randrange(7000, 15000), 0, 0, [rng.choice((0, 1, 1)), rng.randrange(3)],
+                                          [[0, 0], [0, 0], [0, 0]]] for i in pool}, "battles": []}
+    for _ in range(count):
+        party = rng.sample(pool, 3)
+        waves = [[rng.randrange(8000, 60000) if i < rng.randint(1, 3) else 0 for i in range(6)] for _ in range(3)]
+        waves[2][rng.randrange(3, 6)] = rng.randrange(80000, 200000)
+        recording["battles"].append({"turns": [{"turn": {"getStage": stage, "getEnemyHp": hp, "getFieldServant": party}}
+                                               for stage, hp in enumerate(waves, 1)]})
+    return recording
+
+
+def clear(turn_class, damage_model, servants, waves, rng, noise):
+    """Turns and hougu cast to clear the waves, None for the turns if TURN_LIMIT is reached"""
+    turn_proc = turn_class()
+    turn_proc.servant = servants
+    turn_proc.stageTotal = len(waves)
+    np = [rng.randrange(0, 60, 10) for _ in servants]
+    turns = cast = 0
+    for stage, hp in enumerate(waves, 1):
+        enemy = numpy.array(hp, dtype=float)
+        turn_proc.stage, turn_proc.stageTurn = stage, 0
+        while enemy.any():
+            turns += 1
+            if turns > TURN_LIMIT:
+                return None, cast
+            turn_proc.stageTurn += 1
+            turn_proc.enemy = [int(i) for i in enemy]
+            hougu = [i - 5 for i in turn_proc.dispatchHougu([i >= 100 for i in np])]
+            target = int(turn_proc.target)
+            error = lambda: rng.lognormvariate(0, noise)
+            for i in hougu:
+                kind = servants[i][5][0]
+                if kind == 1:
+                    enemy = numpy.maximum(0, enemy - damage_model.hougu(servants[i]) * error())
+                elif kind == 0:
+                    target = damage_model.retarget(enemy, target)
+                    enemy[target] = max(0, enemy[target] - damage_model.hougu(servants[i]) * error())
+                np[i] = 0
+                cast += 1
+            target = damage_model.retarget(enemy, target)
+            enemy[target] = max(0, enemy[target] - damage_model.chain(servants) * error())
+            np = [min(300, i + rng.randrange(10, 41)) for i in np]
+    return turns, cast
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the turns per clear of the hougu decisions of CustomTurn")
+    parser.add_argument("--recording", "-r", nargs='*', default=[], help="Recordings of detector answers (json), see replay.py")
+    parser.add_argument("--synthetic", type=int, default=0, help="Number of synthetic battles (default: 200 without recordings)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic battles and of the simulation")
+    parser.add_argument("--noise", type=float, default=.2, help="Sigma of the lognormal error of the true damage (default: %(default)s)")
+    args = parser.parse_args()
+    recordings = []
+    for path in args.recording:
+        with open(path, encoding="utf-8") as f:
+            recordings.append(json.load(f))
+    if args.synthetic or not recordings:
+        recordings.append(farmingBattles(args.synthetic or 200, random.Random(args.seed)))
+
+    turn_classes, damage_model = loadTurnClasses()
+    battles = []
+    for recording in recordings:
+        servant_data = replay.load_servant_data(recording)
+        for battle in recording["battles"]:
+            waves, party = stages(battle)
+            if waves:
+                battles.append(([(i,) + servant_data.get(i, (0, 0, 0, 0, (0, 0), ((0, 0), (0, 0), (0, 0)))) for i in party], waves))
+
+    print(f"{len(battles)} battle(s)")
+    print(f"{'hougu decisions':<22} {'turns/clear':>12} {'p90':>5} {'hougu/clear':>12} {'not cleared':>12}")
+    for label, turn_class in turn_classes.items():
+        rng = random.Random(args.seed)
+        results = [clear(turn_class, damage_model, servants, waves, rng, args.noise) for servants, waves in battles]
+        turns = sorted(t for t, _ in results if t is not None)
+        print(f"{label:<22} {statistics.mean(turns):>12.2f} {turns[int(len(turns) * .9)]:>5} "
+              f"{statistics.mean(c for _, c in results):>12.2f} {len(results) - len(turns):>12}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
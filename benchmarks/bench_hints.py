@@ -0,0 +1,134 @@
+"""
+Per-frame cost of the template searches of Detect, searching the whole ROI (before) against searching around the last
+match first through runtime/fgoHint.py (--hints).
+
+Usage: python benchmarks/bench_hints.py [--frames 100] [--jitter 2] [--moves 0.02] [--repeat 3]
+
+Each ROI gets a random template pasted in random frames at a position moving by up to --jitter pixels from one frame to
+the next, and jumping anywhere in the ROI in --moves of them. The searches are those of XDetectBase (cv2.matchTemplate
+with TM_SQDIFF_NORMED and the template mask) wrapped as DetectBase wraps them; both ways must find the same matches.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import types
+
+import cv2
+import numpy
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+RUNTIME_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), "runtime")
+# (label, ROI, template height and width) after the regions Detect searches every frame
+CASES = (
+    ("getAP slash", (656, 363, 800, 432), (28, 16)),
+    ("card", (50, 420, 1230, 700), (60, 60)),
+    ("friend list", (25, 160, 1255, 720), (90, 160)),
+)
+
+
+def loadHints():
+    fgo_logging = types.ModuleType("fgoLogging")
+    fgo_logging.getLogger = lambda name: logging.getLogger("fgo" + name)
+    sys.modules.setdefault("fgoLogging", fgo_logging)
+    sys.path.insert(0, RUNTIME_DIR)
+    import fgoHint
+    return fgoHint
+
+
+class XDetect:
+    """The template searches of XDetectBase, on a frame given to inject()"""
+    def inject(self, im):
+        self.im = im
+        return self
+
+    def _crop(self, rect):
+        return self.im[rect[1]:rect[3], rect[0]:rect[2]]
+
+    def _loc(self, img, rect):
+        return cv2.minMaxLoc(cv2.matchTemplate(self._crop(rect), img[0], cv2.TM_SQDIFF_NORMED, mask=img[1]))
+
+    def _compare(self, img, rect=(0, 0, 1280, 720), threshold=.05):
+        return self._loc(img, rect)[0] < threshold
+
+    def _find(self, img, rect=(0, 0, 1280, 720), threshold=.05):
+        loc = self._loc(img, rect)
+        return (rect[0] + loc[2][0] + (img[0].shape[1] >> 1), rect[1] + loc[2][1] + (img[0].shape[0] >> 1)) if loc[0] < threshold else None
+
+
+def makeDetect(hints):
+    class Detect(XDetect):
+        @hints.compare
+        def _compare(self, *args, **kwargs):
+            return super()._compare(*args, **kwargs)
+
+        @hints.find
+        def _find(self, *args, **kwargs):
+            return super()._find(*args, **kwargs)
+    return Detect
+
+
+def makeFrames(rng, rect, size, count, jitter, moves):
+    h, w = size
+    template = rng.integers(0, 256, (h, w, 3), numpy.uint8)
+    img = (template, numpy.max(template, axis=2) >> 1)
+    background = rng.integers(0, 256, (720, 1280, 3), numpy.uint8)
+    x, y = rect[0], rect[1]
+    frames = []
+    for _ in range(count):
+        if rng.random() < moves:
+            x, y = rng.integers(rect[0], rect[2] - w + 1), rng.integers(rect[1], rect[3] - h + 1)
+        else:
+            x = int(numpy.clip(x + rng.integers(-jitter, jitter + 1), rect[0], rect[2] - w))
+            y = int(numpy.clip(y + rng.integers(-jitter, jitter + 1), rect[1], rect[3] - h))
+        frame = background.copy()
+        if rng.random() < .9:
+            frame[y:y + h, x:x + w] = template
+        frames.append(frame)
+    return img, frames
+
+
+def run(detect, method, img, rect, frames):
+    return [getattr(detect.inject(frame), method)(img, rect, .05) for frame in frames]
+
+
+def best(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the per-frame cost of template searches with and without hints")
+    parser.add_argument("--frames", type=int, default=100, help="Frames per ROI (default: %(default)s)")
+    parser.add_argument("--jitter", type=int, default=2, help="Pixels the match moves by between frames (default: %(default)s)")
+    parser.add_argument("--moves", type=float, default=.02, help="Share of frames the match jumps anywhere (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case, the best one is reported")
+    args = parser.parse_args()
+    fgo_hint = loadHints()
+    rng = numpy.random.default_rng(0)
+
+    print(f"{'case':<24} {'ROI':>10} {'before ms':>10} {'hints ms':>10} {'speedup':>8} {'hits':>6}")
+    for label, rect, size in CASES:
+        img, frames = makeFrames(rng, rect, size, args.frames, args.jitter, args.moves)
+        for method in ("_find", "_compare"):
+            hints = fgo_hint.HintCache()
+            detect = makeDetect(hints)()
+            reference = run(detect, method, img, rect, frames)
+            before = best(lambda: run(detect, method, img, rect, frames), args.repeat)
+            hints.enabled = True
+            assert run(detect, method, img, rect, frames) == reference, (label, method)
+            hints.take()
+            after = best(lambda: run(detect, method, img, rect, frames), args.repeat)
+            hit_rate = hints.window[0] / max(1, sum(hints.window))
+            print(f"{label + ' ' + method:<24} {f'{rect[2]-rect[0]}x{rect[3]-rect[1]}':>10} {before / len(frames) * 1000:>10.3f} "
+                  f"{after / len(frames) * 1000:>10.3f} {before / after:>7.1f}x {hit_rate:>6.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Turns per clear and decision latency of the card chains of CustomTurn.selectCard: the greedy chain of fgoCardScore
+(before) against the lookahead planner of runtime/fgoLookahead.py (--lookahead).
+
+Usage: python benchmarks/bench_lookahead.py [--synthetic 200] [--seed 0] [--noise 0.2] [--beam 8] [--budget 3] [--preemption 5]
+
+The random farming quests and parties of bench_clear.py are fought with random hands of 5 face cards, the hougu being
+decided by CustomTurn.dispatchHougu and the face cards as selectCard does. A face card deals the damage and gives the
+NP the planner predicts for it, scaled by a lognormal error of sigma --noise, so, as in bench_clear.py, this measures
+what looking ahead gains under the planner's own model; the decision latency is measured on the same hands, as wall
+clock time and as the CPU time of the thread. Only the latter is bounded by the planner: the wall clock time also
+holds the time the operating system runs something else, which an idle loop measures with --preemption.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+import numpy
+
+from bench_clear import TURN_LIMIT, farmingBattles, loadTurnClasses, stages
+import replay
+
+
+def loadPlanner():
+    import fgoCardScore
+    import fgoLookahead
+    return fgoCardScore, fgoLookahead
+
+
+def clear(turn_class, planner, fgo_card_score, fgo_lookahead, damage_model, servants, waves, rng, noise, latencies):
+    turn_proc = turn_class()
+    turn_proc.servant = servants
+    turn_proc.stageTotal = len(waves)
+    np = [rng.randrange(0, 60, 10) for _ in servants]
+    turns = 0
+    for stage, hp in enumerate(waves, 1):
+        enemy = numpy.array(hp, dtype=float)
+        turn_proc.stage, turn_proc.stageTurn = stage, 0
+        while enemy.any():
+            turns += 1
+            if turns > TURN_LIMIT:
+                return None
+            turn_proc.stageTurn += 1
+            turn_proc.enemy = [int(i) for i in enemy]
+            if turn_proc.stageTurn == 1:
+                turn_proc.waveHp = turn_proc.enemy
+            color = tuple(rng.randrange(3) for _ in range(5)) + tuple(i[5][1] for i in servants)
+            group = tuple(rng.randrange(3) for _ in range(5)) + (0, 1, 2)
+            turn_proc.snapshot = type("Snapshot", (), {"np": tuple(np)})
+            error = lambda: rng.lognormvariate(0, noise)
+            hougu = turn_proc.dispatchHougu([i >= 100 for i in np])
+            for i in hougu:
+                kind = servants[i - 5][5][0]
+                if kind == 1:
+                    enemy = numpy.maximum(0, enemy - damage_model.hougu(servants[i - 5]) * error())
+                elif kind == 0:
+                    target = damage_model.retarget(enemy, int(turn_proc.target))
+                    enemy[target] = max(0, enemy[target] - damage_model.hougu(servants[i - 5]) * error())
+            args = (hougu, color, [False] * 5, [i < 100 for i in np], [1] * 8, [0] * 5, group,
+                    len([i for i in turn_proc.enemy if i]) > 1 and turn_proc.enemy[turn_proc.target] < damage_model.spread(servants))
+            start, cpu = time.perf_counter(), time.thread_time()
+            if planner:
+                card = planner.choose(turn_proc, hougu, fgo_card_score.rankChains(*args, planner.beam), color, group)
+            else:
+                card = fgo_card_score.selectChain(*args)
+            latencies.append((time.perf_counter() - start, time.thread_time() - cpu))
+            for i in hougu:
+                np[i - 5] = 0
+            target = int(turn_proc.target)
+            chain = hougu + card
+            for position, i in enumerate(chain):
+                if i >= 5:
+                    continue
+                target = damage_model.retarget(enemy, target)
+                enemy[target] = max(0, enemy[target] - fgo_lookahead.lookahead.card(servants[group[i]], color[i], position, color[chain[0]] == 2) * error())
+                np[group[i]] = min(300, np[group[i]] + (fgo_lookahead.NP_GAIN[color[i], position] + fgo_lookahead.NP_FIRST_ARTS * (color[chain[0]] == 0)) * error())
+    return turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the lookahead planner of the card chains")
+    parser.add_argument("--synthetic", type=int, default=200, help="Number of random farming quests (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the quests and of the simulation")
+    parser.add_argument("--noise", type=float, default=.2, help="Sigma of the lognormal error of the true damage and NP (default: %(default)s)")
+    parser.add_argument("--beam", type=int, default=8, help="Candidate chains the planner simulates (default: %(default)s)")
+    parser.add_argument("--budget", type=float, default=3, help="Latency budget of a decision in ms (default: %(default)s)")
+    parser.add_argument("--preemption", type=float, default=0, help="Seconds of an idle loop measuring the longest time the process is not run")
+    args = parser.parse_args()
+    if args.preemption:
+        gaps, last = [], time.perf_counter()
+        end = last + args.preemption
+        while last < end:
+            gaps.append(-last + (last := time.perf_counter()))
+        gaps.sort()
+        print(f"idle loop: {len(gaps)} iterations, p99.99 {gaps[int(len(gaps) * .9999)] * 1000:.2f}ms, max {gaps[-1] * 1000:.2f}ms")
+    turn_classes, damage_model = loadTurnClasses()
+    custom_turn = turn_classes["damage model (now)"]
+    fgo_card_score, fgo_lookahead = loadPlanner()
+    recording = farmingBattles(args.synthetic, random.Random(args.seed))
+    servant_data = replay.load_servant_data(recording)
+    battles = [([(i,) + servant_data[i] for i in party], waves) for waves, party in map(stages, recording["battles"])]
+
+    print(f"{len(battles)} battle(s)")
+    print(f"{'card chains':<24} {'turns/clear':>12} {'p90':>5} {'not cleared':>12} {'ms/decision':>12} {'p99 ms':>7} {'max ms':>7} "
+          f"{'cpu p99':>8} {'cpu max':>8}")
+    for label, planner in (("greedy (before)", None), ("lookahead (now)", fgo_lookahead.Lookahead(args.beam, budget=args.budget / 1000))):
+        rng = random.Random(args.seed)
+        latencies = []
+        results = [clear(custom_turn, planner, fgo_card_score, fgo_lookahead, damage_model, servants, waves, rng, args.noise, latencies)
+                   for servants, waves in battles]
+        turns = sorted(t for t in results if t is not None)
+        wall, cpu = (sorted(i) for i in zip(*latencies))
+        print(f"{label:<24} {statistics.mean(turns):>12.2f} {turns[int(len(turns) * .9)]:>5} {len(results) - len(turns):>12} "
+              f"{statistics.mean(wall) * 1000:>12.3f} {wall[int(len(wall) * .99)] * 1000:>7.2f} {wall[-1] * 1000:>7.2f} "
+              f"{cpu[int(len(cpu) * .99)] * 1000:>8.2f} {cpu[-1] * 1000:>8.2f}")
+        if planner:
+            print(f"  {planner}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Benchmark suite of the translator and card selection hot paths, with json results compared against a stored baseline.
+
+Cases:
+    tokenize/*, parse/*       tokenize() and TurnScriptParser.parse() on SampleTurnSeq.txt and a huge synthetic script
+    translate/*               generateCustomizedTurn() on the sample scripts and synthetic scripts of growing size
+    plan/*, planLoad/*        generatePlan() on the sample scripts, and json loading of the plans it writes
+    selectCard/*              every selectCard* method of CustomTurn, the sample Turn classes and the translated sample
+                              scripts, on random hands served by the stand-in Detect of replay.py
+    selectChain               fgoCardScore.selectChain alone, on the random hands of bench_card_score.py
+
+Usage: python benchmarks/bench_suite.py [--output results.json] [--baseline benchmarks/baseline.json]
+                                        [--save-baseline] [--threshold 0.2] [--filter translate/] [--repeat 5]
+                                        [--min-time 0.05] [--hands 500]
+
+Every case reports the best of --repeat runs in microseconds per operation, a run repeating the case for at least
+--min-time seconds. With a baseline, the cases slower than it
+by more than --threshold are flagged as regressions and the exit status is 1. Timings depend on the machine, so the
+baseline is meant to be saved (--save-baseline) and compared on the same one.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+CUSTOMIZATION_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, CUSTOMIZATION_DIR)
+from tokenizer import TurnScriptParser, generateCustomizedTurn, generatePlan, tokenize
+import replay
+from bench_card_score import randomHand
+from bench_translator import makeSyntheticScript
+
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, "baseline.json")
+SAMPLE_SCRIPTS = ("SampleTurnSeq.txt", "WhitePaper90SS.txt")
+SAMPLE_TURNS = ("Summer890PPTurn.py", "NoHouguNoSkillTurn.py")
+SYNTHETIC_SIZES = (50, 800)
+HUGE_SIZE = 1600
+
+
+def readFile(name):
+    with open(os.path.join(CUSTOMIZATION_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def translatorCases(tmp_dir):
+    small, huge = readFile(SAMPLE_SCRIPTS[0]), makeSyntheticScript(HUGE_SIZE)
+    cases = {}
+    for label, code in (("small", small), ("huge", huge)):
+        tokens = list(tokenize(code))
+        cases[f"tokenize/{label}"] = (lambda code=code: list(tokenize(code)), 1)
+        cases[f"parse/{label}"] = (lambda tokens=tokens: TurnScriptParser(tokens).parse(), 1)
+    for name in SAMPLE_SCRIPTS:
+        path = os.path.join(CUSTOMIZATION_DIR, name)
+        cases[f"translate/{os.path.splitext(name)[0]}"] = (lambda path=path: generateCustomizedTurn(path), 1)
+        cases[f"plan/{os.path.splitext(name)[0]}"] = (lambda path=path: generatePlan(path), 1)
+        plan = json.dumps(generatePlan(path), separators=(",", ":"))
+        cases[f"planLoad/{os.path.splitext(name)[0]}"] = (lambda plan=plan: json.loads(plan), 1)
+    for size in SYNTHETIC_SIZES:
+        path = os.path.join(tmp_dir, f"Synthetic{size}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(makeSyntheticScript(size))
+        cases[f"translate/synthetic-{size}"] = (lambda path=path: generateCustomizedTurn(path), 1)
+    return cases
+
+
+def selectCardCases(hands):
+    """
+    Loads the Turn classes into the stand-in kernel of replay.py and times each selectCard* method on the card
+    screens of a synthetic recording, the turn state being set up as the turn's __call__ would.
+    """
+    clock = replay.VirtualClock()
+    state = replay.Replay(clock)
+    namespace = replay.install_stand_ins(state, clock)
+    recording = replay.synthetic_recording(hands // 5 + 1)
+    namespace["servantData"] = replay.load_servant_data(recording)
+    sources = replay.turn_sources([os.path.join(CUSTOMIZATION_DIR, i) for i in SAMPLE_SCRIPTS + SAMPLE_TURNS])
+    for name, source in sources:
+        exec(compile(source, name, "exec"), namespace)
+        namespace.setdefault("Turn", namespace["CustomTurn"])
+    turns = [turn for battle in recording["battles"] for turn in battle["turns"]][:hands]
+    battle = {"turns": turns}
+
+    def run(turn_class, method):
+        turn_proc = turn_class()
+        call = getattr(turn_proc, method)
+        args = (0,) if method == "selectCard_for_np" else ()
+        state.start(battle)
+        for index, turn in enumerate(turns):
+            state.next_turn(index)
+            state.screen = "cards"
+            frame = turn["turn"]
+            turn_proc.servant = [(i,) + namespace["servantData"].get(i, ()) for i in frame["getFieldServant"]]
+            turn_proc.stage, turn_proc.stageTurn, turn_proc.stageTotal = frame["getStage"], 1, 3
+            turn_proc.enemy, turn_proc.target = list(frame["getEnemyHp"]), 0
+            turn_proc.snapshot = namespace["BattleSnapshot"](namespace["Detect"](0), turn_proc.servant)
+            call(*args)
+
+    cases = {}
+    for name, _ in sources:
+        turn_class = namespace[name]
+        for method in sorted(i for i in dir(turn_class) if i.startswith("selectCard") and callable(getattr(turn_class, i))):
+            if method in vars(turn_class) or name == "CustomTurn":
+                cases[f"selectCard/{name}.{method}"] = (lambda turn_class=turn_class, method=method: run(turn_class, method), len(turns))
+    return cases
+
+
+def selectChainCase(hands):
+    rng = random.Random(0)
+    sample = [randomHand(rng) for _ in range(hands)]
+    fgo_card_score = sys.modules["fgoCardScore"]
+    return {"selectChain": (lambda: [fgo_card_score.selectChain(*hand) for hand in sample], hands)}
+
+
+def timeCase(func, ops, repeat, min_time):
+    """Best of repeat runs, each calling func often enough to last min_time seconds; the first call warms up."""
+    start = time.perf_counter()
+    func()
+    loops = max(1, round(min_time / (time.perf_counter() - start)))
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / loops / ops * 1e6
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"{'case':<56} {'us/op':>10} {'baseline':>10} {'change':>8}")
+    for name, result in results.items():
+        base = baseline.get(name, {}).get("us_per_op")
+        change = result["us_per_op"] / base - 1 if base else None
+        flag = change is not None and change > threshold
+        if flag:
+            regressions.append(name)
+        print(f"{name:<56} {result['us_per_op']:>10.1f} {base if base else float('nan'):>10.1f} "
+              f"{'' if change is None else f'{change:+.0%}':>8}{'  REGRESSION' if flag else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the translator and card selection hot paths")
+    parser.add_argument("--output", "-o", help="Write the results to this json file")
+    parser.add_argument("--baseline", "-b", default=DEFAULT_BASELINE, help="Baseline json to compare against (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=.2, help="Slowdown flagged as a regression (default: %(default)s)")
+    parser.add_argument("--filter", default="", help="Only run the cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case, the best one is reported")
+    parser.add_argument("--min-time", type=float, default=.05, help="Seconds each run lasts at least (default: %(default)s)")
+    parser.add_argument("--hands", type=int, default=500, help="Random hands per selectCard case")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cases = translatorCases(tmp_dir) | selectCardCases(args.hands)
+        cases |= selectChainCase(args.hands)
+        results = {name: {"us_per_op": timeCase(func, ops, args.repeat, args.min_time), "ops": ops}
+                   for name, (func, ops) in cases.items() if args.filter in name}
+    report = {"python": platform.python_version(), "machine": platform.machine(), "repeat": args.repeat, "results": results}
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        print(f"Baseline of {len(results)} cases saved to {args.baseline}")
+        return 0
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    else:
+        print(f"No baseline at {args.baseline}, run with --save-baseline first to compare against one")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
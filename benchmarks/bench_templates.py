@@ -0,0 +1,110 @@
+"""
+Startup benchmark of the templates of ImageListener: decoding every png eagerly at import (before) against listing the
+names and loading each template on first use through runtime/fgoTemplateCache.py (now), the first start without the
+cache (cold) and a later start mapping it (warm).
+
+Usage: python benchmarks/bench_templates.py [--dir FGO-py/FGO-py/fgoImage/] [--count 300] [--repeat 5]
+
+Without --dir, --count random templates of 20 to 200 pixels a side are written to a temporary directory.
+"import" is the cost of constructing the ImageListener, "all used" adds the first use of every template; a battle
+only uses a part of them, so the real startup cost is in between.
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+import cv2
+import numpy
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+RUNTIME_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), "runtime")
+
+
+def loadTemplateCache():
+    fgo_logging = types.ModuleType("fgoLogging")
+    fgo_logging.getLogger = lambda name: logging.getLogger("fgo" + name)
+    sys.modules.setdefault("fgoLogging", fgo_logging)
+    sys.path.insert(0, RUNTIME_DIR)
+    import fgoTemplateCache
+    return fgoTemplateCache
+
+
+def writeTemplates(path, count):
+    rng = numpy.random.default_rng(0)
+    for i in range(count):
+        h, w = rng.integers(20, 200, 2)
+        cv2.imwrite(os.path.join(path, f"template{i:04d}.png"), rng.integers(0, 256, (h, w, 3), numpy.uint8))
+
+
+def eager(path, ends=".png"):
+    # the ImageListener.__init__ of the patch before
+    return {file[:-len(ends)]: (lambda x: (x, numpy.max(x, axis=2) >> 1))(cv2.imread(path + file))
+            for file in sorted(os.listdir(path)) if file.endswith(ends)}
+
+
+def lazy(template_cache, path, cache_dir, use, ends=".png"):
+    names = [file[:-len(ends)] for file in sorted(os.listdir(path)) if file.endswith(ends)]
+    cache = template_cache.TemplateCache(path, ends, cache_dir)
+    templates = [cache.load(name) for name in names] if use else names
+    return cache, templates
+
+
+def best(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the startup cost of the ImageListener templates")
+    parser.add_argument("--dir", help="Template directory, e.g. FGO-py/FGO-py/fgoImage/")
+    parser.add_argument("--count", type=int, default=300, help="Random templates without --dir (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case, the best one is reported")
+    args = parser.parse_args()
+    template_cache = loadTemplateCache()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = args.dir
+        if path is None:
+            path = os.path.join(tmp_dir, "fgoImage") + os.sep
+            os.makedirs(path)
+            writeTemplates(path, args.count)
+        path = os.path.join(path, "")
+        cache_dir = os.path.join(tmp_dir, "fgoCache")
+        count = len(eager(path))
+        reference = eager(path)
+
+        def cold(use):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            cache, _ = lazy(template_cache, path, cache_dir, use)
+            cache.fresh.clear()     # the cache is written below, outside of the timing
+
+        print(f"{count} templates in {path}")
+        print(f"{'case':<28} {'import ms':>10} {'all used ms':>12}")
+        print(f"{'eager (before)':<28} {best(lambda: eager(path), args.repeat):>10.1f} {'':>12}")
+        print(f"{'lazy, cold (first start)':<28} {best(lambda: cold(False), args.repeat):>10.1f} "
+              f"{best(lambda: cold(True), args.repeat):>12.1f}")
+
+        cache, _ = lazy(template_cache, path, cache_dir, True)
+        start = time.perf_counter()
+        cache.save()
+        save = (time.perf_counter() - start) * 1000
+        _, warm = lazy(template_cache, path, cache_dir, True)
+        for name, (image, mask) in zip(sorted(reference), warm):
+            assert numpy.array_equal(reference[name][0], image) and numpy.array_equal(reference[name][1], mask), name
+        print(f"{'lazy, warm (cache mapped)':<28} {best(lambda: lazy(template_cache, path, cache_dir, False), args.repeat):>10.1f} "
+              f"{best(lambda: lazy(template_cache, path, cache_dir, True), args.repeat):>12.1f}")
+        print(f"{'writing the cache at exit':<28} {save:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
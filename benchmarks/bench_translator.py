@@ -0,0 +1,83 @@
+"""
+Timing benchmark of the turn-script translator on large synthetic scripts.
+
+Usage: python benchmarks/bench_translator.py [--sizes 50 100 200 400 800] [--repeat 5]
+
+The per-stage cost should stay roughly constant as the script grows, i.e. translation time scales linearly.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tokenizer import translateTurnScript
+
+STAGE_TEMPLATES = [
+'''s{stage}st1:
+if exists(2x0.r) and 0.np>=49:
+    0.2>2, 0.0, 0.1>2, M.2>1
+else: selectCard
+target:2
+hougu:2
+post:(2.g,2.b),(2.g,2.*),(2.b, 2.*),(2.b, *)
+''',
+'''s{stage}st2:
+0.2, 2.0>0, 2.1>0, 2.2>0, 1.2, 1.0>0, m.2>0, 0.0, 0.1
+target:2
+hougu:0
+pre:0.r
+post:0.r
+''',
+'''s{stage}st3:
+if exists(2x0.*):
+    pre:(0.*, 0.*)
+    hougu:0
+elif exists(0.*) or exists(*.b):
+    pre:0.*
+    hougu:0
+    post:*
+else:
+    hougu:0
+    post:(*,*)
+''',
+'''s{stage}st4:
+0.0, 0.1, 1.1>1, m.0>0   # comment
+target:2
+selectCard_for_np 0
+''',
+]
+
+
+def makeSyntheticScript(stages: int) -> str:
+    return ''.join(STAGE_TEMPLATES[i % len(STAGE_TEMPLATES)].format(stage=i // len(STAGE_TEMPLATES) + 1)
+                   for i in range(stages))
+
+
+def timeTranslation(code: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        translateTurnScript("SyntheticTurn", code)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the turn-script translator on synthetic scripts")
+    parser.add_argument("--sizes", nargs='+', type=int, default=[50, 100, 200, 400, 800, 1600], help="Numbers of stage blocks")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per size, the best one is reported")
+    args = parser.parse_args()
+
+    print(f"{'stages':>8} {'lines':>8} {'time (ms)':>10} {'us/stage':>10}")
+    per_stage = []
+    for size in args.sizes:
+        code = makeSyntheticScript(size)
+        elapsed = timeTranslation(code, args.repeat)
+        per_stage.append(elapsed / size * 1e6)
+        print(f"{size:>8} {code.count(chr(10)):>8} {elapsed * 1e3:>10.2f} {per_stage[-1]:>10.1f}")
+    print(f"per-stage cost ratio (largest / smallest script): {per_stage[-1] / per_stage[0]:.2f} (~1 means linear)")
+
+
+if __name__ == "__main__":
+    main()
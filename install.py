@@ -1,49 +1,214 @@
-import os, shutil, re, platform
-import argparse
-from tokenizer import generateCustomizedTurn
+import os, shutil, re, platform, sys
+import argparse, hashlib, json, time
+from tokenizer import generateCustomizedTurn, generatePlan, generatePlanStub
 
 PATCH_VER = "v21.0.2"
 FGOPY_ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../FGO-py/"))
+CUSTOMIZATION_DIR = os.path.dirname(os.path.abspath(__file__))
+TRANSLATION_CACHE_PATH = os.path.join(CUSTOMIZATION_DIR, ".translation_cache.json")
+TRANSLATOR_SOURCES = ("tokenizer.py",)     # any change to these files invalidates all cached translations
+INSTALL_CACHE_DIR = os.path.join(CUSTOMIZATION_DIR, ".install_cache")
+INSTALL_MANIFEST_PATH = os.path.join(INSTALL_CACHE_DIR, "manifest.json")
+PRISTINE_DIR = os.path.join(INSTALL_CACHE_DIR, "pristine")     # patched files before Turn classes are spliced in
+SPLICED_FILES = ("fgoKernel.py", "fgoCli.py")
+RUNTIME_DIR = os.path.join(CUSTOMIZATION_DIR, "runtime")     # modules the patched FGO-py imports, copied next to fgoKernel.py
+TURN_INDEX_NAME = "fgoTurnIndex.json"     # read by runtime/fgoTurnIndex.py to resolve --turnClass
+BUILTIN_TURNS = ("Turn", "CustomTurn", "PlanTurn")
+PLAN_DIR_NAME = "fgoPlan"     # plans of the turn scripts, relative to FGO-py/FGO-py where PlanTurn reads them
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Install script for FGO-py customization")
     parser.add_argument("--install-files", "-f", nargs='*', help="Files used to generate or get already-written customized turn class")
     parser.add_argument("--fgo-py-root-dir", required=False, default=FGOPY_ROOT_DIR, type=str, help="Path to FGO-py directory")
+    parser.add_argument("--no-translation-cache", action="store_true", help="Translate all script files even if they are unchanged")
+    parser.add_argument("--classes", action="store_true", help="Translate script files to Turn classes instead of plans run by PlanTurn")
+    parser.add_argument("--force", action="store_true", help="Re-apply the patch and re-install Turn classes even if nothing changed")
     return parser.parse_args()
 
-def translate_and_get_valid_files(input_files):
+def sha256_of_file(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def translator_stamp():
+    sha = hashlib.sha256()
+    for source in TRANSLATOR_SOURCES:
+        with open(os.path.join(CUSTOMIZATION_DIR, source), "rb") as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+class TranslationCache:
+    """
+    Persistent cache of translated turn scripts, keyed by the hash of the script contents and the translator stamp.
+    A hit requires the generated .py to be unchanged as well, in which case neither translation nor writing happens.
+    """
+    def __init__(self, path=TRANSLATION_CACHE_PATH, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self.stamp = translator_stamp()
+        self.hits = 0
+        self.misses = 0
+        self.entries = {}
+        if enabled and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                print(f"Translation cache {path} is corrupted, rebuilding it...")
+
+    def key(self, source_file, plan_dir=None):
+        sha = hashlib.sha256(self.stamp.encode())
+        sha.update(os.path.basename(source_file).encode())     # the Turn class name depends on the file name
+        sha.update(os.path.abspath(plan_dir).encode() if plan_dir else b"class")
+        with open(source_file, "rb") as f:
+            sha.update(f.read())
+        return sha.hexdigest()
+
+    def lookup(self, source_file, key):
+        entry = self.entries.get(os.path.abspath(source_file))
+        if self.enabled and entry is not None and entry["key"] == key and os.path.exists(entry["output"]) and \
+                sha256_of_file(entry["output"]) == entry["output_sha"]:
+            self.hits += 1
+            return entry["output"]
+        self.misses += 1
+        return None
+
+    def store(self, source_file, key, generated_file):
+        self.entries[os.path.abspath(source_file)] = {"key": key, "output": os.path.abspath(generated_file),
+                                                      "output_sha": sha256_of_file(generated_file)}
+
+    def save(self):
+        if self.enabled and self.misses:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=1)
+
+    def report(self, elapsed):
+        print(f"Translation cache: {self.hits} hit(s), {self.misses} miss(es), {elapsed * 1000:.1f} ms")
+
+def write_if_changed(path, text):
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            if f.read() == text:
+                return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def translate_and_get_valid_files(input_files, cache, plan_dir=None):
+    """
+    Returns the Turn class files to splice. Script files are translated to a Turn class next to them, or with plan_dir
+    compiled to a plan in plan_dir, the class next to them being then the PlanTurn subclass reading it: changing a
+    script only rewrites its plan, which PlanTurn reloads at the next battle, and fgoKernel.py is left as it is.
+    """
     valid_files = []
+    scripts = {}    # generated file -> turn script, watched for hot reload
+    start = time.perf_counter()
     for file in input_files:
         if os.path.exists(file):
             if file.endswith(".py"):
                 valid_files.append(os.path.abspath(file))
             else:
                 generated_file = file[:file.rfind('.')] + ".py"
-                with open(generated_file, "w", encoding="utf-8") as f:
-                    f.write(generateCustomizedTurn(file))
-                print(f"Custom Turn class generated: {file} -> {generated_file}")
+                turn_name = os.path.splitext(os.path.basename(file))[0] + "Turn"
+                key = cache.key(file, plan_dir)
+                if (output := cache.lookup(file, key)) is not None:
+                    if plan_dir:
+                        write_if_changed(generated_file, generatePlanStub(turn_name, f"{PLAN_DIR_NAME}/{turn_name}.json"))
+                    valid_files.append(generated_file if plan_dir else output)
+                    scripts[valid_files[-1]] = os.path.abspath(file)
+                    continue
+                try:
+                    if plan_dir:
+                        plan = generatePlan(file)
+                    else:
+                        class_str = generateCustomizedTurn(file)
+                except SyntaxError as e:
+                    print(f"In {file}: {e} Skipping...")
+                    continue
+                if plan_dir:
+                    os.makedirs(plan_dir, exist_ok=True)
+                    output = os.path.join(plan_dir, turn_name + ".json")
+                    with open(output, "w", encoding="utf-8") as f:
+                        json.dump(plan, f, separators=(",", ":"))
+                    write_if_changed(generated_file, generatePlanStub(turn_name, f"{PLAN_DIR_NAME}/{turn_name}.json"))
+                    print(f"Plan compiled: {file} -> {output}")
+                else:
+                    output = generated_file
+                    with open(generated_file, "w", encoding="utf-8") as f:
+                        f.write(class_str)
+                    print(f"Custom Turn class generated: {file} -> {generated_file}")
+                cache.store(file, key, output)
                 valid_files.append(generated_file)
+                scripts[generated_file] = os.path.abspath(file)
         else:
             print(f"Customized turn file {file} not found! Skipping...")
-    return valid_files
+    cache.save()
+    cache.report(time.perf_counter() - start)
+    return valid_files, scripts
 
-def main():
-    args = parse_args()
-    fgo_py_dir = os.path.join(args.fgo_py_root_dir, "FGO-py")
-    slash_png_path = os.path.join(fgo_py_dir, "fgoImage", "slash.png")
+def patched_files_of(patch_file):
+    """
+    Paths (relative to the FGO-py root directory) of the files touched by a patch.
+    """
+    with open(patch_file, encoding="utf-8") as f:
+        return [m.group(1) for line in f if (m := re.search(r"^diff --git a/(\S+) b/", line))]
 
-    if not os.path.exists(slash_png_path):
-        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), "slash.png"), os.path.join(fgo_py_dir, "fgoImage"))
+def load_manifest():
+    try:
+        with open(INSTALL_MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest):
+    with open(INSTALL_MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+
+def is_patch_stale(manifest, fgo_py_root_dir, patch_file):
+    if manifest.get("fgo_py_root_dir") != os.path.abspath(fgo_py_root_dir) or manifest.get("patch_ver") != PATCH_VER or \
+            manifest.get("patch_sha") != sha256_of_file(patch_file):
+        return True
+    if not all(os.path.exists(os.path.join(PRISTINE_DIR, name)) for name in SPLICED_FILES):
+        return True
+    for rel_path, sha in manifest.get("patched_files", {}).items():
+        path = os.path.join(fgo_py_root_dir, rel_path)
+        if not os.path.exists(path) or sha256_of_file(path) != sha:
+            return True
+    return not manifest.get("patched_files")
 
-    os.system("cd " + os.path.dirname(os.path.abspath(__file__)) + " && git pull")
-    os.system("cd " + fgo_py_dir + (" && git reset --hard origin/master" if platform.system() != "Windows" else "") + " && git apply " +
-              os.path.join(os.path.dirname(os.path.abspath(__file__)), f"diff_{PATCH_VER}.patch"))
+def apply_patch(fgo_py_dir, patch_file):
+    """
+    Resets FGO-py and applies the patch, then keeps copies of the patched (not yet spliced) files in PRISTINE_DIR,
+    so that Turn classes can later be re-spliced without touching git. Returns False if the patch failed to apply,
+    leaving PRISTINE_DIR as it was.
+    On Windows, where FGO-py is not reset, the files of the patch are checked out first, so that it also applies to an
+    FGO-py patched by an earlier install whose manifest or pristine copies are missing.
+    """
+    reset = " && git reset --hard origin/master" if platform.system() != "Windows" else \
+        " && git checkout -- " + " ".join(":/" + rel_path for rel_path in patched_files_of(patch_file))
+    status = os.system("cd " + fgo_py_dir + reset + " && git apply " + patch_file)
+    if status != 0:
+        return False
+    os.makedirs(PRISTINE_DIR, exist_ok=True)
+    for name in SPLICED_FILES:
+        shutil.copy(os.path.join(fgo_py_dir, name), os.path.join(PRISTINE_DIR, name))
+    return True
 
-    valid_files = translate_and_get_valid_files(args.install_files) if args.install_files else []
+def install_runtime_modules(fgo_py_dir):
+    """
+    Copies the modules of RUNTIME_DIR into FGO-py, skipping the ones that are already identical.
+    They are untracked in FGO-py, so resetting it for the patch leaves them in place.
+    """
+    for name in sorted(os.listdir(RUNTIME_DIR)):
+        if name.endswith(".py"):
+            src, dst = os.path.join(RUNTIME_DIR, name), os.path.join(fgo_py_dir, name)
+            if not os.path.exists(dst) or sha256_of_file(dst) != sha256_of_file(src):
+                shutil.copy(src, dst)
+                print(f"Runtime module installed: {name}")
 
+def collect_custom_turns(valid_files, scripts):
     to_add_lines = []
     default_turn_class = "Turn"
     to_install_turns = set()
+    indexed_turns = []
     for custom_py_file in reversed(valid_files):
         with open(custom_py_file, encoding="utf-8") as f:
             cus_lines = f.readlines()
@@ -60,37 +225,102 @@ def main():
             default_turn_class = class_name
             assert class_name not in to_install_turns, f"Duplicate customized Turn class name: {class_name}"
             to_install_turns.add(class_name)
+            indexed_turns.append({"name": class_name, "source": custom_py_file, "sha256": sha256_of_file(custom_py_file),
+                                  "script": scripts.get(custom_py_file)})
             for cl in cus_lines:
                 if len(cl) > 0 and re.search(r"^import", cl) is None and re.search(r"^from.+import.+", cl) is None:
                     to_add_lines.append(cl)
             to_add_lines.append("\n")
         else:
             print(f"In {custom_py_file}: No valid customized Turn class found. Skipping...")
+    return to_add_lines, default_turn_class, indexed_turns
 
-    with open(os.path.join(fgo_py_dir, "fgoKernel.py"), "r+", encoding="utf-8") as f:
-        battle_class_line = 0
+def splice_turns(fgo_py_dir, to_add_lines, default_turn_class):
+    """
+    Writes fgoKernel.py and fgoCli.py from their pristine patched copies with the customized Turns spliced in.
+    """
+    with open(os.path.join(PRISTINE_DIR, "fgoKernel.py"), encoding="utf-8") as f:
         lines = f.readlines()
-        for i, line in enumerate(lines):
-            if battle_class_match := re.search(r"class\s+Battle\s*:", line):
-                battle_class_line = i
-            if "def __init__(self,turnClass=Turn):" in line:
-                lines[i] = f"    def __init__(self,turnClass={default_turn_class}):\n"
-                break
-        f.seek(0)
-        f.truncate()
+    battle_class_line = 0
+    for i, line in enumerate(lines):
+        if battle_class_match := re.search(r"class\s+Battle\s*:", line):
+            battle_class_line = i
+        if "def __init__(self,turnClass=Turn):" in line:
+            lines[i] = f"    def __init__(self,turnClass={default_turn_class}):\n"
+            break
+    with open(os.path.join(fgo_py_dir, "fgoKernel.py"), "w", encoding="utf-8") as f:
         f.writelines(lines[:battle_class_line])
         f.write("\n# Customized Turns\n")
         f.writelines(to_add_lines)
         f.writelines(lines[battle_class_line:])
     print(f"Setting {default_turn_class} as the default Turn class of --turnClass command in fgoCli.py...")
-    with open(os.path.join(fgo_py_dir, "fgoCli.py"), "r+", encoding="utf-8") as f:
+    with open(os.path.join(PRISTINE_DIR, "fgoCli.py"), encoding="utf-8") as f:
         lines = f.readlines()
-        for i, line in enumerate(lines):
-            if "--turnClass" in line:
-                lines[i] = re.sub(r"default=.*\)", f"default='{default_turn_class}')", line)
-        f.seek(0)
-        f.truncate()
+    for i, line in enumerate(lines):
+        if "--turnClass" in line:
+            lines[i] = re.sub(r"default=.*\)", f"default='{default_turn_class}')", line)
+    with open(os.path.join(fgo_py_dir, "fgoCli.py"), "w", encoding="utf-8") as f:
         f.writelines(lines)
 
+def write_turn_index(fgo_py_dir, indexed_turns):
+    """
+    Writes the index of the Turn classes in fgoKernel.py, with the source file and hash of each, and the size and
+    mtime of fgoKernel.py, from which fgoCli tells with a single stat whether the index still describes it.
+    """
+    kernel_file = os.path.join(fgo_py_dir, "fgoKernel.py")
+    stat = os.stat(kernel_file)
+    index = {
+        "translator": CUSTOMIZATION_DIR,
+        "kernel": {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256_of_file(kernel_file)},
+        "turns": [{"name": name, "source": "fgoKernel.py", "sha256": None} for name in BUILTIN_TURNS] + indexed_turns,
+    }
+    with open(os.path.join(fgo_py_dir, TURN_INDEX_NAME), "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1)
+
+def main():
+    start = time.perf_counter()
+    args = parse_args()
+    fgo_py_dir = os.path.join(args.fgo_py_root_dir, "FGO-py")
+    slash_png_path = os.path.join(fgo_py_dir, "fgoImage", "slash.png")
+    patch_file = os.path.join(CUSTOMIZATION_DIR, f"diff_{PATCH_VER}.patch")
+
+    os.system("cd " + CUSTOMIZATION_DIR + " && git pull")     # first, so that what is installed below is what was pulled
+
+    if not os.path.exists(slash_png_path):
+        shutil.copy(os.path.join(CUSTOMIZATION_DIR, "slash.png"), os.path.join(fgo_py_dir, "fgoImage"))
+    install_runtime_modules(fgo_py_dir)
+
+    manifest = {} if args.force else load_manifest()
+    patch_stale = is_patch_stale(manifest, args.fgo_py_root_dir, patch_file)
+    if patch_stale:
+        print(f"Applying patch {PATCH_VER} to FGO-py...")
+        if not apply_patch(fgo_py_dir, patch_file):
+            print("Failed to apply the patch, no Turn class was installed. It will be applied again at the next install.")
+            return 1
+
+    valid_files, scripts = translate_and_get_valid_files(args.install_files, TranslationCache(enabled=not args.no_translation_cache),
+                                                         None if args.classes else os.path.join(fgo_py_dir, PLAN_DIR_NAME)) \
+        if args.install_files else ([], {})
+    turn_files = [[os.path.abspath(file), sha256_of_file(file)] for file in valid_files]
+
+    if not patch_stale and manifest.get("turn_files") == turn_files and os.path.exists(os.path.join(fgo_py_dir, TURN_INDEX_NAME)):
+        print(f"FGO-py is up to date, nothing to install ({(time.perf_counter() - start) * 1000:.1f} ms).")
+        return
+
+    to_add_lines, default_turn_class, indexed_turns = collect_custom_turns(valid_files, scripts)
+    splice_turns(fgo_py_dir, to_add_lines, default_turn_class)
+    write_turn_index(fgo_py_dir, indexed_turns)
+
+    save_manifest({
+        "fgo_py_root_dir": os.path.abspath(args.fgo_py_root_dir),
+        "patch_ver": PATCH_VER,
+        "patch_sha": sha256_of_file(patch_file),
+        "patched_files": {rel_path: sha256_of_file(os.path.join(args.fgo_py_root_dir, rel_path))
+                          for rel_path in patched_files_of(patch_file)},
+        "turn_files": turn_files,
+        "default_turn_class": default_turn_class,
+    })
+    print(f"Installation finished ({(time.perf_counter() - start) * 1000:.1f} ms).")
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
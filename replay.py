@@ -0,0 +1,368 @@
+"""
+Offline replay harness: runs Turn classes headlessly against recorded battles, without FGO-py, a device or a phone.
+
+fgoDevice.device and Detect are replaced by local stand-ins. The stand-in Detect answers every detector call from a
+recording of serialized detector answers. The stand-in device moves between the battle, skill and card screens on the
+keys it receives, and a card chain moves on to the next recorded turn. A virtual clock makes every perform delay,
+Detect latency and fgoSchedule sleep instant, so only the decisions of the Turn class take real time.
+
+A recording is a json file:
+    {"servantData": {"<servant id>": [<the servantData tuple of fgoKernel>], ...},
+     "battles": [{"turns": [{"turn": {<answers on the battle screen>}, "cards": {<answers on the card screen>},
+                             "skill": {<answers on the skill screen>}}, ...]}, ...]}
+An answer is keyed by the detector method name. Integer arguments index into it, e.g. "getFieldServantNp": [100, 30, 0]
+answers getFieldServantNp(0) with 100; other arguments are ignored, e.g. "getCardServant": [1, 2, 2, 3, 1].
+Calls without a recorded answer get the default of DEFAULT_ANSWERS or None.
+
+Usage: python replay.py [-f SampleTurnSeq.txt Summer890PPTurn.py ...] [-r recording.json ...] [--synthetic 200] [--plans] [--lookahead]
+The files are Turn class files or turn scripts, which are translated first; CustomTurn is always replayed. With --plans,
+every turn script is also compiled to a plan and replayed through PlanTurn as <name>TurnPlan.
+With --lookahead, selectCard and selectCard_for_np choose their chains through runtime/fgoLookahead.py.
+Turn classes of FGO-py itself are not available, so Turn stands for CustomTurn here.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+import traceback
+import types
+from itertools import permutations
+
+import numpy
+
+from tokenizer import generateCustomizedTurn, generatePlan, generatePlanStub
+
+CUSTOMIZATION_DIR = os.path.dirname(os.path.abspath(__file__))
+PATCH_FILE = os.path.join(CUSTOMIZATION_DIR, "diff_v21.0.2.patch")
+RUNTIME_DIR = os.path.join(CUSTOMIZATION_DIR, "runtime")
+TURN_TIME_LIMIT = 600       # virtual seconds a turn may take before the replay is considered stuck
+
+SKILL_KEYS = "ASDFGHJKL"
+MASTER_SKILL_KEYS = "WER"
+CLOSE_KEYS = "234TYUIOPZJ\x08"
+CARD_KEYS = "12345678"
+SCREENS = ("turn", "cards", "skill", "master", "finished")
+DEFAULT_ANSWERS = {
+    "isBattleFinished": False,
+    "isSkillNone": False,
+    "isSkillCastFailed": False,
+    "getSkillTargetCount": 0,
+    "isServantDead": [False, False, False],
+    "getStageTotal": 3,
+    "getEnemyHp": [0] * 6,
+    "getEnemyNp": [(0, 0)] * 6,
+    "getFieldServantHp": [15000] * 3,
+    "getFieldServantNp": [0] * 3,
+    "isSkillReady": [[False] * 3] * 3,
+    "isCardSealed": [False] * 5,
+    "isHouguReady": [False] * 3,
+    "getCardResist": [0] * 8,     # looked up at the first card of a chain, which can be a hougu card
+    "getCardCriticalRate": [0] * 5,
+}
+
+class ReplayError(Exception):
+    pass
+
+class VirtualClock:
+    """time.time() and time.sleep() of the replay: sleeping only moves the clock."""
+    def __init__(self):
+        self.now = 0.
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0, seconds)
+
+class Replay:
+    """
+    The state of the replayed battle: the recorded turn being played, the screen shown and the keys received.
+    """
+    def __init__(self, clock):
+        self.clock = clock
+        self.turns = []
+        self.index = 0
+        self.screen = "turn"
+        self.cast = set()
+        self.picks = 0
+        self.keys = []
+        self.turn_start = 0.
+
+    def start(self, battle):
+        self.turns, self.index, self.screen = battle["turns"], 0, "turn"
+        self.next_turn(0)
+
+    def next_turn(self, index):
+        self.index, self.cast, self.picks, self.keys = index, set(), 0, []
+        self.screen = "turn" if index < len(self.turns) else "finished"
+        self.turn_start = self.clock.now
+
+    @property
+    def finished(self):
+        return self.screen == "finished"
+
+    def press(self, key):
+        self.keys.append(key)
+        if self.screen == "turn":
+            if key == " ":
+                self.screen = "cards"
+            elif key in SKILL_KEYS:
+                self.cast.add(divmod(SKILL_KEYS.index(key), 3))
+                self.screen = "skill"
+            elif key == "Q":
+                self.screen = "master"
+        elif self.screen == "master" and key in MASTER_SKILL_KEYS:
+            # a master skill without target takes effect at once, the kernel presses nothing more for it
+            self.screen = "skill" if self.frame("skill").get("getSkillTargetCount") else "turn"
+        elif self.screen in ("skill", "master") and key in CLOSE_KEYS:
+            self.screen = "turn"
+        elif self.screen == "cards":
+            if key == " ":
+                self.screen = "turn"
+            elif key in CARD_KEYS:
+                self.picks += 1
+                if self.picks == 3:
+                    self.next_turn(self.index + 1)
+
+    def frame(self, screen):
+        return self.turns[self.index].get(screen if screen in ("cards", "skill") else "turn", {})
+
+    def answer(self, name, args):
+        if self.finished:
+            return name == "isBattleFinished"
+        if name == "isTurnBegin":
+            return self.screen == "turn"
+        value = self.frame(self.screen).get(name, DEFAULT_ANSWERS.get(name))
+        for arg in args:
+            if isinstance(arg, int) and isinstance(value, list):
+                value = value[arg]
+        if name == "isSkillReady" and value:
+            return tuple(args) not in self.cast
+        return value
+
+def make_detect(replay, clock):
+    class Detect:
+        """Stand-in of fgoDetect.Detect, answering from the recording of the current turn and screen."""
+        cache = None
+
+        def __init__(self, anteLatency=.1, postLatency=0):
+            clock.sleep(anteLatency)
+            if clock.now - replay.turn_start > TURN_TIME_LIMIT:
+                raise ReplayError(f"turn {replay.index + 1} stuck on the {replay.screen} screen")
+            # a tiny frame telling the screens apart, for wait_until and fgoTiming.Settled
+            self.im = numpy.full((8, 8, 3), (len(SCREENS) * replay.index + SCREENS.index(replay.screen)) & 255, numpy.uint8)
+            clock.sleep(postLatency)
+            Detect.cache = self
+
+        def __getattr__(self, name):
+            if name.startswith("setup"):
+                return lambda *args: None
+            return lambda *args: replay.answer(name, args)
+    return Detect
+
+class ReplayDevice:
+    """Stand-in of fgoDevice.device: keys go to the replay, delays to the virtual clock."""
+    name = "replay"
+
+    def __init__(self, replay, clock):
+        self.replay, self.clock = replay, clock
+
+    def press(self, key):
+        self.replay.press(key)
+
+    def perform(self, pos, wait):
+        for key, delay in zip(pos, wait):
+            self.press(key)
+            self.clock.sleep(delay / 1000)
+
+def logit(logger, level=logging.DEBUG):
+    def decorator(func):
+        return func
+    return decorator
+
+def install_stand_ins(replay, clock):
+    """
+    Registers the stand-in FGO-py modules the runtime modules import, then imports those from RUNTIME_DIR.
+    """
+    fgo_detect = types.ModuleType("fgoDetect")
+    fgo_detect.Detect = make_detect(replay, clock)
+    fgo_device = types.ModuleType("fgoDevice")
+    fgo_device.device = ReplayDevice(replay, clock)
+    fgo_logging = types.ModuleType("fgoLogging")
+    fgo_logging.getLogger = lambda name: logging.getLogger("fgo" + name)
+    fgo_logging.logit = logit
+    fgo_schedule = types.ModuleType("fgoSchedule")
+    fgo_schedule.ScriptStop = type("ScriptStop", (Exception,), {})
+    fgo_schedule.schedule = types.SimpleNamespace(sleep=clock.sleep)
+    sys.modules.update(fgoDetect=fgo_detect, fgoDevice=fgo_device, fgoLogging=fgo_logging, fgoSchedule=fgo_schedule)
+    sys.path.insert(0, RUNTIME_DIR)
+    import fgoCardScore, fgoDamage, fgoHint, fgoLookahead, fgoSnapshot, fgoTiming, fgoWait
+    fgoWait.time = fgoTiming.time = clock
+    fgoTiming.timing.profile = fgoTiming.LatencyProfile(os.devnull)     # learn, but never touch a real profile
+    return {
+        "Detect": fgo_detect.Detect, "fgoDevice": fgo_device, "logger": logging.getLogger("fgoKernel"),
+        "json": json, "logging": logging, "logit": logit, "numpy": numpy, "os": os, "permutations": permutations, "time": clock,
+        "fgoCardScore": fgoCardScore, "BattleSnapshot": fgoSnapshot.BattleSnapshot, "waitStats": fgoWait.waitStats,
+        "wait_until": fgoWait.wait_until, "timing": fgoTiming.timing, "hints": fgoHint.hints,
+        "damageModel": fgoDamage.damageModel, "lookahead": fgoLookahead.lookahead,
+    }
+
+def custom_turn_source(patch_file=PATCH_FILE):
+    """The CustomTurn class the patch adds to fgoKernel.py, with the PlanTurn interpreter following it."""
+    with open(patch_file, encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    start = lines.index("+class CustomTurn:")
+    end = next(i for i in range(start + 1, len(lines)) if not lines[i].startswith("+"))
+    return "\n".join(line[1:] for line in lines[start:end]) + "\n"
+
+def turn_sources(files, plan_dir=None):
+    """(class name, source) of CustomTurn and of the given files; with plan_dir, the plans of the turn scripts are written there."""
+    sources = [("CustomTurn", custom_turn_source())]
+    for file in files:
+        if file.endswith(".py"):
+            with open(file, encoding="utf-8") as f:
+                source = f.read()
+        else:
+            source = generateCustomizedTurn(file)
+        sources.append((re.search(r"^class\s+(\w+)\(", source, re.M).group(1), source))
+    for file in files if plan_dir else ():
+        if not file.endswith(".py"):
+            plan = generatePlan(file)
+            plan["name"] += "Plan"
+            path = os.path.join(plan_dir, plan["name"] + ".json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(plan, f, separators=(",", ":"))
+            sources.append((plan["name"], generatePlanStub(plan["name"], path)))
+    return sources
+
+def synthetic_recording(battles, seed=0):
+    """Random 3-stage battles with a fixed party, for when no recording is at hand."""
+    rng = random.Random(seed)
+    party = [101, 102, 103]
+    # class id and attack of a saber, a caster and a berserker, for the damage model
+    servant_data = {str(i): [cls, attack, 0, 0, [rng.randrange(3), rng.randrange(3)], [[4, 0], [1, 0], [0, 0]]]
+                    for i, cls, attack in zip(party, (1, 5, 7), (11000, 9500, 12500))}
+    recording = {"servantData": servant_data, "battles": []}
+    for _ in range(battles):
+        turns = []
+        for stage in (1, 2, 3):
+            for _ in range(rng.choice((1, 1, 1, 2, 3))):
+                np = [rng.randrange(0, 300, 10) for _ in party]
+                turns.append({
+                    "turn": {
+                        "getStage": stage,
+                        "getFieldServant": party,
+                        "getEnemyHp": [rng.choice((0, rng.randrange(5000, 300000))) for _ in range(6)],
+                        "getFieldServantNp": np,
+                        "getFieldServantHp": [rng.randrange(1000, 16000) for _ in party],
+                        "isSkillReady": [[rng.random() < .3 for _ in range(3)] for _ in party],
+                    },
+                    "cards": {
+                        "getCardColor": [rng.randrange(3) for _ in range(5)],
+                        "isCardSealed": [rng.random() < .05 for _ in range(5)],
+                        "isHouguReady": [i >= 100 for i in np],
+                        "getCardResist": [rng.choice((0, 0, 0, 1, 2)) for _ in range(8)],
+                        "getCardCriticalRate": [rng.randrange(11) for _ in range(5)],
+                        "getCardServant": [rng.choice(party) for _ in range(5)],
+                    },
+                })
+        recording["battles"].append({"turns": turns})
+    return recording
+
+def load_servant_data(recording):
+    def to_tuple(value):
+        return tuple(to_tuple(i) for i in value) if isinstance(value, list) else value
+    return {int(servant): to_tuple(data) for servant, data in recording.get("servantData", {}).items()}
+
+def replay_class(turn_class, recordings, replay, clock):
+    """
+    Plays every battle of the recordings with a fresh turn_class instance. Returns the per turn wall time of the
+    Turn class in seconds, the virtual seconds per battle, the keys pressed per turn and the failed battles.
+    """
+    latencies, durations, decisions, failures = [], [], [], []
+    for recording in recordings:
+        for battle_index, battle in enumerate(recording["battles"]):
+            turn_proc = turn_class()
+            replay.start(battle)
+            battle_start = clock.now
+            turn = 0
+            try:
+                while not replay.finished:
+                    turn += 1
+                    index = replay.index
+                    start = time.perf_counter()
+                    turn_proc(turn)
+                    latencies.append(time.perf_counter() - start)
+                    keys = "".join(replay.keys)
+                    if replay.index == index:
+                        raise ReplayError(f"turn {turn} ended without a card chain (keys {keys!r})")
+                    decisions.append(keys)
+            except Exception as e:
+                failures.append((battle_index, turn, e))
+                replay.next_turn(len(replay.turns))
+            durations.append(clock.now - battle_start)
+    return latencies, durations, decisions, failures
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay Turn classes offline against recorded battles")
+    parser.add_argument("--install-files", "-f", nargs='*', default=[], help="Turn class files or turn scripts to replay besides CustomTurn")
+    parser.add_argument("--recording", "-r", nargs='*', default=[], help="Recordings of detector answers (json)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Number of synthetic battles to replay as well (default: 200 without recordings)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic battles")
+    parser.add_argument("--adaptive-delays", action="store_true", help="End the waits on the detected screen transition, as fgoCli main --adaptive-delays")
+    parser.add_argument("--plans", action="store_true", help="Also replay the turn scripts as plans run by PlanTurn")
+    parser.add_argument("--lookahead", action="store_true", help="Choose the card chains with the lookahead planner, as fgoCli main --lookahead")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Show the log of the Turn classes")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR, format="%(name)s %(message)s")
+    recordings = []
+    for path in args.recording:
+        with open(path, encoding="utf-8") as f:
+            recordings.append(json.load(f))
+    if args.synthetic or not recordings:
+        recordings.append(synthetic_recording(args.synthetic or 200, args.seed))
+
+    clock = VirtualClock()
+    replay = Replay(clock)
+    namespace = install_stand_ins(replay, clock)
+    namespace["timing"].adaptive = args.adaptive_delays
+    namespace["servantData"] = {}
+    for recording in recordings:
+        namespace["servantData"].update(load_servant_data(recording))
+    plan_dir = tempfile.TemporaryDirectory()
+    sources = turn_sources(args.install_files, plan_dir.name if args.plans else None)
+    for name, source in sources:
+        exec(compile(source, name, "exec"), namespace)
+        namespace.setdefault("Turn", namespace["CustomTurn"])
+    if args.lookahead:
+        namespace["CustomTurn"].planner = namespace["lookahead"]
+
+    battles = sum(len(recording["battles"]) for recording in recordings)
+    print(f"{battles} battle(s) from {len(recordings)} recording(s)")
+    print(f"{'Turn class':>24} {'turns':>7} {'failed':>7} {'ms/turn':>8} {'p99 ms':>8} {'turns/min':>10} {'s/battle':>9} {'same keys':>10}")
+    reference = None
+    for name, _ in sources:
+        latencies, durations, decisions, failures = replay_class(namespace[name], recordings, replay, clock)
+        reference = reference if reference is not None else decisions
+        same = sum(a == b for a, b in zip(reference, decisions)) / max(1, len(decisions))
+        wall = sum(latencies)
+        p99 = numpy.percentile(latencies, 99) * 1000 if latencies else 0
+        print(f"{name:>24} {len(latencies):>7} {len(failures):>7} {wall / max(1, len(latencies)) * 1000:>8.2f} {p99:>8.2f} "
+              f"{len(latencies) / max(wall, 1e-9) * 60:>10.0f} {statistics.mean(durations) if durations else 0:>9.1f} {same:>10.0%}")
+        for battle_index, turn, error in failures[:3]:
+            print(f"  battle {battle_index} turn {turn}: {type(error).__name__}: {error}")
+            if args.verbose:
+                traceback.print_exception(error)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
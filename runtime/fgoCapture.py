@@ -0,0 +1,99 @@
+'Diagnostic frames of the Fuse: compressed in a ring buffer and written to disk by a background thread'
+import os,queue,threading,time,cv2
+from fgoLogging import getLogger
+logger=getLogger('Capture')
+
+DIR='fgoLog'
+
+class Capture:
+    '''
+    A writer thread fed by a queue of at most size jobs: the automation thread only enqueues, and a job that finds the
+    queue full is dropped and counted instead of waiting. The frames of Detect are never modified after the screenshot,
+    so they are queued as they are and only read by the writer thread.
+    '''
+    def __init__(self,size=64,directory=DIR):
+        self.queue=queue.Queue(size)
+        self.directory=directory
+        self.thread=None
+        self.dropped=0
+        self.written=0
+    def put(self,job):
+        if self.thread is None:
+            self.thread=threading.Thread(target=self.work,daemon=True,name='Capture')
+            self.thread.start()
+        try:self.queue.put_nowait(job)
+        except queue.Full:
+            self.dropped+=1
+            return False
+        return True
+    def work(self):
+        while True:
+            func,*args=self.queue.get()
+            try:func(*args)
+            except Exception as e:logger.warning(f'Capture job {getattr(func,"__qualname__",func)} failed: {type(e).__name__}: {e}')
+            finally:self.queue.task_done()
+    def path(self,name,stamp,ext):return os.path.join(''if os.path.dirname(name)else self.directory,f'{name}_{time.strftime("%Y-%m-%d_%H.%M.%S",time.localtime(stamp))}.{int(stamp*1000)%1000:03}{ext}')
+    def write(self,path,data):
+        os.makedirs(os.path.dirname(path)or'.',exist_ok=True)
+        with open(path,'wb')as f:f.write(data)
+        self.written+=1
+    def save(self,detect,name='Capture'):
+        'Writes the full frame of detect as a png, as Detect.save would, without waiting for the disk'
+        stamp=time.time()
+        return self.put((lambda:self.write(self.path(name,stamp,'.png'),cv2.imencode('.png',detect.im)[1].tobytes()),))
+    def flush(self,timeout=5.):
+        'Waits at most timeout seconds for the queued jobs, before the process may end'
+        deadline=time.time()+timeout
+        while self.queue.unfinished_tasks and time.time()<deadline:time.sleep(.05)
+        return not self.queue.unfinished_tasks
+    def __repr__(self):return f'{self.written} frames written, {self.dropped} dropped, {self.queue.qsize()} queued'
+capture=Capture()
+
+class Frame:
+    'A frame of the ring, downscaled and jpeg-encoded by the writer thread; save() is queued after the encoding'
+    __slots__='source','time','im','data'
+    def __init__(self,detect):
+        self.source,self.time,self.im,self.data=id(detect),time.time(),detect.im,None
+    def __bool__(self):return self.im is not None or self.data is not None
+    def save(self,name='Fuse'):return capture.put((self.dump,name))
+    def dump(self,name):
+        if self.data is not None:capture.write(capture.path(name,self.time,'.jpg'),self.data)
+
+class FrameRing:
+    '''
+    The last slots frames the Fuse was reset with, indexed as the list of Detect it replaces, but holding each frame
+    downscaled by scale and jpeg-encoded within budget bytes in total: the oldest frames are evicted beyond that.
+    A frame whose encoding finds the queue of capture full is encoded on the calling thread, so that the ring has no hole
+    when the Fuse trips on a device slow enough to fill the queue.
+    '''
+    def __init__(self,slots,budget=16<<20,scale=.5,quality=90):
+        self.slots=[None]*slots
+        self.budget,self.scale,self.quality=budget,scale,quality
+        self.size=0
+        self.inline=0
+        self.lock=threading.Lock()
+    def __len__(self):return len(self.slots)
+    def __getitem__(self,index):return self.slots[index]
+    def __setitem__(self,index,detect):
+        frame=Frame(detect)
+        with self.lock:
+            if(old:=self.slots[index])is not None and old.data is not None:self.size-=len(old.data)
+            self.slots[index]=frame
+        if not capture.put((self.encode,frame)):
+            if not self.inline:logger.warning(f'Capture queue full ({capture}), encoding the frames of the ring inline')
+            self.inline+=1
+            self.encode(frame)
+    def holds(self,index,detect):return(frame:=self.slots[index])is not None and frame.source==id(detect)
+    def encode(self,frame):
+        im=cv2.resize(frame.im,None,fx=self.scale,fy=self.scale,interpolation=cv2.INTER_AREA)if self.scale!=1 else frame.im
+        data=cv2.imencode('.jpg',im,[cv2.IMWRITE_JPEG_QUALITY,self.quality])[1].tobytes()
+        with self.lock:
+            frame.im=None
+            if frame not in self.slots:return
+            frame.data=data
+            self.size+=len(data)
+            for old in sorted((i for i in self.slots if i is not None and i.data is not None),key=lambda x:x.time):
+                if self.size<=self.budget:break
+                self.size-=len(old.data)
+                self.slots[self.slots.index(old)]=None
+    def __repr__(self):return f'{sum(i is not None for i in self.slots)} frames in {self.size>>10}KiB, {self.inline} encoded inline'
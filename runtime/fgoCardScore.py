@@ -0,0 +1,62 @@
+'Vectorized card chain scoring for CustomTurn.selectCard'
+import functools,numpy
+from itertools import permutations
+
+# CHAIN[h] holds every ordered choice of 3-h face cards, in the order itertools.permutations(range(5),3-h) yields them
+CHAIN=[numpy.array(list(permutations(range(5),3-h)),dtype=numpy.intp).reshape(len(list(permutations(range(5),3-h))),3-h)for h in range(4)]
+POSITION_WEIGHT=numpy.array([1.,1.2,1.4])
+COLOR_WEIGHT=[1,.8,1.1]
+# colorChain of evaluate() for the colors of a chain encoded as 16*c0+4*c1+c2, 3 standing for any color outside 0..2;
+# the dict lookup in evaluate() only knows (0,), (2,) and (0,1,2), so a Quick chain maps to -1 as well
+COLOR_CHAIN=numpy.array([{(0,):0,(1):1,(2,):2,(0,1,2):3}.get(tuple(set((i>>4,i>>2&3,i&3))),-1)for i in range(64)])
+
+@functools.lru_cache
+def chains(hougu):
+    'All candidate chains hougu+perm as a read-only (n,3) index array, n=len(CHAIN[len(hougu)])'
+    perm=CHAIN[len(hougu)]
+    card=numpy.hstack([numpy.tile(numpy.array(hougu,dtype=numpy.intp),(len(perm),1)),perm])
+    card.flags.writeable=False
+    return card
+
+def scoreChains(hougu,color,sealed,np,resist,critical,group,spread):
+    '''
+    Scores every chain hougu+perm at once, element for element equal to the evaluate() of CustomTurn.selectCard.
+    color and group cover the 8 cards (5 face cards, 3 hougu), sealed, resist and critical the face cards,
+    np is the per-servant np<100 flag and spread is whether switching servants between cards is rewarded.
+    Every term is computed with the operands and the operation order of evaluate(), so ties are broken the same way
+    (the face card terms are summed left to right, as sum() does up to Python 3.11).
+    '''
+    card=chains(tuple(hougu))
+    face=card[:,len(hougu):]
+    # per card lookups, hougu cards get neutral values since evaluate() leaves them out of the face card terms
+    sealed8=numpy.array([bool(i)for i in sealed[:5]]+[False]*3)
+    colorWeight8=numpy.array([COLOR_WEIGHT[i]for i in color[:5]]+[0.]*3)
+    critical8=numpy.array(list(critical[:5])+[0.]*3)
+    # (x*resist)*(not sealed)==x*(resist*(not sealed)) exactly, as the latter factor is 0 or 1
+    resist8=numpy.array([resist[i]*(not sealed[i])for i in range(5)]+[0.]*3)
+    chainGroup=numpy.array(group)[card]
+    chainError=sealed8[face].any(axis=1)
+    colorChain=numpy.where(chainError,-1,COLOR_CHAIN[numpy.array([i if i in(0,1,2)else 3 for i in color])[card]@(16,4,1)])
+    chain3=colorChain==3
+    firstBonus=1<<color[0]
+    mark=(
+        (numpy.where(chain3,.3*True+.1*True,.3*bool(firstBonus&4)+.1*bool(firstBonus&1))[:,None]+POSITION_WEIGHT*colorWeight8[card])
+        *(1+numpy.minimum(1,critical8[card]+numpy.where(chain3,.2*True,.2*bool(firstBonus&2))[:,None]))
+        +(colorChain==2)[:,None]
+    )*resist8[card]
+    npGroup=numpy.array([[group[j]==i and bool(np[i])for i in range(3)]for j in range(5)]+[[False]*3]*3)
+    return(
+        mark[:,0]+mark[:,1]+mark[:,2]
+        +4*spread*(chainGroup[:,len(hougu)+1:]!=chainGroup[:,len(hougu):2]).sum(axis=1)
+        +numpy.where(colorChain==-1,1.8,3)*(~chainError&(chainGroup[:,0]==chainGroup[:,1])&(chainGroup[:,1]==chainGroup[:,2]))*numpy.array(resist)[card[:,0]]
+        +2.3*(colorChain==0)*npGroup[face].any(axis=1).sum(axis=1)
+        +3*(colorChain==1)
+    )
+
+def selectChain(hougu,color,sealed,np,resist,critical,group,spread):
+    'The face cards of the best scoring chain, the same list max(permutations(...),key=evaluate) picks'
+    return CHAIN[len(hougu)][numpy.argmax(scoreChains(hougu,color,sealed,np,resist,critical,group,spread))].tolist()
+
+def rankChains(hougu,color,sealed,np,resist,critical,group,spread,count):
+    'The face cards of the count best scoring chains, best first, ties in the order of selectChain'
+    return CHAIN[len(hougu)][numpy.argsort(-scoreChains(hougu,color,sealed,np,resist,critical,group,spread),kind='stable')[:count]].tolist()
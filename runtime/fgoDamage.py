@@ -0,0 +1,62 @@
+'Predicting what the noble phantasms and the cards of the field servants leave of the enemies, for CustomTurn'
+import numpy
+
+# indexes in the servant tuples of CustomTurn: the servant id prepended to its servantData tuple
+CLASS,ATTACK,HOUGU=1,2,5
+TARGETED,AREA,SUPPORT=0,1,2
+# by card color as getCardColor tells them apart (arts, quick, buster)
+CARD=numpy.array([1.,.8,1.5])
+HOUGU_MULTIPLIER=numpy.array([[9.,12.,6.],[4.5,6.,3.]])    # at NP level 1, targeted and area
+CHAIN_POSITION=numpy.array([1.,1.2,1.4])
+# class attack modifiers by class id, 1 for the other classes
+CLASS_ATTACK={2:.95,3:1.05,5:.9,6:.9,7:1.1,9:1.1,11:1.1}
+# estimates of the former constants of selectCard, for servants without an attack in servantData; 'spread' is the
+# target HP below which selectCard rewarded switching servants between cards
+FALLBACK={TARGETED:48000.,AREA:18000.,'chain':12000.,'spread':20000.}
+
+class DamageModel:
+    '''
+    The damage of a noble phantasm is attack*.23 times its multiplier, its card color modifier and the class attack
+    modifier, times buff for the NP level, buffs and class advantage a farming party usually has; the damage of a card
+    chain is that of 3 cards of the average attack of the party, at the modifiers of their positions. The HP left to the
+    enemies after the area noble phantasms is one numpy step for all 6 of them; the targeted ones follow the target,
+    which moves to the last enemy alive, as the game does, once its enemy is down.
+    '''
+    def __init__(self,buff=2.):
+        self.buff=buff
+    def hougu(self,servant):
+        'The predicted damage of the noble phantasm of servant to each enemy it hits'
+        kind,color=servant[HOUGU]
+        if kind==SUPPORT:return 0.
+        if not servant[ATTACK]or not 0<=color<3:return FALLBACK[kind]
+        return servant[ATTACK]*.23*HOUGU_MULTIPLIER[kind,color]*CARD[color]*CLASS_ATTACK.get(servant[CLASS],1.)*self.buff
+    def chain(self,servants,fallback='chain'):
+        'The predicted damage of a chain of face cards to the target, FALLBACK[fallback] if no servant has an attack'
+        if not(attack:=[i[ATTACK]*CLASS_ATTACK.get(i[CLASS],1.)for i in servants if i[0]and i[ATTACK]]):return FALLBACK[fallback]
+        return sum(attack)/len(attack)*.23*CARD.mean()*CHAIN_POSITION.sum()*self.buff
+    def spread(self,servants):
+        'The target HP below which the cards of a chain are worth spreading over the servants: what a chain deals'
+        return self.chain(servants,'spread')
+    @staticmethod
+    def retarget(hp,target):return target if hp[target]or not hp.any()else int(numpy.flatnonzero(hp)[-1])
+    def predict(self,enemy,target,servants,area,targeted):
+        'The HP left to each enemy and the target after the area noble phantasms of servants[i] for i in area and the targeted ones'
+        hp=numpy.maximum(0.,numpy.asarray(enemy,dtype=float)-sum(self.hougu(servants[i])for i in area))
+        target=self.retarget(hp,target)
+        for i in targeted:
+            hp[target]=max(0.,hp[target]-self.hougu(servants[i]))
+            target=self.retarget(hp,target)
+        return hp,target
+    def gate(self,enemy,final,servants,area,targeted):
+        '''
+        The area and targeted noble phantasms worth casting: all of them in the final stage, elsewhere the area ones if
+        more than one enemy is alive and a card chain would not finish them all, and the targeted ones if a card chain
+        would not finish the strongest enemy the area ones leave
+        '''
+        if final:return area,targeted
+        enemy=numpy.asarray(enemy,dtype=float)
+        chain=self.chain(servants)
+        area=area if numpy.count_nonzero(enemy)>1 and enemy.sum()>chain else[]
+        left=enemy-sum(self.hougu(servants[i])for i in area)
+        return area,targeted if left.max()>chain else[]
+damageModel=DamageModel()
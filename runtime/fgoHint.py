@@ -0,0 +1,85 @@
+'Spatial hints for template matching: search around the last match of a template in a ROI before the whole ROI'
+import functools,weakref
+from fgoLogging import getLogger
+logger=getLogger('Hint')
+
+class HintCache:
+    '''
+    The centre of the last match of each (template, ROI) pair. With enabled set, a decorated _find or _compare first
+    searches a window of margin pixels around the template at that centre, and the whole ROI only if the window has no
+    match. A match inside the window is a match inside the ROI, so _compare answers as before; _find may return another
+    match than the best one of the ROI when the template shows up several times in it. Templates are told apart by the
+    identity of their image, which the templates of ImageListener keep once loaded. A hint holds a weak reference to the
+    image it was found for, so that an image built on the fly, whose id may be that of a freed one, gets no stale hint.
+    At most size hints are kept, the oldest one making room for a new one.
+    '''
+    def __init__(self,margin=8,size=1024):
+        self.enabled=False
+        self.margin,self.size=margin,size
+        self.hints={}
+        self.total=[0,0]
+        self.window=[0,0]
+    def count(self,hit):
+        self.total[not hit]+=1
+        self.window[not hit]+=1
+    def remember(self,key,img,centre):
+        if key not in self.hints and len(self.hints)>=self.size:del self.hints[next(iter(self.hints))]
+        self.hints[key]=weakref.ref(img[0]),centre
+    def around(self,key,img,rect):
+        'The window around the hint of key, None without a hint of this very image or when the window would be the whole ROI'
+        if(hint:=self.hints.get(key))is None or hint[0]()is not img[0]:return None
+        centre=hint[1]
+        h,w=img[0].shape[:2]
+        left,top=centre[0]-(w>>1),centre[1]-(h>>1)
+        window=(max(rect[0],left-self.margin),max(rect[1],top-self.margin),min(rect[2],left+w+self.margin),min(rect[3],top+h+self.margin))
+        return None if window==rect or window[2]-window[0]<w or window[3]-window[1]<h else window
+    @staticmethod
+    def split(args,kwargs):
+        'The ROI of a _find(img,rect,...) or _compare(img,rect,...) call and the arguments after it, None if left to the default'
+        if args:return tuple(args[0]),args[1:],kwargs
+        if'rect'in kwargs:return tuple(kwargs['rect']),(),{k:v for k,v in kwargs.items()if k!='rect'}
+        return None,args,kwargs
+    def find(self,func):
+        @functools.wraps(func)
+        def wrap(detect,img,*args,**kwargs):
+            if not self.enabled:return func(detect,img,*args,**kwargs)
+            rect,args,kwargs=self.split(args,kwargs)
+            if rect is None:return func(detect,img,*args,**kwargs)
+            key=id(img[0]),rect
+            if window:=self.around(key,img,rect):
+                if centre:=func(detect,img,window,*args,**kwargs):
+                    self.count(True)
+                    self.remember(key,img,centre)
+                    return centre
+            self.count(False)
+            if centre:=func(detect,img,rect,*args,**kwargs):self.remember(key,img,centre)
+            return centre
+        return wrap
+    def compare(self,func,locate=None):
+        '''
+        locate(detect,img,rect,...) finds the centre of a match the whole ROI was needed for, to be the next hint;
+        by default the _find of detect, whose own window search would be wasted on the stale hint
+        '''
+        @functools.wraps(func)
+        def wrap(detect,img,*args,**kwargs):
+            if not self.enabled:return func(detect,img,*args,**kwargs)
+            rect,args,kwargs=self.split(args,kwargs)
+            if rect is None:return func(detect,img,*args,**kwargs)
+            key=id(img[0]),rect
+            if(window:=self.around(key,img,rect))and(result:=func(detect,img,window,*args,**kwargs)):
+                self.count(True)
+                return result
+            self.count(False)
+            if result:=func(detect,img,rect,*args,**kwargs):
+                if centre:=(locate or getattr(type(detect)._find,'__wrapped__',type(detect)._find))(detect,img,rect,*args,**kwargs):self.remember(key,img,centre)
+            return result
+        return wrap
+    @staticmethod
+    def format(hits,misses):return f'{hits} hint hits, {misses} misses ({hits/max(1,hits+misses):.0%})'
+    def take(self):
+        'Summary of the searches since the previous call, prefixed with a comma to be appended to a log line; empty while disabled'
+        if not self.enabled:return''
+        result,self.window=', '+self.format(*self.window),[0,0]
+        return result
+    def __repr__(self):return f'{self.format(*self.total)}, {len(self.hints)} hints'
+hints=HintCache()
@@ -0,0 +1,137 @@
+'Multi-turn lookahead for the card chain of CustomTurn: the candidate chains ranked by the turns they leave to clear'
+import collections,functools,gc,time,numpy
+from fgoDamage import AREA,ATTACK,CARD,CHAIN_POSITION,CLASS,CLASS_ATTACK,FALLBACK,TARGETED,damageModel
+from fgoLogging import getLogger
+logger=getLogger('Lookahead')
+
+# NP percent a face card gives its servant, by color (arts, quick, buster) and chain position, for the NP rate and hits
+# of a typical servant; an arts first card adds NP_FIRST_ARTS to every face card of the chain
+NP_GAIN=numpy.array([[3.,4.5,6.],[1.,1.5,2.],[0.,0.,0.]])*1.8
+NP_FIRST_ARTS=1.8
+HP_STEP=2000    # HP and NP are rounded to these steps in the memoized states, so that near states share their result
+NP_STEP=10
+GAIN=NP_GAIN.mean()+NP_FIRST_ARTS/3   # the NP percent of an average face card
+
+class OutOfBudget(Exception):pass
+
+class Lookahead:
+    '''
+    Plugged into a CustomTurn (or subclass) by setting its planner attribute to an instance. selectCard and
+    selectCard_for_np then hand their best beam candidate chains, best first, to choose(), which simulates each one
+    on the HP and NP of the turn (face card damage by attack, color and position, NP gain by color and position) and
+    adds the turns the rest of the quest is predicted to take from the state it leaves: the current stage, then the
+    stageTotal-stage stages left, each as strong as the current one was on its first turn. A predicted turn casts
+    the hougu the damage model approves of, plays an average chain and gives every servant the average NP of a card.
+    The predicted turns are memoized on the party's profile and the rounded state, the least recently used of more
+    than size states being dropped one by one, so that no decision pays for freeing many of them at once. The budget
+    holds inside the recursion too: once budget seconds are spent the prediction under way is abandoned (without
+    memoizing it) along with the candidates left, so the first candidate (the greedy choice) is always the fallback.
+    Fewer turns win, then the candidate order.
+    '''
+    def __init__(self,beam=8,horizon=12,budget=.003,size=1<<14):
+        self.beam,self.horizon,self.budget,self.size=beam,horizon,budget,size
+        self.decisions=self.changed=self.cut=0
+        self.spent=0.
+        self.deadline=float('inf')
+        self.memo=collections.OrderedDict()
+        self.reused=0
+    def card(self,servant,color,position,firstBuster):
+        if not 0<=color<3:return 0.
+        attack=servant[ATTACK]*CLASS_ATTACK.get(servant[CLASS],1.)if servant[ATTACK]else FALLBACK['chain']/(.23*CARD.mean()*CHAIN_POSITION.sum()*damageModel.buff)
+        return attack*.23*(CARD[color]*CHAIN_POSITION[position]+.5*firstBuster)*damageModel.buff
+    def simulate(self,turn,chain,color,group,np):
+        'The HP left to the enemies and the NP of the servants after chain, the hougu of which dispatchHougu already counted in turn.enemy'
+        hp=numpy.array(turn.enemy,dtype=float)
+        np=numpy.array(np,dtype=float)
+        target=damageModel.retarget(hp,int(turn.target))
+        for i in chain:
+            if i>=5:np[i-5]=0
+        first=color[chain[0]]
+        for position,i in enumerate(chain):
+            if i>=5:continue
+            hp[target]=max(0.,hp[target]-self.card(turn.servant[group[i]],color[i],position,first==2))
+            target=damageModel.retarget(hp,target)
+            if 0<=color[i]<3 and 0<=group[i]<3:np[group[i]]+=NP_GAIN[color[i],position]+NP_FIRST_ARTS*(first==0)
+        return hp,numpy.minimum(300,np)
+    @staticmethod
+    @functools.lru_cache
+    def profile(servants):
+        'The predicted card chain damage, hougu damage and hougu kind of servants, in HP_STEP, for future()'
+        return(damageModel.chain(servants)/HP_STEP,
+            tuple(damageModel.hougu(i)/HP_STEP if i[0]else 0. for i in servants),
+            tuple(i[5][0]if i[0]else-1 for i in servants))
+    def future(self,profile,hp,np,wave,stages,horizon):
+        '''
+        Predicted turns to clear hp (in HP_STEP) and stages more waves of wave, from the NP np (in NP_STEP) of the
+        servants of profile, at most horizon; damageModel.gate and damageModel.predict on plain tuples
+        '''
+        key=profile,hp,np,wave,stages,horizon
+        if(turns:=self.memo.get(key))is not None:
+            self.memo.move_to_end(key)
+            self.reused+=1
+            return turns
+        turns=self.predict(profile,hp,np,wave,stages,horizon)
+        if len(self.memo)>=self.size:self.memo.popitem(False)
+        self.memo[key]=turns
+        return turns
+    def predict(self,profile,hp,np,wave,stages,horizon):
+        if not any(hp):
+            if not stages:return 0
+            return self.future(profile,wave,np,wave,stages-1,horizon)
+        if not horizon:return 0
+        if time.perf_counter()>self.deadline:raise OutOfBudget
+        chain,damage,kind=profile
+        ready=[j for j in range(3)if np[j]*NP_STEP>=100]
+        area=[j for j in ready if kind[j]==AREA]
+        targeted=[j for j in ready if kind[j]==TARGETED]
+        if stages:
+            area=area if sum(i>0 for i in hp)>1 and sum(hp)>chain else[]
+            targeted=targeted if max(hp)-sum(damage[j]for j in area)>chain else[]
+        target=max(range(len(hp)),key=hp.__getitem__)
+        hit=sum(damage[j]for j in area)
+        hp=[max(0.,i-hit)for i in hp]
+        for j in targeted+[None]:
+            if not hp[target]:
+                if not any(hp):break
+                target=max(i for i in range(len(hp))if hp[i])
+            hp[target]=max(0.,hp[target]-(chain if j is None else damage[j]))
+        np=tuple(0 if j in area or j in targeted else min(300//NP_STEP,int(np[j]+GAIN/NP_STEP+.5))for j in range(3))
+        return 1+self.future(profile,tuple(-int(-i//1)for i in hp),np,wave,stages,horizon-1)
+    @staticmethod
+    def round(hp):return tuple(int(-(-i//HP_STEP))for i in hp)
+    def choose(self,turn,hougu,candidates,color,group):
+        '''
+        The face cards, among the first beam of candidates, that leave the fewest predicted turns when played after the
+        hougu cards (5 to 7) of hougu; group and color cover the 8 cards
+        '''
+        collect=gc.isenabled()
+        gc.disable()    # a collection of the oldest generation, of all the objects of the kernel, takes longer than the budget
+        try:return self.search(turn,hougu,candidates,color,group)
+        finally:
+            if collect:gc.enable()
+    def search(self,turn,hougu,candidates,color,group):
+        start=time.perf_counter()
+        self.deadline=start+self.budget
+        np=turn.snapshot.np
+        profile=self.profile(tuple(turn.servant))
+        wave=self.round(getattr(turn,'waveHp',turn.enemy))
+        stages=max(0,turn.stageTotal-turn.stage)
+        best,bestTurns=candidates[0],None
+        for face in candidates[:self.beam]:
+            if time.perf_counter()>self.deadline:
+                self.cut+=1
+                break
+            hp,left=self.simulate(turn,list(hougu)+list(face),color,group,np)
+            try:turns=self.future(profile,self.round(hp),tuple(int(i//NP_STEP)for i in left),wave,stages,self.horizon)
+            except OutOfBudget:
+                self.cut+=1
+                break
+            if bestTurns is None or turns<bestTurns:best,bestTurns=face,turns
+        self.decisions+=1
+        self.changed+=best is not candidates[0]
+        self.spent+=time.perf_counter()-start
+        return list(best)
+    def __repr__(self):
+        return(f'{self.decisions} decisions in {self.spent/max(1,self.decisions)*1000:.2f}ms each, {self.changed} differing from the greedy chain, '
+               f'{self.cut} cut by the {self.budget*1000:g}ms budget, {self.reused} memoized states reused')
+lookahead=Lookahead()
@@ -0,0 +1,69 @@
+'Recovering from a tripped Fuse by recognizing the screen the script is stuck on'
+import time
+import fgoDevice
+from fgoLogging import getLogger
+from fgoSchedule import schedule
+logger=getLogger('Recover')
+
+def pressFriend(detect):
+    if detect.isNoFriend():fgoDevice.device.perform('\xBAK',(500,1000))
+    else:fgoDevice.device.touch((640,200))
+
+# (screen, detector, action): the first screen whose detector holds is the one the script is stuck on
+SCREENS=(
+    ('turn begin','isTurnBegin',None),
+    ('battle continue','isBattleContinue',lambda detect:fgoDevice.device.press('K')),
+    ('choose friend','isChooseFriend',pressFriend),
+    ('skill cast failed','isSkillCastFailed',lambda detect:fgoDevice.device.press('J')),
+)
+
+class Recovery:
+    '''
+    Called by the Fuse when it trips: classifies the screen with the detectors of SCREENS and applies the action of
+    the first match, returning at once so that the waiting script goes on. On a screen none of them knows it closes
+    whatever may be open (back, K, J) and looks again after a delay growing from initial by factor up to maximum
+    seconds. The Fuse gives the script grace more Detect before tripping again, and the attempts go on from where they
+    were until a detector matches outside of the recovery, which ends it, or attempts or timeout seconds have been spent,
+    which gives up. The time from the trip to the end of each recovery is logged.
+    '''
+    def __init__(self,initial=1.,factor=2.,maximum=60.,attempts=12,timeout=900.,grace=30):
+        self.initial,self.factor,self.maximum=initial,factor,maximum
+        self.attempts,self.timeout,self.grace=attempts,timeout,grace
+        self.running=False
+        self.start=None
+        self.tried=0
+        self.recovered=[]
+        self.failed=0
+    def __call__(self,detect):
+        'Whether the script may go on, after the action the screen of detect (or a later one) called for'
+        from fgoDetect import Detect
+        if self.start is None:self.start,self.tried=time.time(),0
+        self.running=True
+        try:
+            while self.tried<self.attempts and time.time()-self.start<self.timeout:
+                if self.tried:
+                    schedule.sleep(min(self.maximum,self.initial*self.factor**(self.tried-1)))
+                    detect=Detect(0)
+                elif detect is None:detect=Detect(0)     # tripped before the first frame
+                self.tried+=1
+                screen,action=next(((screen,action)for screen,detector,action in SCREENS if getattr(detect,detector)()),('unknown',None))
+                logger.warning(f'Fuse tripped, attempt {self.tried} after {time.time()-self.start:.1f}s: {screen} screen')
+                if screen!='unknown':
+                    if action:action(detect)
+                    return True
+                fgoDevice.device.perform('\x08KJ',(1000,1000,1000))
+            self.failed+=1
+            logger.error(f'Not recovered after {self.tried} attempts in {time.time()-self.start:.1f}s, {self}')
+            self.start=None
+            return False
+        finally:self.running=False
+    def done(self):
+        'Called by Fuse.reset: a detector matched, so a pending recovery has succeeded'
+        if self.running or self.start is None:return
+        self.recovered.append(time.time()-self.start)
+        logger.info(f'Recovered in {self.recovered[-1]:.1f}s after {self.tried} attempts, {self}')
+        self.start=None
+    def __repr__(self):
+        if not self.recovered:return f'no recovery, {self.failed} failed'
+        times=sorted(self.recovered)
+        return f'{len(times)} recoveries in {times[len(times)>>1]:.1f}s median and {times[-1]:.1f}s at most, {self.failed} failed'
@@ -0,0 +1,77 @@
+'Lazily computed battle state shared by the skill and card logic of a turn'
+
+class lazy:
+    'A BattleSnapshot field: func(snapshot) runs on first access of a frame, its result is kept in the slot _name'
+    __slots__=('func','slot')
+    def __init__(self,func):self.func,self.slot=func,'_'+func.__name__
+    def __get__(self,obj,cls=None):
+        if obj is None:return self
+        try:value,cost=getattr(obj,self.slot)
+        except AttributeError:
+            calls=obj.calls
+            value=self.func(obj)
+            setattr(obj,self.slot,(value,obj.calls-calls))
+            return value
+        obj.saved+=cost
+        return value
+
+class BattleSnapshot:
+    '''
+    What the detector reports about one frame, read on first access and then reused by every consumer of the turn.
+    of(detect) moves the snapshot to another frame (e.g. Detect.cache after a skill, or Detect() of the card screen),
+    keeping the fields of the old one aside: moving back to it, as conditions reading both the NP of the skill screen
+    and the peeked cards do, restores them instead of detecting them again. calls counts the detector calls made, saved the ones avoided by reusing a field.
+    Fields are tuples, so that a consumer cannot change what the next one sees.
+    '''
+    __slots__=('detect','servant','calls','saved','previous','_np','_hp','_enemyNp','_color','_sealed','_hougu','_resist','_critical','_group','_hand')
+    FIELDS=__slots__[5:]
+    def __init__(self,detect,servant):
+        self.detect,self.servant,self.calls,self.saved=detect,servant,0,0
+        self.previous=None,{}
+    def of(self,detect):
+        if detect is not self.detect:
+            previous=self.detect,{i:getattr(self,i)for i in self.FIELDS if hasattr(self,i)}
+            for i in previous[1]:delattr(self,i)
+            if self.previous[0]is detect:
+                for i,value in self.previous[1].items():setattr(self,i,value)
+            self.detect,self.previous=detect,previous
+        return self
+    def call(self,name,*args):
+        self.calls+=1
+        return getattr(self.detect,name)(*args)
+    @lazy
+    def np(self):return tuple(self.call('getFieldServantNp',i)for i in range(3))
+    @lazy
+    def hp(self):return tuple(self.call('getFieldServantHp',i)if self.servant[i][0]else 999999 for i in range(3))
+    @lazy
+    def enemyNp(self):return tuple(self.call('getEnemyNp',i)for i in range(6))
+    @lazy
+    def color(self):return tuple(self.call('getCardColor'))+tuple(i[5][1]for i in self.servant)
+    @lazy
+    def sealed(self):return tuple(self.call('isCardSealed'))
+    @lazy
+    def hougu(self):return tuple(self.call('isHouguReady'))
+    @lazy
+    def resist(self):return tuple([1,1.7,.6][i]for i in self.call('getCardResist'))
+    @lazy
+    def critical(self):return tuple(i/10 for i in self.call('getCardCriticalRate'))
+    @lazy
+    def group(self):return tuple([next(j for j,k in enumerate(self.servant)if k[0]==i)for i in self.call('getCardServant',[i[0]for i in self.servant if i[0]])])+(0,1,2)
+    @lazy
+    def hand(self):
+        '''
+        How many of the 5 command cards each servant has of each color, flattened as hand[4*servant+color].
+        servant 3 and color 3 stand for any, so that exists(Nx s.c) of a turn script is a single hand[...]>=N.
+        '''
+        count=[0]*16
+        for i,j in zip(self.group[:5],self.color[:5]):
+            count[15]+=1
+            if i in(0,1,2):count[4*i+3]+=1
+            if j in(0,1,2):
+                count[12+j]+=1
+                if i in(0,1,2):count[4*i+j]+=1
+        return tuple(count)
+    def cards(self):
+        'color,sealed,hougu,np,resist,critical,group as selectCard uses them, np being whether each servant is below 100%'
+        return self.color,self.sealed,self.hougu,[i<100 for i in self.np],self.resist,self.critical,self.group
+    def __repr__(self):return f'{self.calls} detector calls, {self.saved} saved by the snapshot'
@@ -0,0 +1,63 @@
+'On-disk cache of the decoded templates of ImageListener, memory-mapped on later starts'
+import atexit,json,os,cv2,numpy
+from fgoLogging import getLogger
+logger=getLogger('TemplateCache')
+
+DIR='fgoCache'
+
+def decode(file):return(lambda x:(x,numpy.max(x,axis=2)>>1))(cv2.imread(file))
+
+class TemplateCache:
+    '''
+    The (image, mask) pairs of the templates of a directory, in one binary file: the image (h*w*3 bytes) followed by
+    the mask (h*w bytes) of each template, at the offset its json index records along with the mtime and size of the
+    png it was decoded from. The binary file is memory-mapped copy-on-write, so a template whose png is unchanged costs a
+    stat and two array views; any other is decoded by cv2 and written to a new generation of the binary file at exit.
+    '''
+    def __init__(self,path,ends='.png',directory=DIR):
+        self.path,self.ends,self.directory=path,ends,directory
+        self.key=os.path.join(directory,''.join(i if i.isalnum()else'_'for i in os.path.abspath(path).strip(os.sep)))
+        self.entries,self.data,self.fresh={},None,{}
+        try:
+            with open(self.key+'.json',encoding='utf-8')as f:index=json.load(f)
+            self.data=numpy.memmap(os.path.join(directory,index['data']),numpy.uint8,'c')
+            self.entries=index['templates']
+            self.generation=index['generation']
+        except(OSError,ValueError,KeyError):self.generation=0
+        atexit.register(self.save)
+    def stamp(self,name):return(stat:=os.stat(self.path+name+self.ends)).st_mtime_ns,stat.st_size
+    def view(self,entry):
+        offset,h,w=entry[2:]
+        return self.data[offset:offset+h*w*3].reshape(h,w,3),self.data[offset+h*w*3:offset+h*w*4].reshape(h,w)
+    def load(self,name):
+        stamp=self.stamp(name)
+        if(entry:=self.entries.get(name))is not None and self.data is not None and tuple(entry[:2])==stamp:return self.view(entry)
+        self.fresh[name]=stamp,decode(self.path+name+self.ends)
+        return self.fresh[name][1]
+    def save(self):
+        'Writes the valid mapped templates and the newly decoded ones to the next generation of the binary file'
+        if not self.fresh:return
+        templates={}
+        data=f'{os.path.basename(self.key)}.{self.generation+1}.bin'
+        try:
+            os.makedirs(self.directory,exist_ok=True)
+            with open(os.path.join(self.directory,data),'wb')as f:
+                for name,entry in self.entries.items():
+                    if name in self.fresh or not os.path.exists(self.path+name+self.ends)or tuple(entry[:2])!=self.stamp(name):continue
+                    templates[name]=entry[:2]+[f.tell()]+entry[3:]
+                    for i in self.view(entry):f.write(i.tobytes())
+                for name,(stamp,(image,mask))in self.fresh.items():
+                    templates[name]=list(stamp)+[f.tell(),*image.shape[:2]]
+                    f.write(image.tobytes())
+                    f.write(mask.astype(numpy.uint8).tobytes())
+            with open(self.key+'.json.tmp','w',encoding='utf-8')as f:json.dump({'generation':self.generation+1,'data':data,'templates':templates},f)
+            os.replace(self.key+'.json.tmp',self.key+'.json')
+        except OSError as e:return logger.warning(f'Template cache of {self.path} not saved: {e}')
+        logger.info(f'Template cache of {self.path}: {len(self.fresh)} decoded, {len(templates)} cached')
+        self.fresh={}
+        # older generations may still be mapped by another process (and on Windows cannot be removed then), try again next time
+        prefix=os.path.basename(self.key)+'.'
+        for i in os.listdir(self.directory):
+            if i.startswith(prefix)and i.endswith('.bin')and i!=data:
+                try:os.remove(os.path.join(self.directory,i))
+                except OSError:pass
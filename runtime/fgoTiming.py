@@ -0,0 +1,97 @@
+'Adaptive action timing: an action is over once the screen transition it causes is detected'
+import json,time,numpy
+import fgoDevice
+from fgoDetect import Detect
+from fgoLogging import getLogger
+from fgoWait import PollPolicy,wait_until
+logger=getLogger('Timing')
+
+PROFILE='fgoTimingProfile.json'
+
+class Settled:
+    '''
+    A wait_until predicate: the screen has left the frame it showed before the action and stopped moving,
+    i.e. two consecutive polls differ by less than threshold (mean absolute difference on every 4th pixel)
+    '''
+    def __init__(self,before,threshold=2.):
+        self.before,self.last,self.left,self.threshold=before,None,False,threshold
+    @staticmethod
+    def distance(a,b):return numpy.abs(a.astype(numpy.int16)-b).mean()
+    def __call__(self,detect):
+        frame=detect.im[::4,::4]
+        self.left=self.left or self.distance(frame,self.before)>=self.threshold
+        settled=self.left and self.last is not None and self.distance(frame,self.last)<self.threshold
+        self.last=frame
+        return settled
+
+class LatencyProfile:
+    '''
+    The latest window latencies of each kind of action, per device, persisted in PROFILE so that a new session
+    starts from what the device was measured to need. Percentiles are only trusted after minSamples latencies.
+    '''
+    def __init__(self,path=PROFILE,window=200,minSamples=10):
+        self.path,self.window,self.minSamples,self.dirty=path,window,minSamples,False
+        try:
+            with open(path,encoding='utf-8')as f:self.devices=json.load(f)
+        except(OSError,ValueError):self.devices={}
+    def samples(self,label):return self.devices.setdefault(getattr(fgoDevice.device,'name',None)or'default',{}).setdefault(label,[])
+    def add(self,label,latency):
+        samples=self.samples(label)
+        samples.append(round(latency,3))
+        del samples[:-self.window]
+        self.dirty=True
+    def percentile(self,label,q,default=None):return float(numpy.percentile(samples,q))if len(samples:=self.samples(label))>=self.minSamples else default
+    def save(self):
+        if not self.dirty:return
+        try:
+            with open(self.path,'w',encoding='utf-8')as f:json.dump(self.devices,f)
+            self.dirty=False
+        except OSError as e:logger.warning(f'Latency profile not saved: {e}')
+    def __repr__(self):return ', '.join(f'{label} p50 {numpy.percentile(samples,50):.2f}s p90 {numpy.percentile(samples,90):.2f}s'for label,samples in self.devices.get(getattr(fgoDevice.device,'name',None)or'default',{}).items()if samples)
+
+class Timing:
+    '''
+    perform() replaces fgoDevice.device.perform(keys,wait) for actions that move to another screen: the wait after the
+    last key ends as soon as the transition is detected, the fixed delay being only its upper bound.
+    The first poll comes at half the 10th percentile of the latencies learned for that kind of action, the next ones
+    every .15s.
+    With adaptive off, the default unless --adaptive-delays is given, the fixed delays are waited as before.
+    '''
+    def __init__(self):
+        self.adaptive=False
+        self.profile=LatencyProfile()
+        self.total=[0,0.,0]
+        self.window=[0,0.,0]
+    def policy(self,label,bound):
+        # half the 10th percentile, as a learned latency includes up to two polls after the screen settled
+        return PollPolicy(min(bound,max(.1,self.profile.percentile(label,10,0)/2)),1.,.15)
+    def perform(self,keys,wait,label,until=None):
+        '''
+        keys and wait as for fgoDevice.device.perform; label names the kind of action the latency is learned for;
+        until(detect) tells that the transition is over, by default the screen changed and Settled
+        '''
+        if not self.adaptive:return fgoDevice.device.perform(keys,wait)
+        keys=keys[:len(wait)]
+        fgoDevice.device.perform(keys[:-1],wait[:-1])
+        until=until or Settled(Detect(0).im[::4,::4])
+        bound=wait[-1]/1000
+        policy=self.policy(label,bound)
+        start=time.time()
+        fgoDevice.device.press(keys[-1])
+        # the deadline is checked after a poll, so stop early enough for the last poll to end within the bound
+        confirmed=wait_until(until,max(0,bound-policy.maximum),policy,not isinstance(until,Settled))is not None
+        latency=time.time()-start
+        if confirmed:self.profile.add(label,latency)
+        for i in self.total,self.window:
+            i[0]+=1
+            i[1]+=max(0,bound-latency)
+            i[2]+=not confirmed
+    @staticmethod
+    def format(actions,saved,timeouts):return f'{actions} timed actions, {saved:.1f}s of fixed delays saved, {timeouts} unconfirmed'
+    def take(self):
+        'Summary of the actions since the previous call, the profile is saved along'
+        result,self.window=self.format(*self.window),[0,0.,0]
+        self.profile.save()
+        return result
+    def __repr__(self):return f'{self.format(*self.total)}, {self.profile}'
+timing=Timing()
@@ -0,0 +1,78 @@
+'Chrome trace (chrome://tracing, Perfetto) timelines of battles, hooked into the kernel only while enabled'
+import functools,json,os,threading,time,types
+import fgoDevice
+from fgoDetect import Detect
+from fgoTiming import Timing
+from fgoLogging import getLogger
+logger=getLogger('Trace')
+
+TURN_PHASES=('__call__','dispatchSkill','cast','selectCard')
+
+class Tracer:
+    '''
+    enable() wraps Battle.__call__, the phases of every Turn and CustomTurn class (__call__, dispatchSkill, cast*, selectCard*),
+    the construction of Detect, its is*/get* detector calls, fgoDevice.device.perform and timing.perform with spans, and writes each
+    battle to directory as battle-<start time>-<count>.json. While disabled nothing is wrapped, so the kernel runs as is.
+    '''
+    def __init__(self):
+        self.events=[]
+        self.patched=[]
+        self.directory=None
+        self.battles=0
+    @property
+    def enabled(self):return bool(self.patched)
+    def span(self,func,name,cat,argsOf=None):
+        @functools.wraps(func)
+        def wrapper(*args,**kwargs):
+            start=time.perf_counter_ns()
+            try:return func(*args,**kwargs)
+            finally:self.events.append((name,cat,start,time.perf_counter_ns()-start,threading.get_ident(),argsOf and argsOf(*args,**kwargs)))
+        return wrapper
+    def battle(self,func):
+        @functools.wraps(func)
+        def wrapper(*args,**kwargs):
+            self.events=[]
+            start=time.localtime()
+            try:return func(*args,**kwargs)
+            finally:self.write(start)
+        return wrapper
+    def patch(self,owner,name,cat,argsOf=None):
+        func=owner.__dict__[name]
+        self.patched.append((owner,name,func))
+        setattr(owner,name,self.span(func,f'{owner.__name__}.{name}',cat,argsOf))
+    def traceTurn(self,cls):
+        'Wraps the phases cls defines, unless they already are'
+        if any(owner is cls for owner,_,_ in self.patched):return
+        for name,func in list(vars(cls).items()):
+            if isinstance(func,types.FunctionType)and name.startswith(TURN_PHASES):self.patch(cls,name,'turn',lambda self,*args,**kwargs:args and{'args':repr(args)})
+    def enable(self,directory='fgoTrace'):
+        if self.enabled:return
+        import fgoKernel
+        self.directory=directory
+        self.patch(fgoKernel.Battle,'__call__','battle')
+        fgoKernel.Battle.__call__=self.battle(fgoKernel.Battle.__call__)
+        turns=[fgoKernel.Turn,fgoKernel.CustomTurn]  # CustomTurn, PlanTurn and the generated turns do not derive from Turn
+        for cls in turns:
+            turns+=[i for i in cls.__subclasses__()if i not in turns]
+            self.traceTurn(cls)
+        for cls in Detect.__mro__[:-1]:
+            for name,func in list(vars(cls).items()):
+                if isinstance(func,types.FunctionType)and(name=='__init__'or name.startswith(('is','get'))):self.patch(cls,name,'detect')
+        self.patch(next(i for i in type(fgoDevice.device).__mro__ if'perform'in vars(i)),'perform','device',lambda self,pos,wait:{'keys':str(pos),'wait':list(wait)})
+        self.patch(Timing,'perform','device',lambda self,keys,wait,label,until=None:{'label':label})
+        logger.info(f'Tracing {len(self.patched)} functions into {directory}')
+    def disable(self):
+        for owner,name,func in reversed(self.patched):setattr(owner,name,func)
+        self.patched=[]
+    def write(self,start):
+        pid=os.getpid()
+        events=[{'name':name,'cat':cat,'ph':'X','ts':begin/1000,'dur':duration/1000,'pid':pid,'tid':tid}|({'args':args}if args else{})for name,cat,begin,duration,tid,args in self.events]
+        self.events=[]
+        self.battles+=1
+        path=os.path.join(self.directory,f'battle-{time.strftime("%Y%m%d-%H%M%S",start)}-{self.battles}.json')
+        try:
+            os.makedirs(self.directory,exist_ok=True)
+            with open(path,'w',encoding='utf-8')as f:json.dump({'traceEvents':events,'displayTimeUnit':'ms'},f)
+            logger.info(f'{len(events)} spans written to {path}')
+        except OSError as e:logger.warning(f'Trace not written: {e}')
+tracer=Tracer()
@@ -0,0 +1,57 @@
+'Resolving the --turnClass of fgoCli through the Turn class index install.py writes'
+import json,os
+from fgoLogging import getLogger
+logger=getLogger('TurnIndex')
+
+INDEX='fgoTurnIndex.json'
+KERNEL='fgoKernel.py'
+
+class PrefixTrie:
+    'Every node keeps the names going through it, so that a prefix lookup is a walk of len(prefix) nodes'
+    def __init__(self,names):
+        self.root={'':[]}
+        for name in names:
+            node=self.root
+            node[''].append(name)
+            for char in name:
+                node=node.setdefault(char,{'':[]})
+                node[''].append(name)
+    def find(self,prefix):
+        node=self.root
+        for char in prefix:
+            if(node:=node.get(char))is None:return[]
+        return node['']
+
+class TurnIndex:
+    '''
+    The Turn classes of fgoKernel.py as install.py indexed them (name, source file, hash of the source), along with
+    the size and mtime of fgoKernel.py. A changed size or mtime makes the index stale, and the Turn classes of the
+    loaded fgoKernel module are used instead, so that resolving never parses fgoKernel.py.
+    '''
+    def __init__(self,path=INDEX,kernel=KERNEL):
+        self.path,self.kernel=path,kernel
+        self.trie=None
+        self.stamp=None
+        try:
+            with open(path,encoding='utf-8')as f:index=json.load(f)
+            self.turns={i['name']:i for i in index['turns']}
+            self.stamp=index['kernel']['size'],index['kernel']['mtime_ns']
+        except(OSError,ValueError,KeyError):self.turns={}
+    def stale(self):
+        try:stat=os.stat(self.kernel)
+        except OSError:return True
+        return self.stamp!=(stat.st_size,stat.st_mtime_ns)
+    def names(self,module):
+        if self.turns and not self.stale()and all(hasattr(module,i)for i in self.turns):return list(self.turns)
+        logger.warning(f'{self.path} is missing or stale, run install.py again; using the Turn classes of the loaded {module.__name__}')
+        bases=tuple(getattr(module,i)for i in('Turn','CustomTurn')if hasattr(module,i))
+        return[name for name,value in vars(module).items()if isinstance(value,type)and issubclass(value,bases)]
+    def resolve(self,prefix,module):
+        'The Turn class name of module starting with prefix, an exact match winning over longer names'
+        if self.trie is None or self.stale():self.trie=PrefixTrie(self.names(module))
+        match self.trie.find(prefix):
+            case[]:raise ValueError(f'No Turn class starts with {prefix}')
+            case[name]:return name
+            case names if prefix in names:return prefix
+            case names:raise ValueError(f'The turnClass {prefix} matches multiple Turn classes: {", ".join(names)}')
+turnIndex=TurnIndex()
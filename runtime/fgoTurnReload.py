@@ -0,0 +1,88 @@
+'Hot reload of the customized Turn classes, swapped in when the next battle starts'
+import json,os,platform,sys,threading,time
+from fgoLogging import getLogger
+from fgoTurnIndex import INDEX
+logger=getLogger('TurnReload')
+
+class TurnReloader:
+    '''
+    Watches the turn scripts and Turn class files install.py installed (as listed in the Turn class index) and, when one
+    changes, translates it again in a background thread: the plan of a PlanTurn is recompiled in place, where PlanTurn
+    reads it at the start of the next battle, and any other Turn class is rebuilt from its new source in the namespace of
+    fgoKernel. swap(turnClass) is called by Battle.__init__ and hands out the rebuilt class, so a battle always ends with
+    the class it started with and Main goes on looping. A file that fails to translate leaves the running class in place.
+    A class swapped in while tracing is traced as well.
+    On Windows the DirListener of fgoImageListener tells which files changed, elsewhere their mtime is polled.
+    '''
+    def __init__(self,index=INDEX,interval=1.):
+        self.index,self.interval=index,interval
+        self.thread=None
+        self.stopping=threading.Event()
+        self.turns={}
+        self.classes={}
+        self.changed={}
+    def start(self):
+        if self.thread is not None:return
+        try:
+            with open(self.index,encoding='utf-8')as f:index=json.load(f)
+        except(OSError,ValueError)as e:return logger.warning(f'Hot reload disabled, {self.index} not readable: {e}')
+        self.turns={os.path.abspath(i.get('script')or i['source']):i['name']for i in index['turns']if i['sha256']}
+        if not self.turns:return logger.warning('Hot reload disabled, no customized Turn class installed')
+        if(translator:=index.get('translator'))and translator not in sys.path:sys.path.append(translator)
+        self.stamps={path:self.stamp(path)for path in self.turns}
+        self.listeners=[]
+        if platform.system()=='Windows':
+            from fgoImageListener import DirListener
+            self.listeners=[(directory,DirListener(directory+os.sep))for directory in{os.path.dirname(i)for i in self.turns}]
+        self.stopping.clear()
+        self.thread=threading.Thread(target=self.watch,daemon=True,name='TurnReloader')
+        self.thread.start()
+        logger.info(f'Watching {len(self.turns)} Turn files for changes')
+    def stop(self):
+        'Returns once the watcher thread has ended, so that a following start() cannot run two of them'
+        if self.thread is None:return
+        self.stopping.set()
+        self.thread.join()
+        self.thread=None
+    @staticmethod
+    def stamp(path):
+        try:return(stat:=os.stat(path)).st_mtime_ns,stat.st_size
+        except OSError:return None
+    def watch(self):
+        while not self.stopping.wait(self.interval):
+            paths=[path for directory,listener in self.listeners for _,file in listener.get()if(path:=os.path.join(directory,file))in self.turns]if self.listeners else self.turns
+            for path in paths:
+                if(stamp:=self.stamp(path))is not None and stamp!=self.stamps[path]:
+                    self.stamps[path]=stamp
+                    self.reload(path)
+    def reload(self,path):
+        import fgoKernel
+        name=self.turns[path]
+        start=time.perf_counter()
+        try:
+            if path.endswith('.py'):
+                with open(path,encoding='utf-8')as f:source=f.read()
+            elif issubclass(old:=getattr(fgoKernel,name),fgoKernel.PlanTurn):
+                from tokenizer import generatePlan
+                plan=generatePlan(path)
+                with open(old.plan+'.tmp','w',encoding='utf-8')as f:json.dump(plan,f,separators=(',',':'))
+                os.replace(old.plan+'.tmp',old.plan)
+                return logger.info(f'Plan of {name} recompiled from {path} in {(time.perf_counter()-start)*1000:.1f}ms, loaded at the next battle')
+            else:
+                from tokenizer import generateCustomizedTurn
+                source=generateCustomizedTurn(path)
+            namespace=dict(vars(fgoKernel))
+            exec(compile(source,path,'exec'),namespace)
+            self.classes[name]=namespace[name]
+            self.changed[name]=time.time()
+            logger.info(f'{name} rebuilt from {path} in {(time.perf_counter()-start)*1000:.1f}ms, swapped in at the next battle')
+        except Exception as e:logger.warning(f'Reloading {name} from {path} failed, keeping the running class: {type(e).__name__}: {e}')
+    def swap(self,turnClass):
+        if(cls:=self.classes.get(turnClass.__name__,turnClass))is turnClass:return turnClass
+        if(changed:=self.changed.pop(cls.__name__,None))is not None:
+            import fgoKernel
+            setattr(fgoKernel,cls.__name__,cls)
+            if fgoKernel.tracer.enabled:fgoKernel.tracer.traceTurn(cls)
+            logger.info(f'{cls.__name__} swapped in {time.time()-changed:.1f}s after the change')
+        return cls
+turnReloader=TurnReloader()
@@ -0,0 +1,68 @@
+'Waiting for a screen state by polling the detector'
+import time,numpy
+from typing import NamedTuple
+from fgoDetect import Detect
+from fgoLogging import getLogger
+logger=getLogger('Wait')
+
+class PollPolicy(NamedTuple):
+    'Poll after initial seconds, then wait factor times longer before each following poll, at most maximum seconds'
+    initial:float=.1
+    factor:float=1.5
+    maximum:float=.5
+    def intervals(self):
+        interval=self.initial
+        while True:
+            yield interval
+            interval=min(self.maximum,interval*self.factor)
+
+TURN_BEGIN=PollPolicy()
+CHOOSE_FRIEND=PollPolicy(.2,1.5,1.)
+
+class WaitStats:
+    'Polls per wait_until, in total and since the last take()'
+    def __init__(self):
+        self.total=[0,0,0,0]
+        self.window=[0,0,0,0]
+        self.maxPolls=0
+    def add(self,polls,skipped,timeout):
+        for i in self.total,self.window:
+            i[0]+=1
+            i[1]+=polls
+            i[2]+=skipped
+            i[3]+=timeout
+        self.maxPolls=max(self.maxPolls,polls)
+    @staticmethod
+    def format(waits,polls,skipped,timeouts):return f'{waits} waits, {polls/max(1,waits):.1f} polls/wait, {skipped} unchanged frames skipped, {timeouts} timeouts'
+    def take(self):
+        'Summary of the waits since the previous call'
+        result,self.window=self.format(*self.window),[0,0,0,0]
+        return result
+    def __repr__(self):return f'{self.format(*self.total)}, at most {self.maxPolls} polls'
+waitStats=WaitStats()
+
+def wait_until(predicate,timeout=None,poll_policy=TURN_BEGIN,skip_unchanged=True):
+    '''
+    Polls Detect() at the intervals of poll_policy until predicate(detect) holds and returns that detect (Detect.cache),
+    or None once timeout seconds have passed. The sleep before each screenshot goes through fgoSchedule, so stop
+    requests are honored, and every poll feeds the Fuse like any other Detect, so a wait that never ends is left to it.
+    A frame equal to the previously analyzed one (compared on every 4th pixel) is not analyzed again, unless
+    skip_unchanged is False, for predicates that look for a screen to stop changing.
+    '''
+    deadline=None if timeout is None else time.time()+timeout
+    polls=skipped=0
+    last=None
+    for interval in poll_policy.intervals():
+        detect=Detect(interval)
+        polls+=1
+        frame=detect.im[::4,::4]
+        if skip_unchanged and last is not None and numpy.array_equal(frame,last):skipped+=1
+        elif predicate(detect):
+            waitStats.add(polls,skipped,False)
+            logger.debug(f'{polls} polls, {skipped} skipped')
+            return detect
+        else:last=frame
+        if deadline is not None and time.time()>=deadline:
+            waitStats.add(polls,skipped,True)
+            logger.warning(f'Wait timed out after {polls} polls')
+            return None
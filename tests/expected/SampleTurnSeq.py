@@ -0,0 +1,70 @@
+class SampleTurnSeqTurn(CustomTurn):
+    def __init__(self):
+        super(SampleTurnSeqTurn, self).__init__()
+    def __call__(self,turn):
+        self.prepare(turn)
+        if self.stage==1 and self.stageTurn==1:
+            if self.peekHand()[2]>=2 and self.snapshot.of(self.skillFrame()).np[0] >= 49:
+                self.castSkillQueue([(0,0,2,2),(0,0,0,-1),(0,0,1,2),(1,2,[1])])
+            else:
+                self.openCards()
+                timing.perform(self.selectCard(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
+                return
+            self.openCards()
+            timing.perform(self.selectCard_s1st1_0(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
+        elif self.stage==2 and self.stageTurn==1:
+            self.castSkillQueue([(0,1,0,2),(0,1,1,2),(0,1,2,2)])
+            self.openCards()
+            timing.perform(self.selectCard_s2st1_0(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
+        else:
+            self.dispatchSkill()
+            self.openCards()
+            timing.perform(self.selectCard(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
+
+    selectCardTable_s1st1_0=(b'\x00\x00\x00\x00\x00\x00\x01\x02\x03',4,bytes.fromhex('00000000010000010001000100000000020303020400000104010304050003020002030205020005040100010502000200030300040000010401000100000000060707060800000108010708090007060a0303020400000104010304050003020a02070a05020005080107080a02070a0b030706040000010801070809000706000607060906000908010001090600060b06030b09060009040103040b06030b0a0203020502000504010001050200020b060306090600090401000109060006000707000800000108010001000000000a0303020400000104010304050003020a020302050200050401000105020002000303000400000104010001000000000c0d0d0c0e0000010e010d0e0f000d0c1003030204000001040103040500030210020d10050200050e010d0e10020d1011030d0c040000010e010d0e0f000d0c120707060800000108010708090007060a0303020400000104010304050003020a02070a05020005080107080a02070a0b03070604000001080107080900070612060d12090600090e010d0e12060d120b06030b09060009040103040b06030b10020d10050200050e010d0e10020d1012060d12090600090e010d0e12060d1213070d0c080000010e010d0e0f000d0c0a03030204000001040103040500030210020d10050200050e010d0e10020d1011030d0c040000010e010d0e0f000d0c000c0d0c0f0c000f0e0100010f0c000c110c03110f0c000f04010304110c031110020302050200050401000105020002110c030c0f0c000f040100010f0c000c130c07130f0c000f08010708130c0713110c03110f0c000f04010304110c03110a02070a05020005080107080a02070a130c07130f0c000f08010708130c0713120607060906000908010001090600060b06030b09060009040103040b06030b0a0203020502000504010001050200020b060306090600090401000109060006130c070c0f0c000f080100010f0c000c110c03110f0c000f04010304110c03110a020302050200050401000105020002110c030c0f0c000f040100010f0c000c000d0d000e0000010e01000100000000100303020400000104010304050003021002030205020005040100010502000200030300040000010401000100000000120707060800000108010708090007060a0303020400000104010304050003020a02070a05020005080107080a02070a0b030706040000010801070809000706120607060906000908010001090600060b06030b09060009040103040b06030b0a0203020502000504010001050200020b060306090600090401000109060006000707000800000108010001000000000a0303020400000104010304050003020a02030205020005040100010502000200030300040000010401000100000000'),(([], [0, 1]), ([], [1, 0]), ([], [2, 0]), ([], [0, 2]), ([], [1, 2]), ([], [2, 1]), ([], [3, 0]), ([], [0, 3]), ([], [1, 3]), ([], [3, 1]), ([], [2, 3]), ([], [3, 2]), ([], [4, 0]), ([], [0, 4]), ([], [1, 4]), ([], [4, 1]), ([], [2, 4]), ([], [4, 2]), ([], [3, 4]), ([], [4, 3])))
+    @logit(logger,logging.INFO)
+    def selectCard_s1st1_0(self):
+        color,hougu,group=(s:=self.snapshot.of(self.openCards())).color,s.hougu,s.group
+        self.dispatchHougu(hougu)
+
+        fgoDevice.device.perform('\x67\x68\x69\x64\x65\x66'[2],(500,))
+        classes,base,table,picks=self.selectCardTable_s1st1_0
+        if all(0<=group[i]<3 and 0<=color[i]<3 for i in range(5)):
+            pre_card,post_card=picks[table[sum(classes[group[i]*3+color[i]]*base**i for i in range(5))]]
+        else:
+            def pre_evaluate(card):
+                mark = -10000
+                return mark
+            def post_evaluate(card):
+                mark = -10000
+                if group[card[0]] == 2 and color[card[0]] == 1 and group[card[1]] == 2 and color[card[1]] == 0: mark=0
+                elif group[card[0]] == 2 and color[card[0]] == 1 and group[card[1]] == 2 and True: mark=-1
+                elif group[card[0]] == 2 and color[card[0]] == 0 and group[card[1]] == 2 and True: mark=-2
+                elif group[card[0]] == 2 and color[card[0]] == 0 and True and True: mark=-3
+                return mark
+            pre_card=[]
+            post_card=list(max(permutations({0,1,2,3,4}-set(pre_card),2),key=lambda x:post_evaluate(list(x))))
+        return''.join(['12345678'[i]for i in pre_card+[7]+post_card+list({0,1,2,3,4}-set(post_card)-set(pre_card))])
+    selectCardTable_s2st1_0=(b'\x00\x00\x00\x00\x00\x00\x01\x02\x03',4,bytes.fromhex('000000000100000001000000010101000203030304000000040303030401040002030303040000000400000004010100020202030502050305020203040404000607070708000000080707070801080009030303040000000403030304010400090707070800000008070707080108000902090305020503090209030404040006070707080000000800000008010100090303030400000004030303040104000903030304000000040000000401010009020203050205030502020304040400060606070a060a070a060607080808000b060b070a060a070b060b07080808000b0606070a060a070a06060708080800090909030909090309090903040404000c0d0d0d0e0000000e0d0d0d0e010e000f0303030400000004030303040104000f0d0d0d0e0000000e0d0d0d0e010e000f020f03050205030f020f030404040010070707080000000807070708010800090303030400000004030303040104000907070708000000080707070801080009020903050205030902090304040400100d0d0d0e0000000e0d0d0d0e010e000f0303030400000004030303040104000f0d0d0d0e0000000e0d0d0d0e010e000f020f03050205030f020f0304040400100610070a060a0710061007080808000b060b070a060a070b060b0708080800100610070a060a071006100708080800090909030909090309090903040404000c0d0d0d0e0000000e0000000e0101000f0303030400000004030303040104000f0303030400000004000000040101000f0202030502050305020203040404001007070708000000080707070801080009030303040000000403030304010400090707070800000008070707080108000902090305020503090209030404040010070707080000000800000008010100090303030400000004030303040104000903030304000000040000000401010009020203050205030502020304040400100606070a060a070a060607080808000b060b070a060a070b060b07080808000b0606070a060a070a06060708080800090909030909090309090903040404000c0c0c0d110c110d110c0c0d0e0e0e00120c120d110c110d120c120d0e0e0e00120c0c0d110c110d110c0c0d0e0e0e000f0f0f030f0f0f030f0f0f0304040400130c130d110c110d130c130d0e0e0e00120c120d110c110d120c120d0e0e0e00130c130d110c110d130c130d0e0e0e000f0f0f030f0f0f030f0f0f0304040400130c0c0d110c110d110c0c0d0e0e0e00120c120d110c110d120c120d0e0e0e00120c0c0d110c110d110c0c0d0e0e0e000f0f0f030f0f0f030f0f0f030404040010101007101010071010100708080800101010071010100710101007080808001010100710101007101010070808080009090903090909030909090304040400'),(([0], [1]), ([1], [0]), ([2], [0]), ([0], [2]), ([1], [2]), ([2], [1]), ([3], [0]), ([0], [3]), ([1], [3]), ([2], [3]), ([3], [1]), ([3], [2]), ([4], [0]), ([0], [4]), ([1], [4]), ([2], [4]), ([3], [4]), ([4], [1]), ([4], [2]), ([4], [3])))
+    @logit(logger,logging.INFO)
+    def selectCard_s2st1_0(self):
+        color,hougu,group=(s:=self.snapshot.of(self.openCards())).color,s.hougu,s.group
+        self.dispatchHougu(hougu)
+        classes,base,table,picks=self.selectCardTable_s2st1_0
+        if all(0<=group[i]<3 and 0<=color[i]<3 for i in range(5)):
+            pre_card,post_card=picks[table[sum(classes[group[i]*3+color[i]]*base**i for i in range(5))]]
+        else:
+            def pre_evaluate(card):
+                mark = -10000
+                if group[card[0]] == 2 and color[card[0]] == 2: mark=0
+                elif group[card[0]] == 2 and True: mark=-1
+                return mark
+            def post_evaluate(card):
+                mark = -10000
+                if group[card[0]] == 2 and color[card[0]] == 2: mark=0
+                elif group[card[0]] == 2 and color[card[0]] == 0: mark=-1
+                elif group[card[0]] == 2 and color[card[0]] == 1: mark=-2
+                return mark
+            pre_card=list(max(permutations(range(5),1),key=lambda x:pre_evaluate(list(x))))
+            post_card=list(max(permutations({0,1,2,3,4}-set(pre_card),1),key=lambda x:post_evaluate(list(x))))
+        return''.join(['12345678'[i]for i in pre_card+[7]+post_card+list({0,1,2,3,4}-set(post_card)-set(pre_card))])
\ No newline at end of file
@@ -0,0 +1,132 @@
+class WhitePaper90SSTurn(CustomTurn):
+    def __init__(self):
+        super(WhitePaper90SSTurn, self).__init__()
+    def __call__(self,turn):
+        self.prepare(turn)
+        if self.stage==1 and self.stageTurn==1:
+            self.castSkillQueue([(0,0,0,-1),(0,0,1,-1),(0,1,1,1),(1,0,[0])])
+            self.openCards()
+            timing.perform(self.selectCard_for_np(0,),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
+            return
+        elif self.stage==1 and self.stageTurn==2:
+            self.castSkillQueue([(0,0,2,-1),(0,2,0,0),(0,2,1,0),(0,2,2,0),(0,1,2,-1),(0,1,0,0),(1,2,[0]),(0,0,0,-1),(0,0,1,-1)])
+            self.openCards()
+            timing.perform(self.selectCard_s1st2_0(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
+        elif self.stage==2 and self.stageTurn==1:
+            self.castSkillQueue([(0,0,2,-1)])
+            self.openCards()
+            timing.perform(self.selectCard_s2st1_0(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
+        elif self.stage==2 and self.stageTurn==2:
+            if self.peekHand()[3]>=2:
+                self.openCards()
+                timing.perform(self.selectCard_s2st2_0(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
+            elif self.peekHand()[3]>=1:
+                self.openCards()
+                timing.perform(self.selectCard_s2st2_1(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
+            else:
+                self.openCards()
+                timing.perform(self.selectCard_s2st2_2(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
+        else:
+            self.dispatchSkill()
+            self.openCards()
+            timing.perform(self.selectCard(),(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished())
+
+    selectCardTable_s1st2_0=(b'\x00\x00\x01\x00\x00\x00\x00\x00\x00',2,bytes.fromhex('00000100020304000506070008030400090a0b000c0304000d06070008030400'),(([0], [1]), ([1], [0]), ([2], [0]), ([0], [2]), ([1], [2]), ([3], [0]), ([0], [3]), ([1], [3]), ([2], [3]), ([4], [0]), ([0], [4]), ([1], [4]), ([2], [4]), ([3], [4])))
+    @logit(logger,logging.INFO)
+    def selectCard_s1st2_0(self):
+        color,hougu,group=(s:=self.snapshot.of(self.openCards())).color,s.hougu,s.group
+        self.dispatchHougu(hougu)
+
+        fgoDevice.device.perform('\x67\x68\x69\x64\x65\x66'[2],(500,))
+        classes,base,table,picks=self.selectCardTable_s1st2_0
+        if all(0<=group[i]<3 and 0<=color[i]<3 for i in range(5)):
+            pre_card,post_card=picks[table[sum(classes[group[i]*3+color[i]]*base**i for i in range(5))]]
+        else:
+            def pre_evaluate(card):
+                mark = -10000
+                if group[card[0]] == 0 and color[card[0]] == 2: mark=0
+                return mark
+            def post_evaluate(card):
+                mark = -10000
+                if group[card[0]] == 0 and color[card[0]] == 2: mark=0
+                return mark
+            pre_card=list(max(permutations(range(5),1),key=lambda x:pre_evaluate(list(x))))
+            post_card=list(max(permutations({0,1,2,3,4}-set(pre_card),1),key=lambda x:post_evaluate(list(x))))
+        return''.join(['12345678'[i]for i in pre_card+[5]+post_card+list({0,1,2,3,4}-set(post_card)-set(pre_card))])
+    selectCardTable_s2st1_0=(b'\x00\x00\x01\x00\x00\x00\x00\x00\x00',2,bytes.fromhex('0000000000010200000304000501020000060700080102000903040005010200'),(([], [0, 1]), ([], [0, 2]), ([], [1, 2]), ([], [0, 3]), ([], [1, 3]), ([], [2, 3]), ([], [0, 4]), ([], [1, 4]), ([], [2, 4]), ([], [3, 4])))
+    @logit(logger,logging.INFO)
+    def selectCard_s2st1_0(self):
+        color,hougu,group=(s:=self.snapshot.of(self.openCards())).color,s.hougu,s.group
+        self.dispatchHougu(hougu)
+        classes,base,table,picks=self.selectCardTable_s2st1_0
+        if all(0<=group[i]<3 and 0<=color[i]<3 for i in range(5)):
+            pre_card,post_card=picks[table[sum(classes[group[i]*3+color[i]]*base**i for i in range(5))]]
+        else:
+            def pre_evaluate(card):
+                mark = -10000
+                return mark
+            def post_evaluate(card):
+                mark = -10000
+                if group[card[0]] == 0 and color[card[0]] == 2 and group[card[1]] == 0 and color[card[1]] == 2: mark=0
+                return mark
+            pre_card=[]
+            post_card=list(max(permutations({0,1,2,3,4}-set(pre_card),2),key=lambda x:post_evaluate(list(x))))
+        return''.join(['12345678'[i]for i in pre_card+[5]+post_card+list({0,1,2,3,4}-set(post_card)-set(pre_card))])
+    selectCardTable_s2st2_0=(b'\x00\x00\x00\x01\x01\x01\x01\x01\x01',2,bytes.fromhex('0001020300040506000102070008090000010203000405000001020000000000'),(([0, 1], []), ([1, 2], []), ([0, 2], []), ([2, 3], []), ([1, 3], []), ([0, 3], []), ([3, 4], []), ([2, 4], []), ([1, 4], []), ([0, 4], [])))
+    @logit(logger,logging.INFO)
+    def selectCard_s2st2_0(self):
+        color,hougu,group=(s:=self.snapshot.of(self.openCards())).color,s.hougu,s.group
+        self.dispatchHougu(hougu)
+        classes,base,table,picks=self.selectCardTable_s2st2_0
+        if all(0<=group[i]<3 and 0<=color[i]<3 for i in range(5)):
+            pre_card,post_card=picks[table[sum(classes[group[i]*3+color[i]]*base**i for i in range(5))]]
+        else:
+            def pre_evaluate(card):
+                mark = -10000
+                if group[card[0]] == 0 and True and group[card[1]] == 0 and True: mark=0
+                return mark
+            def post_evaluate(card):
+                mark = -10000
+                return mark
+            pre_card=list(max(permutations(range(5),2),key=lambda x:pre_evaluate(list(x))))
+            post_card=[]
+        return''.join(['12345678'[i]for i in pre_card+[5]+post_card+list({0,1,2,3,4}-set(post_card)-set(pre_card))])
+    selectCardTable_s2st2_1=(b'\x00\x00\x00\x01\x01\x01\x01\x01\x01',2,bytes.fromhex('0001000200010003000100020001000400010002000100030001000200010000'),(([0], [1]), ([1], [0]), ([2], [0]), ([3], [0]), ([4], [0])))
+    @logit(logger,logging.INFO)
+    def selectCard_s2st2_1(self):
+        color,hougu,group=(s:=self.snapshot.of(self.openCards())).color,s.hougu,s.group
+        self.dispatchHougu(hougu)
+        classes,base,table,picks=self.selectCardTable_s2st2_1
+        if all(0<=group[i]<3 and 0<=color[i]<3 for i in range(5)):
+            pre_card,post_card=picks[table[sum(classes[group[i]*3+color[i]]*base**i for i in range(5))]]
+        else:
+            def pre_evaluate(card):
+                mark = -10000
+                if group[card[0]] == 0 and True: mark=0
+                return mark
+            def post_evaluate(card):
+                mark = -10000
+                if True and True: mark=0
+                return mark
+            pre_card=list(max(permutations(range(5),1),key=lambda x:pre_evaluate(list(x))))
+            post_card=list(max(permutations({0,1,2,3,4}-set(pre_card),1),key=lambda x:post_evaluate(list(x))))
+        return''.join(['12345678'[i]for i in pre_card+[5]+post_card+list({0,1,2,3,4}-set(post_card)-set(pre_card))])
+    selectCardTable_s2st2_2=(b'\x00\x00\x00\x00\x00\x00\x00\x00\x00',1,bytes.fromhex('00'),(([], [0, 1]),))
+    @logit(logger,logging.INFO)
+    def selectCard_s2st2_2(self):
+        color,hougu,group=(s:=self.snapshot.of(self.openCards())).color,s.hougu,s.group
+        self.dispatchHougu(hougu)
+        classes,base,table,picks=self.selectCardTable_s2st2_2
+        if all(0<=group[i]<3 and 0<=color[i]<3 for i in range(5)):
+            pre_card,post_card=picks[table[sum(classes[group[i]*3+color[i]]*base**i for i in range(5))]]
+        else:
+            def pre_evaluate(card):
+                mark = -10000
+                return mark
+            def post_evaluate(card):
+                mark = -10000
+                if True and True and True and True: mark=0
+                return mark
+            pre_card=[]
+            post_card=list(max(permutations({0,1,2,3,4}-set(pre_card),2),key=lambda x:post_evaluate(list(x))))
+        return''.join(['12345678'[i]for i in pre_card+[5]+post_card+list({0,1,2,3,4}-set(post_card)-set(pre_card))])
\ No newline at end of file
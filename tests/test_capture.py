@@ -0,0 +1,19 @@
+"""The FrameRing of the Fuse keeps every frame, even when the queue of the writer thread is full."""
+import os
+import sys
+import types
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from bench_capture import loadCapture
+
+fgo_capture = loadCapture()
+
+
+def test_frame_is_encoded_inline_when_the_queue_is_full(monkeypatch):
+    monkeypatch.setattr(fgo_capture.capture, "put", lambda job: False)
+    ring = fgo_capture.FrameRing(2)
+    ring[0] = types.SimpleNamespace(im=numpy.zeros((720, 1280, 3), numpy.uint8))
+    assert ring[0].data is not None and ring[0].im is None
+    assert ring.inline == 1 and ring.size == len(ring[0].data)
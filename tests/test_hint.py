@@ -0,0 +1,33 @@
+"""The hints of fgoHint are only trusted for the very image they were found for."""
+import os
+import sys
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import replay
+
+clock = replay.VirtualClock()
+replay.install_stand_ins(replay.Replay(clock), clock)    # the FGO-py modules fgoHint imports
+from fgoHint import HintCache
+
+
+def test_hint_is_not_served_to_another_image_with_the_same_key():
+    cache = HintCache()
+    rect = (0, 0, 200, 200)
+    template = (numpy.zeros((10, 10, 3), numpy.uint8),)
+    other = (numpy.zeros((10, 10, 3), numpy.uint8),)
+    key = id(template[0]), rect    # as if other had been given the id of template after it was freed
+    cache.remember(key, template, (50, 50))
+    assert cache.around(key, template, rect) == (37, 37, 63, 63)
+    assert cache.around(key, other, rect) is None
+
+
+def test_hint_dies_with_its_image():
+    cache = HintCache()
+    rect = (0, 0, 200, 200)
+    template = (numpy.zeros((10, 10, 3), numpy.uint8),)
+    key = id(template[0]), rect
+    cache.remember(key, template, (50, 50))
+    del template
+    assert cache.hints[key][0]() is None
@@ -0,0 +1,128 @@
+"""
+The translator of the turn scripts: generated Turn classes and plans of the sample scripts against the expected ones in
+tests/expected/, the syntax errors of malformed scripts, and the decision tables of the generated selectCard_* methods
+against the evaluators they replace.
+"""
+import json
+import os
+import random
+import re
+import sys
+import textwrap
+from itertools import permutations
+
+import pytest
+
+CUSTOMIZATION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXPECTED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "expected")
+sys.path.insert(0, CUSTOMIZATION_DIR)
+from tokenizer import (Script, buildSelectCardTable, compilePlan, generateCustomizedTurn, generatePlan,
+                       tokenize, translateTurnScript, TurnScriptParser)
+
+SAMPLE_SCRIPTS = ("SampleTurnSeq", "WhitePaper90SS")
+
+
+@pytest.mark.parametrize("name", SAMPLE_SCRIPTS)
+def test_sample_script_translates_to_the_expected_class(name):
+    with open(os.path.join(EXPECTED_DIR, name + ".py"), encoding="utf-8") as f:
+        expected = f.read()
+    generated = generateCustomizedTurn(os.path.join(CUSTOMIZATION_DIR, name + ".txt"))
+    assert generated == expected
+    compile(generated, name, "exec")
+
+
+@pytest.mark.parametrize("name", SAMPLE_SCRIPTS)
+def test_sample_script_compiles_to_the_expected_plan(name):
+    with open(os.path.join(EXPECTED_DIR, name + ".json"), encoding="utf-8") as f:
+        expected = json.load(f)
+    assert json.loads(json.dumps(generatePlan(os.path.join(CUSTOMIZATION_DIR, name + ".txt")))) == expected
+
+
+def test_parser_builds_stages_with_their_exists():
+    with open(os.path.join(CUSTOMIZATION_DIR, "SampleTurnSeq.txt"), encoding="utf-8") as f:
+        script = TurnScriptParser(list(tokenize(f.read()))).parse()
+    assert isinstance(script, Script)
+    assert [(stage.label, stage.stage, stage.stage_turn) for stage in script.stages][:2] == [("s1st1", 1, 1), ("s2st1", 2, 1)]
+    assert [(node.count, node.servant, node.color) for node in script.stages[0].exists] == [(2, 0, 'r')]
+
+
+@pytest.mark.parametrize("code, message", [
+    ("hougu:1\n", "Line 1: Expected a stage header (sX: or sXstY:) before any action."),
+    ("s1st:\n0.1\n", "Line 1: Expected a stage header (sX: or sXstY:) before any action."),
+    ("s1: 0.1\n", "Line 1: Nothing is expected after 's1:' in the same line."),
+    ("s1:\n0.1\nif 0.np>=50:\n    s2:\n    0.1\n", "Line 4: Stage headers should not be nested in a block."),
+])
+def test_malformed_stage_header_is_reported(code, message):
+    for translate in (translateTurnScript, compilePlan):
+        with pytest.raises(SyntaxError) as error:
+            translate("T", code)
+        assert str(error.value) == message
+
+
+@pytest.mark.parametrize("code, message", [
+    ("s1:\nif 0.hp>=50:\n    0.1\n", "Line 2: Unknown servant attribute 'hp', only 'np' is supported."),
+    ("s1:\nif 0.np>=50\n    0.1\n", "Line 2: 'if' statement missing colon."),
+    ("s1:\nelif 0.np>=50:\n    0.1\n", "Line 2: 'elif' without matching 'if' at this indentation level."),
+    ("s1:\nif exists 0.r:\n    0.1\n", "Line 2: Syntax of 'exists': exists(_count_ x _servant_._color_)"),
+    ("s1:\nif 0.np>=50:\n0.1\n", "Line 2: Expected 4-space indent after 'if' statement on new line."),
+])
+def test_malformed_condition_is_reported(code, message):
+    for translate in (translateTurnScript, compilePlan):
+        with pytest.raises(SyntaxError) as error:
+            translate("T", code)
+        assert str(error.value) == message
+
+
+@pytest.mark.parametrize("condition, message", [
+    ("(0.np>=50", "Line 2: Missing ')' in condition."),
+    ("0.np>=50)", "Line 2: Unbalanced ')' in condition."),
+    ("0.np>=", "Line 2: Missing operand in condition."),
+])
+def test_unbalanced_condition_is_reported(condition, message):
+    code = f"s1:\nif {condition}:\n    0.1\n"
+    with pytest.raises(SyntaxError, match=re.escape(message)):
+        compilePlan("T", code)
+    with pytest.raises(SyntaxError, match="Line 2: Malformed condition."):
+        translateTurnScript("T", code)
+
+
+def test_chained_comparison_is_python_in_classes_only():
+    code = "s1:\nif 10<0.np<50:\n    0.1\n"
+    assert "10 < self.snapshot.of(self.skillFrame()).np[0] < 50" in translateTurnScript("T", code)
+    with pytest.raises(SyntaxError, match="Chained comparisons are not supported"):
+        compilePlan("T", code)
+
+
+def selectCardMethods(generated):
+    """(table, evaluator) of each table driven selectCard_* of a generated class, the evaluator being the code the
+    generated method falls back to, which sets pre_card and post_card from group and color"""
+    for match in re.finditer(r"    selectCardTable_(\w+)=(.*)\n", generated):
+        body = generated[match.end():]
+        fallback = body[body.index("        else:\n") + len("        else:\n"):body.index("        return''")]
+        yield match.group(1), eval(match.group(2)), textwrap.dedent(fallback)
+
+
+@pytest.mark.parametrize("name", SAMPLE_SCRIPTS)
+def test_decision_table_matches_the_evaluator(name):
+    rng = random.Random(0)
+    methods = list(selectCardMethods(generateCustomizedTurn(os.path.join(CUSTOMIZATION_DIR, name + ".txt"))))
+    assert methods
+    for label, (classes, base, table, picks), evaluator in methods:
+        for _ in range(300):
+            group, color = [rng.randrange(3) for _ in range(5)] + [0, 1, 2], [rng.randrange(3) for _ in range(5)] + [0, 1, 2]
+            namespace = {"group": group, "color": color, "permutations": permutations}
+            exec(evaluator, namespace)
+            pick = picks[table[sum(classes[group[i] * 3 + color[i]] * base ** i for i in range(5))]]
+            assert (list(namespace["pre_card"]), list(namespace["post_card"])) == (list(pick[0]), list(pick[1])), (label, group, color)
+
+
+def test_decision_table_of_two_stage_priorities():
+    # pre: 2.r, 2.*  post: 2.r, 2.b, 2.g, as in stage 2 of SampleTurnSeq.txt
+    pre, post = (((2, 'r'), (2, '*')),), (((2, 'r'),), ((2, 'b'),), ((2, 'g'),))
+    classes, base, table, picks = buildSelectCardTable(pre, post)
+    index = lambda group, color: table[sum(classes[group[i] * 3 + color[i]] * base ** i for i in range(5))]
+    # servant 2 holds a buster (card 3) and two arts (cards 1 and 4), servants 0 and 1 the other cards
+    pre_card, post_card = picks[index([0, 2, 1, 2, 2], [2, 0, 1, 2, 0])]
+    assert pre_card == [3, 1] and post_card == [4]
+    # without a card of servant 2 every order has the lowest mark, and the first one is taken
+    assert picks[index([0, 1, 0, 1, 0], [0, 1, 2, 0, 1])] == ([0, 1], [2])
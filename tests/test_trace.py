@@ -0,0 +1,83 @@
+"""
+--trace wraps the phases of the turn classes install.py splices into fgoKernel, which derive from CustomTurn, and of
+the classes --hot-reload rebuilds and swaps in.
+"""
+import os
+import sys
+import types
+
+import pytest
+
+CUSTOMIZATION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CUSTOMIZATION_DIR)
+import replay
+
+SAMPLE_SCRIPT = os.path.join(CUSTOMIZATION_DIR, "SampleTurnSeq.txt")
+
+
+@pytest.fixture
+def fgo_kernel():
+    clock = replay.VirtualClock()
+    namespace = replay.install_stand_ins(replay.Replay(clock), clock)
+    namespace["servantData"] = {}
+    for name, source in replay.turn_sources([SAMPLE_SCRIPT]):
+        exec(compile(source, name, "exec"), namespace)
+    fgo_kernel = types.ModuleType("fgoKernel")
+    fgo_kernel.Battle = type("Battle", (), {"__call__": lambda self: None})
+    fgo_kernel.Turn = type("Turn", (), {"__call__": lambda self, turn: None, "selectCard": lambda self: None})
+    fgo_kernel.CustomTurn = namespace["CustomTurn"]
+    fgo_kernel.SampleTurnSeqTurn = namespace["SampleTurnSeqTurn"]
+    from fgoTrace import tracer
+    fgo_kernel.tracer = tracer
+    sys.modules["fgoKernel"] = fgo_kernel
+    try:
+        yield fgo_kernel, namespace
+    finally:
+        tracer.disable()
+        del sys.modules["fgoKernel"]
+
+
+def patched_names(tracer):
+    return {f"{owner.__name__}.{name}" for owner, name, _ in tracer.patched}
+
+
+def test_generated_turn_phases_are_wrapped(fgo_kernel):
+    tracer = fgo_kernel[0].tracer
+    tracer.enable()
+    patched = patched_names(tracer)
+    assert {"Turn.__call__", "CustomTurn.__call__", "CustomTurn.dispatchSkill", "CustomTurn.castSkillQueue",
+            "CustomTurn.selectCard", "PlanTurn.selectCard_plan", "SampleTurnSeqTurn.__call__"} <= patched
+    assert any(i.startswith("SampleTurnSeqTurn.selectCard_") for i in patched)
+
+
+def test_reloaded_turn_is_wrapped_when_swapped_in(fgo_kernel):
+    kernel, namespace = fgo_kernel
+    from fgoTurnReload import TurnReloader
+    old = kernel.SampleTurnSeqTurn
+    kernel.tracer.enable()
+    reloader = TurnReloader()
+    rebuilt = dict(namespace)
+    for name, source in replay.turn_sources([SAMPLE_SCRIPT]):
+        exec(compile(source, name, "exec"), rebuilt)
+    reloader.classes[old.__name__] = rebuilt[old.__name__]
+    reloader.changed[old.__name__] = 0
+    new = reloader.swap(old)
+    assert new is not old and kernel.SampleTurnSeqTurn is new
+    assert {name for owner, name, _ in kernel.tracer.patched if owner is new} >= {"__call__"}
+    kernel.tracer.disable()
+    assert not hasattr(vars(new)["__call__"], "__wrapped__")
+
+
+def test_stop_ends_the_watcher_before_a_restart(tmp_path):
+    from fgoTurnReload import TurnReloader
+    index = tmp_path / "fgoTurnIndex.json"
+    index.write_text('{"turns": [{"name": "SampleTurnSeqTurn", "source": "%s", "sha256": "0"}]}'
+                     % SAMPLE_SCRIPT.replace("\\", "\\\\"), encoding="utf-8")
+    reloader = TurnReloader(str(index), interval=60)
+    reloader.start()
+    first = reloader.thread
+    reloader.stop()
+    assert not first.is_alive()
+    reloader.start()
+    assert reloader.thread is not first and reloader.thread.is_alive()
+    reloader.stop()
@@ -1,8 +1,12 @@
+import functools
 import os.path
 import re
+from itertools import permutations
 from typing import NamedTuple, Iterator, List
 
 FIXED_BASE_INDENT = 8
+# delays and detected end of a card chain, as in CustomTurn.__call__; the last delay only bounds the wait
+CARD_CHAIN_TIMING = "(300,300,2300,1300,6000),'cards',lambda d:d.isTurnBegin()or d.isBattleFinished()"
 
 class Token(NamedTuple):
     type: str
@@ -10,16 +14,85 @@ class Token(NamedTuple):
     line: int
     column: int
 
+COLOR_ID = {'b': 0, 'g': 1, 'r': 2}   # Arts, Quick, Buster, as in Turn.color
+
 class SelectCardInfo(NamedTuple):
     target: int
     hougu_servants: list
-    pre_eval_str: str
-    post_eval_str: str
+    pre_combs: list     # [[(servant, color), ...], ...] from the highest priority to the lowest
+    post_combs: list
     preprogrammed_selectCard: str = ""
 
     def empty(self):
-        return self.target < 0 and len(self.hougu_servants) == 0 and self.pre_eval_str == "" and \
-            self.post_eval_str == "" and self.preprogrammed_selectCard == ""
+        return self.target < 0 and len(self.hougu_servants) == 0 and len(self.pre_combs) == 0 and \
+            len(self.post_combs) == 0 and self.preprogrammed_selectCard == ""
+
+# ---- AST of turn scripts, built by TurnScriptParser ----
+class Exists(NamedTuple):
+    count: int
+    servant: int        # -1 for any servant
+    color: str          # 'r', 'g', 'b' or '*'
+    flag: int           # index of the exists() within its stage, that of its entry in the exists of a plan
+    line: int
+
+class NpRef(NamedTuple):
+    servant: int
+    line: int
+
+class Condition(NamedTuple):
+    terms: list         # token values, Exists and NpRef nodes in source order
+    line: int
+
+class Branch(NamedTuple):
+    keyword: str        # 'if', 'elif' or 'else'
+    condition: Condition  # None for 'else'
+    body: list
+    line: int
+
+class IfStmt(NamedTuple):
+    branches: list
+
+class ServantSkill(NamedTuple):
+    servant: int
+    skill: int
+    target: int         # -1 for no target
+
+class MasterSkill(NamedTuple):
+    skill: int
+    targets: list
+
+class SelectCardCall(NamedTuple):
+    name: str
+    args: list
+
+class ActionLine(NamedTuple):
+    actions: list
+    inline: bool        # True if following 'if ...:' in the same line
+    line: int
+
+class HouguDirective(NamedTuple):
+    servants: list
+    line: int
+
+class CardPriorityDirective(NamedTuple):
+    kind: str           # 'pre' or 'post'
+    combs: list
+    line: int
+
+class TargetDirective(NamedTuple):
+    target: int
+    line: int
+
+class Stage(NamedTuple):
+    label: str          # e.g. 's1st2', used to name the selectCard_* methods
+    stage: int
+    stage_turn: int     # -1 if not specified
+    body: list
+    exists: list        # all Exists nodes in this stage, in source order
+    line: int
+
+class Script(NamedTuple):
+    stages: list
 
 def tokenize(code: str) -> Iterator[Token]:
     token_specification = [
@@ -125,251 +198,345 @@ def tokenize(code: str) -> Iterator[Token]:
         yield Token('DEDENT', '', line_num, 0)
 
 
-class SyntaxValidator:
+class TurnScriptParser:
+    """
+    Builds the AST of a turn script from the token stream of tokenize() in a single left-to-right pass.
+    """
+    DIRECTIVES = {'hougu', 'pre', 'post', 'target'}
+
     def __init__(self, tokens: List[Token]):
         self.tokens = tokens
         self.pos = 0
-        # Tracks if an 'if' was seen at a specific indentation level
-        # Key: Indent Level, Value: Boolean (True if an IF is active/pending)
-        self.scope_has_if = {}
-        self.current_indent_level = 0
+        self.eof = Token('EOF', '', tokens[-1].line if tokens else 1, 0)
+        self.stage_exists = []  # Exists nodes of the stage being parsed
 
     def current(self) -> Token:
-        return self.tokens[self.pos] if self.pos < len(self.tokens) else self.tokens[-1]
-
-    def advance(self):
-        self.pos += 1
-
-    def get_pos(self) -> int:
-        return self.pos
-
-    def set_pos(self, pos: int):
-        self.pos = pos
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else self.eof
 
     def peek(self, offset=1) -> Token:
         idx = self.pos + offset
-        if idx >= len(self.tokens):
-            return self.tokens[-1]
-        elif idx < 0:
-            return self.tokens[0]
-        return self.tokens[idx]
-
-    def validate(self):
-        while self.get_pos() < len(self.tokens):
-            token = self.current()
-
-            if token.type == 'INDENT':
-                self.current_indent_level += 1
-                self.advance()
+        return self.tokens[idx] if idx < len(self.tokens) else self.eof
 
-            elif token.type == 'DEDENT':
-                # When leaving a block, reset the "if" memory for the inner level
-                if self.current_indent_level in self.scope_has_if:
-                    del self.scope_has_if[self.current_indent_level]
-                self.current_indent_level -= 1
-                self.advance()
-
-            elif token.type == 'KEYWORDS' and token.value == 'if':
-                self.handle_if()
-            elif token.type == 'KEYWORDS' and token.value == 'else':
-                self.handle_else()
-            elif token.type == 'KEYWORDS' and token.value == 'elif':
-                self.handle_elif()
-            elif token.type == 'KEYWORDS' and token.value == 'x':
-                self.handle_x()
-            else:
-                # Skip other tokens (expressions, assignments, etc.)
-                self.advance()
+    def advance(self, n=1):
+        self.pos += n
 
-    def handle_x(self):
-        """
-        Rule: 'x' must be preceded by 'exists' keyword.
-        """
-        line = self.current().line
-        if not (self.peek(-3).value == 'exists' and self.peek(-2).value == '(' and self.peek(-1).type == 'INT' and
-                self.peek(1).type in {"STAR", "INT"} and self.peek(2).type == "DOT" and self.peek(3).type in {"STAR", "INT"}):
-            raise SyntaxError(f"Line {line}: Syntax of 'x': exists(_count_ x _servant_._color_)")
+    def error(self, msg: str, token: Token = None) -> SyntaxError:
+        return SyntaxError(f"Line {(token or self.current()).line}: {msg}")
 
+    def expect(self, tok_type: str, msg: str) -> Token:
+        token = self.current()
+        if token.type != tok_type:
+            raise self.error(msg, token)
         self.advance()
+        return token
 
-    def handle_if(self):
-        """
-        Rule: Check for colon, then check for newline vs inline expression.
-        Also marks this indentation level as having an active 'if'.
-        """
-        line = self.current().line
-        cur_pos = self.get_pos()
-        self.scope_has_if[self.current_indent_level] = True
-
-        # Scan forward to find the colon
-        while self.get_pos() < len(self.tokens) and self.current().type != 'COLON':
-            if self.current().type == 'NEWLINE':
-                raise SyntaxError(f"Line {line}: 'if' statement missing colon before newline.")
-            self.advance()
-        if self.get_pos() >= len(self.tokens) or self.current().type != 'COLON':
-            raise SyntaxError(f"Line {line}: 'if' statement missing colon.")
+    def at_line_end(self) -> bool:
+        return self.current().type in {'NEWLINE', 'DEDENT', 'EOF'}
 
-        self.advance() # consume COLON
+    def expect_line_end(self, msg: str):
+        if not self.at_line_end():
+            raise self.error(msg)
 
-        # RULE: "either there should be some expressions in this line or an indent"
-        next_tok = self.current()
+    def skip_newlines(self):
+        while self.current().type == 'NEWLINE':
+            self.advance()
 
-        if next_tok.type == 'NEWLINE':
-            # If newline immediately follows colon, next token MUST be INDENT
-            if self.peek().type != 'INDENT':
-                raise SyntaxError(f"Line {line}: Expected 4-space indent after 'if' statement on new line.")
-        else:
-            # Inline expression (e.g., "if x: y = 1")
-            pass
-        self.set_pos(cur_pos + 1)
+    def at_stage_header(self) -> bool:
+        if not (self.current().type == 'ID' and self.current().value.lower() == 's' and self.peek(1).type == 'INT'):
+            return False
+        if self.peek(2).type == 'COLON':
+            return True
+        return self.peek(2).type == 'ID' and self.peek(2).value.lower() == 'st' and self.peek(3).type == 'INT' and \
+            self.peek(4).type == 'COLON'
+
+    def parse(self) -> Script:
+        stages = []
+        self.skip_newlines()
+        while self.current().type != 'EOF':
+            if not self.at_stage_header():
+                raise self.error("Expected a stage header (sX: or sXstY:) before any action.")
+            stages.append(self.parse_stage())
+        return Script(stages)
+
+    def parse_stage(self) -> Stage:
+        line = self.current().line
+        stage = int(self.peek(1).value)
+        stage_turn = int(self.peek(3).value) if self.peek(2).type == 'ID' else -1
+        label = ''
+        while self.current().type != 'COLON':
+            label += self.current().value
+            self.advance()
+        self.advance()  # consume COLON
+        self.expect_line_end(f"Nothing is expected after '{label}:' in the same line.")
+        self.stage_exists = []
+        body = []
+        self.skip_newlines()
+        while self.current().type != 'EOF' and not self.at_stage_header():
+            if self.current().type == 'INDENT':
+                self.advance()
+                body.extend(self.parse_block())
+            else:
+                body.append(self.parse_statement())
+            self.skip_newlines()
+        return Stage(label, stage, stage_turn, body, self.stage_exists, line)
 
-    def handle_else(self):
+    def parse_block(self) -> list:
         """
-        Rule: Must be an 'if' at the same indent level immediately before.
+        Parses statements up to and including the DEDENT closing the current block.
         """
-        line = self.current().line
-
-        # Check if we have a matching IF at this level
-        if not self.scope_has_if.get(self.current_indent_level, False):
-            raise SyntaxError(f"Line {line}: 'else' without matching 'if' at this indentation level.")
-
-        # Reset because the if-else block is essentially consumed/linked now
-        # (Allows 'if... else... if...' chains if needed, though simple else usually ends it)
-        self.scope_has_if[self.current_indent_level] = False
+        statements = []
+        self.skip_newlines()
+        while self.current().type not in {'DEDENT', 'EOF'}:
+            if self.current().type == 'INDENT':
+                raise self.error("Unexpected indent.")
+            if self.at_stage_header():
+                raise self.error("Stage headers should not be nested in a block.")
+            statements.append(self.parse_statement())
+            self.skip_newlines()
+        self.advance()  # consume DEDENT
+        return statements
+
+    def parse_statement(self):
+        token = self.current()
+        if token.type == 'KEYWORDS' and token.value == 'if':
+            return self.parse_if()
+        if token.type == 'KEYWORDS' and token.value in {'elif', 'else'}:
+            raise self.error(f"'{token.value}' without matching 'if' at this indentation level.")
+        if token.type == 'ID' and token.value in self.DIRECTIVES and self.peek().type == 'COLON':
+            return self.parse_directive()
+        return self.parse_action_line(inline=False)
+
+    def parse_if(self) -> IfStmt:
+        branches = []
+        while True:
+            keyword_tok = self.current()
+            self.advance()
+            condition = None if keyword_tok.value == 'else' else self.parse_condition()
+            if self.current().type != 'COLON':
+                raise self.error(f"'{keyword_tok.value}' statement missing colon.", keyword_tok)
+            self.advance()
+            branches.append(Branch(keyword_tok.value, condition, self.parse_suite(keyword_tok), keyword_tok.line))
+            if keyword_tok.value == 'else':
+                break
+            resume_pos = self.pos
+            self.skip_newlines()
+            if not (self.current().type == 'KEYWORDS' and self.current().value in {'elif', 'else'}):
+                self.pos = resume_pos
+                break
+        return IfStmt(branches)
+
+    def parse_suite(self, keyword_tok: Token) -> list:
+        if not self.at_line_end():
+            return [self.parse_action_line(inline=True)]
+        self.skip_newlines()
+        if self.current().type != 'INDENT':
+            raise self.error(f"Expected 4-space indent after '{keyword_tok.value}' statement on new line.", keyword_tok)
         self.advance()
+        return self.parse_block()
 
-    def handle_elif(self):
-        """
-        Rule: Must be an 'if' or 'elif' at the same indent level immediately before.
-              Check for colon, then check for newline vs inline expression.
-        """
+    def parse_condition(self) -> Condition:
         line = self.current().line
-        cur_pos = self.get_pos()
-        # Check if we have a matching IF or ELIF at this level
-        if not self.scope_has_if.get(self.current_indent_level, False):
-            raise SyntaxError(f"Line {line}: 'elif' without matching 'if' at this indentation level.")
+        terms = []
+        while self.current().type not in {'COLON', 'NEWLINE', 'EOF'}:
+            token = self.current()
+            if token.type == 'KEYWORDS' and token.value == 'exists':
+                terms.append(self.parse_exists())
+            elif token.type == 'INT' and self.peek().type == 'DOT':
+                if self.peek(2).value != 'np':
+                    raise self.error(f"Unknown servant attribute '{self.peek(2).value}', only 'np' is supported.")
+                terms.append(NpRef(int(token.value), token.line))
+                self.advance(3)
+            else:
+                terms.append(token.value)
+                self.advance()
+        return Condition(terms, line)
 
-        # Keep the 'if' active for further 'elif' or 'else'
+    def parse_exists(self) -> Exists:
+        line = self.current().line
+        self.advance()  # consume 'exists'
+        self.expect('LPAREN', "Syntax of 'exists': exists(_count_ x _servant_._color_)")
+        count = 1
+        if self.current().type == 'INT' and self.peek().value == 'x':
+            count = int(self.current().value)
+            self.advance(2)
+        servant, color = self.parse_card_pattern()
+        self.expect('RPAREN', "Syntax of 'exists': exists(_count_ x _servant_._color_)")
+        node = Exists(count, servant, color, len(self.stage_exists), line)
+        self.stage_exists.append(node)
+        return node
+
+    def parse_card_pattern(self) -> tuple:
+        """
+        Parses `servant.color`, `*.color`, `servant.*`, `*.*` or a lone `*`. Returns (servant, color), servant=-1 for any.
+        """
+        token = self.current()
+        if token.type == 'STAR' and self.peek().type != 'DOT':
+            self.advance()
+            return -1, '*'
+        if token.type not in {'INT', 'STAR'} or self.peek().type != 'DOT':
+            raise self.error("Syntax of a card: _servant_._color_, e.g. 0.r, *.b, 2.*")
+        servant = int(token.value) if token.type == 'INT' else -1
+        color_tok = self.peek(2)
+        if color_tok.type == 'STAR':
+            color = '*'
+        elif color_tok.type == 'ID' and color_tok.value.lower() in {'r', 'g', 'b'}:
+            color = color_tok.value.lower()
+        else:
+            raise self.error(f"Unknown card color: {color_tok.value}")
+        self.advance(3)
+        return servant, color
+
+    def parse_directive(self):
+        name_tok = self.current()
+        self.advance(2)  # consume name and COLON
+        if name_tok.value == 'hougu':
+            servants = [int(self.expect('INT', "Syntax of 'hougu': hougu:_servant_[,_servant_...]").value)]
+            while self.current().type == 'COMMA':
+                self.advance()
+                servants.append(int(self.expect('INT', "Syntax of 'hougu': hougu:_servant_[,_servant_...]").value))
+            node = HouguDirective(servants, name_tok.line)
+        elif name_tok.value == 'target':
+            node = TargetDirective(int(self.expect('INT', "Syntax of 'target': target:_enemy_").value), name_tok.line)
+        else:
+            combs = [self.parse_card_comb()]
+            while self.current().type == 'COMMA':
+                self.advance()
+                combs.append(self.parse_card_comb())
+            if any(len(comb) != len(combs[0]) for comb in combs):
+                raise self.error(f"All priorities of '{name_tok.value}' should contain the same number of cards.", name_tok)
+            node = CardPriorityDirective(name_tok.value, combs, name_tok.line)
+        self.expect_line_end(f"Unexpected '{self.current().value}' in '{name_tok.value}'.")
+        return node
+
+    def parse_card_comb(self) -> list:
+        if self.current().type != 'LPAREN':
+            return [self.parse_card_pattern()]
         self.advance()
+        comb = [self.parse_card_pattern()]
+        while self.current().type == 'COMMA':
+            self.advance()
+            comb.append(self.parse_card_pattern())
+        self.expect('RPAREN', "Missing ')' in card combination.")
+        return comb
 
-        # Scan forward to find the colon
-        while self.get_pos() < len(self.tokens) and self.current().type != 'COLON':
-            if self.current().type == 'NEWLINE':
-                raise SyntaxError(f"Line {line}: 'if' statement missing colon before newline.")
+    def parse_action_line(self, inline: bool) -> ActionLine:
+        line = self.current().line
+        actions = [self.parse_action()]
+        while self.current().type == 'COMMA':
             self.advance()
-        if self.get_pos() >= len(self.tokens) or self.current().type != 'COLON':
-            raise SyntaxError(f"Line {line}: 'if' statement missing colon.")
+            actions.append(self.parse_action())
+        self.expect_line_end(f"Unexpected '{self.current().value}' in action list.")
+        return ActionLine(actions, inline, line)
 
-        self.advance() # consume COLON
+    def parse_action(self):
+        token = self.current()
+        if token.type == 'INT':  # servant_id.skill_id[>target]
+            self.advance()
+            self.expect('DOT', "Syntax of servant skill: _servant_._skill_[>_target_]")
+            skill = int(self.expect('INT', "Syntax of servant skill: _servant_._skill_[>_target_]").value)
+            target = -1
+            if self.current().value == '>':
+                self.advance()
+                target = int(self.expect('INT', "Syntax of servant skill: _servant_._skill_[>_target_]").value)
+            return ServantSkill(int(token.value), skill, target)
+        if token.type == 'ID' and token.value in {'m', 'M'}:  # m.skill_id[>target | >(target, ...)]
+            self.advance()
+            self.expect('DOT', "Syntax of master skill: m._skill_[>_target_ | >(_target_,...)]")
+            skill = int(self.expect('INT', "Syntax of master skill: m._skill_[>_target_ | >(_target_,...)]").value)
+            targets = []
+            if self.current().value == '>':
+                self.advance()
+                if self.current().type == 'INT':
+                    targets.append(int(self.current().value))
+                    self.advance()
+                else:
+                    self.expect('LPAREN', "Syntax of master skill: m._skill_[>_target_ | >(_target_,...)]")
+                    while self.current().type != 'RPAREN':
+                        if self.current().type == 'INT':
+                            targets.append(int(self.current().value))
+                        elif self.current().type != 'COMMA':
+                            raise self.error("Syntax of master skill: m._skill_[>_target_ | >(_target_,...)]")
+                        self.advance()
+                    self.advance()  # consume RPAREN
+            return MasterSkill(skill, targets)
+        if token.type == 'ID' and "selectCard" in token.value:  # the rest of the line are arguments
+            self.advance()
+            args = []
+            while not self.at_line_end():
+                args.append(self.current().value)
+                self.advance()
+            return SelectCardCall(token.value, args)
+        raise self.error(f"Unknown action '{token.value}'.")
+
+
+def _matchCard(comb, group: list, color: list, card) -> bool:
+    return all((servant == -1 or group[card[i]] == servant) and (c == '*' or color[card[i]] == COLOR_ID[c])
+               for i, (servant, c) in enumerate(comb))
+
+def _evaluateCards(combs, group: list, color: list, card) -> int:
+    # the same marks as the generated pre_evaluate()/post_evaluate()
+    return next((-priority for priority, comb in enumerate(combs) if _matchCard(comb, group, color, card)), -10000)
+
+@functools.lru_cache(maxsize=None)
+def buildSelectCardTable(pre_combs: tuple, post_combs: tuple) -> tuple:
+    """
+    Precomputes (pre_card, post_card) of a generated selectCard_*() for every hand of 5 cards.
+    The marks only depend on which (servant, color) patterns each card matches, so the 9 possible (group, color) card
+    types are folded into classes with the same matches, and the table is indexed by the classes of the 5 cards.
+    Returns (classes, base, table, picks): classes[group*3+color] is the class of a card, and
+    picks[table[sum(classes[...]*base**i)]] is (pre_card, post_card).
+    """
+    pre_cards = len(pre_combs[0]) if pre_combs else 0
+    post_cards = len(post_combs[0]) if post_combs else 0
+    patterns = sorted({pattern for comb in pre_combs + post_combs for pattern in comb})
+    signatures = {}
+    classes = bytes(signatures.setdefault(tuple(_matchCard((pattern,), [t // 3], [t % 3], [0]) for pattern in patterns),
+                                          len(signatures)) for t in range(9))
+    base = len(signatures)
+    representative = {cls: t for t, cls in reversed(list(enumerate(classes)))}
+
+    def _marks(combs, cards):  # mark of every ordered tuple of card classes
+        return [_evaluateCards(combs, [representative[idx // base ** i % base] // 3 for i in range(cards)],
+                               [representative[idx // base ** i % base] % 3 for i in range(cards)], range(cards))
+                for idx in range(base ** cards)]
+
+    weights = [base ** i for i in range(5)]
+
+    def _select(marks, hand, candidates, cards):  # max(permutations(candidates, cards), key=mark) using the marks above
+        best, best_mark = None, None
+        for perm in permutations(candidates, cards):
+            mark = marks[sum(hand[card] * weight for card, weight in zip(perm, weights))]
+            if best is None or mark > best_mark:
+                best, best_mark = perm, mark
+                if mark == 0:   # the highest possible mark
+                    break
+        return list(best)
+
+    pre_marks, post_marks = _marks(pre_combs, pre_cards), _marks(post_combs, post_cards)
+    picks = {}
+    table = bytearray(base ** 5)
+    for idx in range(base ** 5):
+        hand = [idx // weight % base for weight in weights]
+        pre_card = _select(pre_marks, hand, range(5), pre_cards) if pre_cards > 0 else []
+        post_card = _select(post_marks, hand, {0, 1, 2, 3, 4} - set(pre_card), post_cards) if post_cards > 0 else []
+        table[idx] = picks.setdefault((tuple(pre_card), tuple(post_card)), len(picks))
+    return classes, base, bytes(table), tuple((list(pre), list(post)) for pre, post in picks)
+
+
+def checkSelectCardInfo(info: SelectCardInfo) -> tuple:
+    post_cards = len(info.post_combs[0]) if info.post_combs else 0
+    pre_cards = len(info.pre_combs[0]) if info.pre_combs else 0
+    assert pre_cards + post_cards + len(info.hougu_servants) == 3 or (pre_cards == 0 and post_cards == 0), \
+        "Total selected cards (pre + hougu + post) must be 3. If only hougu is specified while pre and post are not, " \
+        "random cards after casting hougu will be selected. It's illegal if non of these two circumstances are met.\n\n" \
+        f"Detected: pre={info.pre_combs}, post={info.post_combs} hougu_servants={info.hougu_servants}"
+    return pre_cards, post_cards
 
-        # RULE: "either there should be some expressions in this line or an indent"
-        next_tok = self.current()
 
-        if next_tok.type == 'NEWLINE':
-            # If newline immediately follows colon, next token MUST be INDENT
-            if self.peek().type != 'INDENT':
-                raise SyntaxError(f"Line {line}: Expected 4-space indent after 'if' statement on new line.")
-        else:
-            # Inline expression
-            pass
-        self.set_pos(cur_pos + 1)
-
-
-def parseActionString(indent: int, action_str: str, class_str: str):
-    action_tokens = list(tokenize(action_str))
-    tok_id = 0
-    while tok_id < len(action_tokens):
-        if action_tokens[tok_id].type == "INT":             # servant_id
-            assert action_tokens[tok_id + 1].type == "DOT"
-            assert action_tokens[tok_id + 2].type == "INT"  # skill_id
-            servant_id = int(action_tokens[tok_id].value)
-            skill_id = int(action_tokens[tok_id + 2].value)
-            if tok_id + 4 < len(action_tokens) and action_tokens[tok_id + 3].value == ">":
-                assert action_tokens[tok_id + 4].type == "INT"  # target
-                target = int(action_tokens[tok_id + 4].value)
-                tok_id += 5
-            else:
-                target = -1
-                tok_id += 3
-            class_str += ' ' * indent + f"self.castSingleOrNoTargetServantSkill({servant_id}, {skill_id}, {target})\n"
-        elif action_tokens[tok_id].value == "m" or action_tokens[tok_id].value == "M":  # master skill
-            assert action_tokens[tok_id + 1].type == "DOT"
-            assert action_tokens[tok_id + 2].type == "INT"  # skill_id
-            skill_id = int(action_tokens[tok_id + 2].value)
-            targets = []
-            if tok_id + 3 < len(action_tokens) and action_tokens[tok_id + 3].value == ">":
-                if action_tokens[tok_id + 4].type == "INT":
-                    targets.append(int(action_tokens[tok_id + 4].value))
-                    tok_id += 5
-                else:   # multiple targets
-                    assert action_tokens[tok_id + 4].value == "("
-                    j = tok_id + 5
-                    while j < len(action_tokens):
-                        if action_tokens[j].type == "INT":
-                            targets.append(int(action_tokens[j].value))
-                        elif action_tokens[j].value == ")":
-                            break
-                        j += 1
-                    tok_id = j + 1
-            else:
-                tok_id += 3
-            class_str += ' ' * indent + f"self.castMasterSkill({skill_id}, " + (f"{targets}" if len(targets) > 0 else "[]") + ")\n"
-        elif "selectCard" in action_tokens[tok_id].value:
-            class_str += ' ' * indent + "fgoDevice.device.perform(' ',(2100,))\n" + \
-                         ' ' * indent + "fgoDevice.device.perform(self." + action_tokens[tok_id].value + "("
-            tok_id += 1
-            while tok_id < len(action_tokens):
-                class_str += action_tokens[tok_id].value + ","
-                tok_id += 1
-            class_str += "),(300,300,2300,1300,6000))\n" + \
-                         ' ' * indent + "return\n"
-        else:
-            tok_id += 1
-    return indent, class_str
-
-
-def generateCustiomizedSelectCard(s_st_str: str, info: SelectCardInfo, class_str: str) -> str:
-    def _generateColorCombs(eval_str: str):     # num_cards, [[(servant, color){1,2}], ...(different priorities)]
-        cards = 0
-        color_combs = []
-        if eval_str != "":
-            eval_tokens = list(tokenize(eval_str))
-            seps = [0,]
-            depth = 0
-            for i, tok in enumerate(eval_tokens):
-                if tok.value == ',' and depth == 0:
-                    seps.append(i + 1)
-                elif tok.value == '(':
-                    depth += 1
-                elif tok.value == ')':
-                    depth -= 1
-            seps.append(len(eval_tokens))
-            for i, start in enumerate(seps[:-1]):
-                this_priority_servant_color_combs = []  # length = 1 or 2 or 3
-                for j in range(start, seps[i + 1]):
-                    servant, color = -1, '*'
-                    if eval_tokens[j].value == '.':
-                        if eval_tokens[j - 1].type == "INT":
-                            servant = int(eval_tokens[j - 1].value)
-                        else:
-                            assert eval_tokens[j - 1].value == '*'
-                        if eval_tokens[j + 1].type == "ID":
-                            color = eval_tokens[j + 1].value.lower()
-                        else:
-                            assert eval_tokens[j + 1].value == '*'
-                    elif eval_tokens[j].value == '*' and (j == 0 or eval_tokens[j-1].value != '.') and \
-                            (j == len(eval_tokens) - 1 or eval_tokens[j+1].value != '.'):
-                        pass
-                    else:
-                        continue
-                    this_priority_servant_color_combs.append((servant, color))
-                if cards <= 0:
-                    cards = len(this_priority_servant_color_combs)
-                color_combs.append(this_priority_servant_color_combs)
-        return cards, color_combs
-    def _appendSelectCardFunc(class_str : str, pre_or_post : str, pre_or_post_servant_color_combs):
-        class_str += f"        def {pre_or_post}_evaluate(card):\n"
-        class_str += ' ' * 12 + "mark = -10000\n"
+def generateCustiomizedSelectCard(s_st_str: str, info: SelectCardInfo) -> str:
+    def _appendSelectCardFunc(out: list, indent: int, pre_or_post: str, pre_or_post_servant_color_combs):
+        out.append(' ' * indent + f"def {pre_or_post}_evaluate(card):\n")
+        out.append(' ' * (indent + 4) + "mark = -10000\n")
         for priority, servant_color_combs in enumerate(pre_or_post_servant_color_combs):
             cond_str = ""
             for i, (servant, color) in enumerate(servant_color_combs):
@@ -381,260 +548,351 @@ def generateCustiomizedSelectCard(s_st_str: str, info: SelectCardInfo, class_str
                     cond_str += "True"
                 cond_str += " and "
                 if color != '*':
-                    if color == "b":
-                        cond_str += f"color[card[{i}]] == 0"
-                    elif color == "g":
-                        cond_str += f"color[card[{i}]] == 1"
-                    elif color == "r":
-                        cond_str += f"color[card[{i}]] == 2"
-                    else:
-                        raise RuntimeError(f"Unknown card color: {color}")
+                    cond_str += f"color[card[{i}]] == {COLOR_ID[color]}"
                 else:
                     cond_str += "True"
             cond_str += f": mark={-priority}\n"
-            class_str += ' ' * 12 + ("el" if priority != 0 else "") + "if " + cond_str
-        class_str += ' ' * 12 + "return mark\n"
-        return class_str
+            out.append(' ' * (indent + 4) + ("el" if priority != 0 else "") + "if " + cond_str)
+        out.append(' ' * (indent + 4) + "return mark\n")
 
     if info.preprogrammed_selectCard != "":
-        return class_str
+        return ""
         # currently have to ignore target since target selection code can't be inserted into a pre-written selectCard function
-    post_cards, post_servant_color_combs = _generateColorCombs(info.post_eval_str)
-    pre_cards, pre_servant_color_combs = _generateColorCombs(info.pre_eval_str)
-    assert pre_cards + post_cards + len(info.hougu_servants) == 3 or (pre_cards == 0 and post_cards == 0), \
-        "Total selected cards (pre + hougu + post) must be 3. If only hougu is specified while pre and post are not, " \
-        "random cards after casting hougu will be selected. It's illegal if non of these two circumstances are met.\n\n" \
-        f"Detected: pre={info.pre_eval_str}, post={info.post_eval_str} hougu_servants={info.hougu_servants}"
-    class_str += \
-        f'''
-    @logit(logger,logging.INFO)
+    pre_cards, post_cards = checkSelectCardInfo(info)
+    out = ["\n"]
+    if pre_cards + post_cards > 0:
+        classes, base, table, picks = buildSelectCardTable(tuple(tuple(comb) for comb in info.pre_combs),
+                                                           tuple(tuple(comb) for comb in info.post_combs))
+        out.append(f"    selectCardTable_{s_st_str}=({classes!r},{base},bytes.fromhex('{table.hex()}'),{picks!r})\n")
+    out.append(
+        f'''    @logit(logger,logging.INFO)
     def selectCard_{s_st_str}(self):
 ''' \
-r'''        color,sealed,hougu,np,resist,critical,group=Detect().getCardColor()+[i[5][1]for i in self.servant],Detect.cache.isCardSealed(),Detect.cache.isHouguReady(),[Detect.cache.getFieldServantNp(i)<100 for i in range(3)],[[1,1.7,.6][i]for i in Detect.cache.getCardResist()],[i/10 for i in Detect.cache.getCardCriticalRate()],[next(j for j,k in enumerate(self.servant)if k[0]==i)for i in Detect.cache.getCardServant([i[0] for i in self.servant if i[0]])]+[0,1,2]
-        houguTargeted,houguArea,houguSupport=[[j for j in range(3)if hougu[j]and self.servant[j][0]and self.servant[j][5][0]==i]for i in range(3)]
-        houguArea=houguArea if self.stage==self.stageTotal or sum(i>0 for i in self.enemy)>1 and sum(self.enemy)>12000 else[]
-        houguTargeted=houguTargeted if self.stage==self.stageTotal or max(self.enemy)>23000+8000*len(houguArea)else[]
-        hougu=[i+5 for i in houguSupport+houguArea+houguTargeted]
-        if self.stageTurn==1 or houguTargeted or self.enemy[self.target]==0:
-            self.target=numpy.argmax(self.enemy)
-            fgoDevice.device.perform('\x67\x68\x69\x64\x65\x66'[self.target],(500,))
-        self.enemy=[max(0,i-18000*len(houguArea))for i in self.enemy]
-        if any(self.enemy)and self.enemy[self.target]==0:self.target=next(i for i in range(5,-1,-1)if self.enemy[i])
-        for _ in houguTargeted:
-            self.enemy[self.target]=max(0,self.enemy[self.target]-48000)
-            if any(self.enemy)and self.enemy[self.target]==0:self.target=next(i for i in range(5,-1,-1)if self.enemy[i])
+r'''        color,hougu,group=(s:=self.snapshot.of(self.openCards())).color,s.hougu,s.group
+        self.dispatchHougu(hougu)
 ''' + \
 (r"""
-        fgoDevice.device.perform('\x67\x68\x69\x64\x65\x66'""" f"[{info.target}],(500,))\n" if info.target >= 0 else "")
-    class_str = _appendSelectCardFunc(class_str, "pre", pre_servant_color_combs)
-    class_str = _appendSelectCardFunc(class_str, "post", post_servant_color_combs)
-    class_str += (' ' * 8 + "pre_card=" + (f"list(max(permutations(range(5),{pre_cards}),key=lambda x:pre_evaluate(list(x))))\n" if pre_cards > 0 else "[]\n")) + \
-                 (' ' * 8 + "post_card=" + (r"list(max(permutations({0,1,2,3,4}-set(pre_card)," f"{post_cards}),key=lambda x:post_evaluate(list(x))))\n" if post_cards > 0 else "[]\n")) + \
-                 ' '* 8 + "return''.join(['12345678'[i]for i in pre_card+" f"{[5+hougu_servant for hougu_servant in info.hougu_servants]}" r"+post_card+list({0,1,2,3,4}-set(post_card)-set(pre_card))])"
-    return class_str
-
-def generateCustomizedTurn(file):
-    turn_name = os.path.basename(file)[:file.rfind('.')] + "Turn"
-    class_str = \
-f'''class {turn_name}(CustomTurn):
+        fgoDevice.device.perform('\x67\x68\x69\x64\x65\x66'""" f"[{info.target}],(500,))\n" if info.target >= 0 else ""))
+    if pre_cards + post_cards > 0:
+        # one table lookup; the evaluators are only needed if the detected cards are out of the range of the table
+        out.append(' ' * 8 + f"classes,base,table,picks=self.selectCardTable_{s_st_str}\n" +
+                   ' ' * 8 + "if all(0<=group[i]<3 and 0<=color[i]<3 for i in range(5)):\n" +
+                   ' ' * 12 + "pre_card,post_card=picks[table[sum(classes[group[i]*3+color[i]]*base**i for i in range(5))]]\n" +
+                   ' ' * 8 + "else:\n")
+        _appendSelectCardFunc(out, 12, "pre", info.pre_combs)
+        _appendSelectCardFunc(out, 12, "post", info.post_combs)
+        out.append((' ' * 12 + "pre_card=" + (f"list(max(permutations(range(5),{pre_cards}),key=lambda x:pre_evaluate(list(x))))\n" if pre_cards > 0 else "[]\n")) + \
+                   (' ' * 12 + "post_card=" + (r"list(max(permutations({0,1,2,3,4}-set(pre_card)," f"{post_cards}),key=lambda x:post_evaluate(list(x))))\n" if post_cards > 0 else "[]\n")))
+    else:
+        out.append(' ' * 8 + "pre_card,post_card=[],[]\n")
+    out.append(' '* 8 + "return''.join(['12345678'[i]for i in pre_card+" f"{[5+hougu_servant for hougu_servant in info.hougu_servants]}" r"+post_card+list({0,1,2,3,4}-set(post_card)-set(pre_card))])")
+    return ''.join(out)
+
+
+PLAN_VERSION = 1
+PLAN_PRECEDENCE = {'or': 1, 'and': 2, 'not': 3, '>': 4, '<': 4, '>=': 4, '<=': 4, '==': 4, '!=': 4}
+
+
+def compileCondition(condition: Condition) -> list:
+    """
+    Converts the terms of a condition to postfix order for the stack machine of PlanTurn.evaluate(): integers are
+    pushed as they are, "f<i>" pushes exists() <i> of the stage, "n<i>" the NP of servant i, and the operators of
+    PLAN_PRECEDENCE pop their operands ('not' one, the others two). Operators bind as in python, except that
+    comparisons do not chain.
+    """
+    out, ops = [], []
+    compared = [False]    # whether the operand being built at each parenthesis level is already a comparison
+    for term in condition.terms:
+        if isinstance(term, Exists):
+            out.append(f"f{term.flag}")
+        elif isinstance(term, NpRef):
+            out.append(f"n{term.servant}")
+        elif term.isdigit():
+            out.append(int(term))
+        elif term == '(':
+            ops.append(term)
+            compared.append(False)
+        elif term == ')':
+            while ops and ops[-1] != '(':
+                out.append(ops.pop())
+            if not ops:
+                raise SyntaxError(f"Line {condition.line}: Unbalanced ')' in condition.")
+            ops.pop()
+            compared.pop()
+        elif term in PLAN_PRECEDENCE:
+            if PLAN_PRECEDENCE[term] == 4:
+                if compared[-1]:
+                    raise SyntaxError(f"Line {condition.line}: Chained comparisons are not supported, use 'and'.")
+                compared[-1] = True
+            elif term != 'not':
+                compared[-1] = False
+            if term != 'not':   # a prefix operator pops nothing
+                while ops and ops[-1] != '(' and PLAN_PRECEDENCE[ops[-1]] >= PLAN_PRECEDENCE[term]:
+                    out.append(ops.pop())
+            ops.append(term)
+        else:
+            raise SyntaxError(f"Line {condition.line}: '{term}' is not supported in conditions.")
+    if '(' in ops:
+        raise SyntaxError(f"Line {condition.line}: Missing ')' in condition.")
+    out.extend(reversed(ops))
+    depth = 0
+    for term in out:
+        depth += 0 if term == 'not' else -1 if term in PLAN_PRECEDENCE else 1
+        if depth < 1:
+            raise SyntaxError(f"Line {condition.line}: Missing operand in condition.")
+    if depth != 1:
+        raise SyntaxError(f"Line {condition.line}: Missing operator in condition.")
+    return out
+
+
+class PlanCompiler:
+    """
+    Compiles the AST of a turn script to a plan, the json tables PlanTurn of the patch interprets:
+        {"version": 1, "name": <Turn class name>,
+         "stages": [[stage, stage_turn or -1, exists, body], ...],
+         "selectCards": {"<stage label>_<id>": {"target": enemy or -1, "hougu": [servant, ...],
+                                                "pre": combs, "post": combs, "table": [classes, base, table, picks]}}}
+    exists holds one entry per exists() of the stage: a constant bool, or [index, count] for hand[index] >= count on
+    the cards PlanTurn peeks when a condition reads the entry. A body is a list of statements: ["skills", [[0, servant, skill, target] | [1, skill, targets], ...]],
+    ["cards", "<stage label>_<id>"] (attack with the card priorities of selectCards), ["call", name, args]
+    (attack with a method of CustomTurn, then end the turn) and ["if", [[condition or None, body], ...]], conditions
+    being in the postfix form of compileCondition(). combs are [[servant, color], ...] with -1 for any, and table is
+    buildSelectCardTable() with classes and table in hex, so that selecting the cards is one lookup as in
+    the generated classes. It is the same logic as TurnCodeGenerator emits, in data instead of source.
+    """
+    def __init__(self, turn_name: str):
+        self.turn_name = turn_name
+        self.select_cards = {}
+        self.stage_label = ""
+        self.select_card_id = 0
+        self.info = SelectCardInfo(target=-1, hougu_servants=[], pre_combs=[], post_combs=[])
+
+    def commit_select_card_info(self):
+        key = self.stage_label + "_" + str(self.select_card_id)
+        info, self.info = self.info, SelectCardInfo(target=-1, hougu_servants=[], pre_combs=[], post_combs=[])
+        if info.preprogrammed_selectCard != "":
+            return
+        pre_cards, post_cards = checkSelectCardInfo(info)
+        table = None
+        if pre_cards + post_cards > 0:
+            classes, base, cards, picks = buildSelectCardTable(tuple(tuple(comb) for comb in info.pre_combs),
+                                                               tuple(tuple(comb) for comb in info.post_combs))
+            table = [classes.hex(), base, cards.hex(), [list(pick) for pick in picks]]
+        combs = lambda combs: [[[servant, COLOR_ID.get(color, -1)] for servant, color in comb] for comb in combs]
+        self.select_cards[key] = {"target": info.target, "hougu": info.hougu_servants, "pre": combs(info.pre_combs),
+                                  "post": combs(info.post_combs), "table": table}
+
+    def compile(self, script: Script) -> dict:
+        stages = []
+        for stage in script.stages:
+            self.stage_label = stage.label
+            self.select_card_id = 0
+            stages.append([stage.stage, stage.stage_turn, self.compileExists(stage.exists), self.compileBlock(stage.body)])
+            if not self.info.empty():
+                self.commit_select_card_info()
+        return {"version": PLAN_VERSION, "name": self.turn_name, "stages": stages, "selectCards": self.select_cards}
+
+    @staticmethod
+    def compileExists(exists_nodes: list) -> list:
+        # the same lookups as TurnCodeGenerator.existsStr(), the cards are only peeked if an entry read is a list
+        exists = []
+        for node in exists_nodes:
+            if node.servant == -1 and node.color == '*':
+                exists.append(True)
+            elif node.servant > 2:
+                exists.append(0 >= node.count)
+            else:
+                exists.append([(node.servant if node.servant != -1 else 3) * 4 + (COLOR_ID[node.color] if node.color != '*' else 3), node.count])
+        return exists
+
+    def compileBlock(self, statements: list) -> list:
+        body = []
+        for statement in statements:
+            if isinstance(statement, IfStmt):
+                branches = []
+                for branch in statement.branches:
+                    if branch.keyword != "if" and not self.info.empty():
+                        self.commit_select_card_info()
+                        self.select_card_id += 1
+                    branches.append([compileCondition(branch.condition) if branch.condition else None, self.compileBlock(branch.body)])
+                body.append(["if", branches])
+            elif isinstance(statement, ActionLine):
+                body.extend(self.compileActionLine(statement))
+            elif isinstance(statement, HouguDirective):
+                self.info = self.info._replace(hougu_servants=statement.servants)
+                body.append(["cards", f"{self.stage_label}_{self.select_card_id}"])
+            elif isinstance(statement, CardPriorityDirective):
+                self.info = self.info._replace(**{statement.kind + "_combs": statement.combs})
+            elif isinstance(statement, TargetDirective):
+                self.info = self.info._replace(target=statement.target)
+        return body
+
+    def compileActionLine(self, action_line: ActionLine) -> list:
+        body, queue = [], []
+        for action in action_line.actions:
+            if isinstance(action, ServantSkill):
+                queue.append([0, action.servant, action.skill, action.target])
+            elif isinstance(action, MasterSkill):
+                queue.append([1, action.skill, action.targets])
+            else:
+                if queue:
+                    body.append(["skills", queue])
+                    queue = []
+                if not action_line.inline:
+                    self.info = self.info._replace(preprogrammed_selectCard=' '.join([action.name] + action.args))
+                body.append(["call", action.name, [int(arg) if arg.isdigit() else arg for arg in action.args]])
+        if queue:
+            body.append(["skills", queue])
+        return body
+
+
+class TurnCodeGenerator:
+    """
+    Emits the customized Turn class from the AST of a turn script in a single pass.
+    """
+    def __init__(self, turn_name: str):
+        self.turn_name = turn_name
+        self.out = []
+        self.select_card_info_map = {}  # key = stage label + "_" + select_card_id
+        self.stage_label = ""
+        self.select_card_id = 0
+        self.info = SelectCardInfo(target=-1, hougu_servants=[], pre_combs=[], post_combs=[])
+
+    def emit(self, indent: int, code: str):
+        self.out.append(' ' * indent + code + '\n')
+
+    def commit_select_card_info(self):
+        self.select_card_info_map[self.stage_label + "_" + str(self.select_card_id)] = self.info
+        self.info = SelectCardInfo(target=-1, hougu_servants=[], pre_combs=[], post_combs=[])
+
+    def generate(self, script: Script) -> str:
+        self.out.append(
+f'''class {self.turn_name}(CustomTurn):
     def __init__(self):
-        super({turn_name}, self).__init__()''' \
+        super({self.turn_name}, self).__init__()''' \
 r'''
     def __call__(self,turn):
-        self.stage,self.stageTurn=[t:=Detect(.2).getStage(),1+self.stageTurn*(self.stage==t)]
-        if turn==1:
-            Detect.cache.setupServantDead()
-            self.stageTotal=Detect.cache.getStageTotal()
-            self.servant=[(lambda x:(x,)+servantData.get(x,(0,0,0,0,(0,0),((0,0),(0,0),(0,0)))))(Detect.cache.getFieldServant(i))for i in range(3)]
-        else:
-            for i in(i for i in range(3)if Detect.cache.isServantDead(i)):
-                self.servant[i]=(lambda x:(x,)+servantData.get(x,(0,0,0,0,(0,0),((0,0),(0,0),(0,0)))))(Detect.cache.getFieldServant(i))
-                self.countDown[0][i]=[0,0,0]
-        logger.info(f'Turn {turn} Stage {self.stage} StageTurn {self.stageTurn} {[i[0]for i in self.servant]}')
-        if self.stageTurn==1:Detect.cache.setupEnemyGird()
-        self.enemy=[Detect.cache.getEnemyHp(i)for i in range(6)]
-'''
-    indent = 8
-    inTurnBranch = False
-    this_s_st_str = ""
-    this_info = SelectCardInfo(target=-1, hougu_servants=[], pre_eval_str="", post_eval_str="")
-    select_card_info_map = {}
-    last_cmd_line_indent, this_cmd_line_indent = 0, 0
-
-    cmd_lines = []
+        self.prepare(turn)
+''')
+        for stage_id, stage in enumerate(script.stages):
+            self.emitStage(stage, "el" if stage_id > 0 else "")
+        default_indent = FIXED_BASE_INDENT + 4 if script.stages else FIXED_BASE_INDENT
+        if script.stages:
+            self.emit(FIXED_BASE_INDENT, "else:")
+        self.emit(default_indent, "self.dispatchSkill()")
+        self.emit(default_indent, "self.openCards()")
+        self.emit(default_indent, f"timing.perform(self.selectCard(),{CARD_CHAIN_TIMING})")
+
+        # generate selectCard_*() methods
+        for s_st_str, info in self.select_card_info_map.items():
+            self.out.append(generateCustiomizedSelectCard(s_st_str, info))
+        return ''.join(self.out)
+
+    def emitStage(self, stage: Stage, el: str):
+        self.emit(FIXED_BASE_INDENT, el + f"if self.stage=={stage.stage}" +
+                  (f" and self.stageTurn=={stage.stage_turn}" if stage.stage_turn >= 0 else "") + ":")
+        self.stage_label = stage.label
+        self.select_card_id = 0
+        self.emitBlock(stage.body, FIXED_BASE_INDENT + 4)
+        if not self.info.empty():   # when starting a new turn/stage, save the previous one
+            self.commit_select_card_info()
+
+    @staticmethod
+    def existsStr(node: Exists) -> str:
+        # one lookup in the (servant x color) count table BattleSnapshot.hand of the peeked cards, evaluated where the
+        # condition is, so that the cards are only opened if a condition needing them is reached; exists() that need
+        # no card data are constants
+        if node.servant == -1 and node.color == '*':   # invalid condition, let it always be true
+            return "True"
+        if node.servant > 2:    # no card belongs to such a servant
+            return str(0 >= node.count)
+        index = (node.servant if node.servant != -1 else 3) * 4 + (COLOR_ID[node.color] if node.color != '*' else 3)
+        return f"self.peekHand()[{index}]>={node.count}"
+
+    def emitBlock(self, statements: list, indent: int):
+        for statement in statements:
+            if isinstance(statement, IfStmt):
+                for branch in statement.branches:
+                    if branch.keyword != "if" and not self.info.empty():
+                        # If this_info is non-empty when encountering "else" or "elif",
+                        # we assume the user has finished specifying the previous selectCard info.
+                        # the calling of selectCard_xxx() has been inserted when parsing "hougu"
+                        self.commit_select_card_info()
+                        self.select_card_id += 1
+                    self.emit(indent, branch.keyword + (self.conditionStr(branch.condition) if branch.condition else "") + ":")
+                    self.emitBlock(branch.body, indent + 4)
+            elif isinstance(statement, ActionLine):
+                self.emitActionLine(statement, indent)
+            elif isinstance(statement, HouguDirective):
+                self.info = self.info._replace(hougu_servants=statement.servants)
+                self.emit(indent, "self.openCards()")
+                self.emit(indent, f"timing.perform(self.selectCard_{self.stage_label}_{self.select_card_id}(),{CARD_CHAIN_TIMING})")
+            elif isinstance(statement, CardPriorityDirective):
+                self.info = self.info._replace(**{statement.kind + "_combs": statement.combs})
+            elif isinstance(statement, TargetDirective):
+                self.info = self.info._replace(target=statement.target)
+
+    @classmethod
+    def conditionStr(cls, condition: Condition) -> str:
+        cond_str = ""
+        for term in condition.terms:
+            if isinstance(term, Exists):
+                cond_str += " " + cls.existsStr(term)
+            elif isinstance(term, NpRef):   # the NP value when the condition is evaluated
+                cond_str += f" self.snapshot.of(self.skillFrame()).np[{term.servant}]"
+            else:
+                cond_str += " " + term
+        try:    # the condition is python here, only the plans check it term by term
+            compile(cond_str.lstrip(), "<condition>", "eval")
+        except SyntaxError:
+            raise SyntaxError(f"Line {condition.line}: Malformed condition.") from None
+        return cond_str
+
+    def emitActionLine(self, action_line: ActionLine, indent: int):
+        # consecutive skills go to the skill queue as one call, which sends the servant skills as a single macro
+        queue = []
+        for action in action_line.actions + [None]:
+            if isinstance(action, ServantSkill):
+                queue.append(f"(0,{action.servant},{action.skill},{action.target})")
+                continue
+            if isinstance(action, MasterSkill):
+                queue.append(f"(1,{action.skill},{action.targets})")
+                continue
+            if queue:
+                self.emit(indent, f"self.castSkillQueue([{','.join(queue)}])")
+                queue = []
+            if action is not None:
+                if not action_line.inline:  # we may need this info to guide selectCard generation apart from selectCard calling
+                    self.info = self.info._replace(preprogrammed_selectCard=' '.join([action.name] + action.args))
+                self.emit(indent, "self.openCards()")
+                self.emit(indent, f"timing.perform(self.{action.name}(" + "".join(arg + "," for arg in action.args) +
+                                  f"),{CARD_CHAIN_TIMING})")
+                self.emit(indent, "return")
+
+
+def translateTurnScript(turn_name: str, code: str) -> str:
+    return TurnCodeGenerator(turn_name).generate(TurnScriptParser(list(tokenize(code))).parse())
+
+
+def generateCustomizedTurn(file):
+    turn_name = os.path.splitext(os.path.basename(file))[0] + "Turn"
     with open(file) as fp:
-        raw_cmd_lines = fp.readlines()
-        raw_str = ''.join(raw_cmd_lines)
-
-    try:
-        tokens = list(tokenize(raw_str))
-        validator = SyntaxValidator(tokens)
-        validator.validate()
-
-    except (SyntaxError, IndentationError) as e:
-        print(f"Error: {e}")
-
-    for i in range(len(raw_cmd_lines)):
-        cmd_line = raw_cmd_lines[i].split('#')[0]
-        if len(cmd_line.strip()) > 0:
-            cmd_lines.append(cmd_line)
-
-    for line_id, cmd_line in enumerate(cmd_lines):
-        this_cmd_line_indent = len(re.search(r"^(\s*)", cmd_line).group(1))
-        indent += (this_cmd_line_indent - last_cmd_line_indent)
-
-        if turn_start_match := re.search(r"^\s*([sStT])+(\d+)([STst]{0,2})(\d*):\s*$", cmd_line):
-            indent = FIXED_BASE_INDENT
-            assert turn_start_match.group(1).lower() == 's', \
-                f"At line {line_id + 1}, detected " \
-                f"{turn_start_match.group(1) + turn_start_match.group(2) + turn_start_match.group(3) + turn_start_match.group(4)}, " \
-                "but s*(st*) is expected: (stage * stageTurn *).\n"
-            assert turn_start_match.group(3).lower() in {'', 'st'}, "st is expected to indicate stageTurn.\n"
-            class_str += ' ' * indent + ("el" if inTurnBranch else "") + "if self.stage==" + turn_start_match.group(2) + \
-                         (" and self.stageTurn==" + turn_start_match.group(4) if turn_start_match.group(4) else "") + ":\n"
-            inTurnBranch = True
-            if not this_info.empty():   # when starting a new turn/stage, save the previous one
-                select_card_info_map[this_s_st_str + "_" + str(select_card_id_for_this_s_st)] = this_info
-                this_info = SelectCardInfo(target=-1, hougu_servants=[], pre_eval_str="", post_eval_str="")
-            this_s_st_str = cmd_line.strip().replace(":", "")
-            select_card_id_for_this_s_st = 0
-            get_card_info_str_inserted = False
-            exists_flag_num = 0
-            to_replace_toks = {}    # key = (line_id, start_token_id), value = (end, replaced_expr); to replace tokens[key, end)
-            # replaced_expr can be a flag or a subexpression like 0.np (np[0])
-
-            # Check whether we need to peek the cards for this turn/stage.
-            # If yes, insert the code to peek cards and get flag values.
-            for line_j in range(line_id + 1, len(cmd_lines)):
-                if re.search(r"^\s*[sS](\d+)([STst]{0,2})(\d*):\s*$", cmd_lines[line_j]):
-                    break   # stop when next turn/stage starts
-                elif cond_match := re.search(r"^(\s*)([elifs]{2,4})\s*(.*):\s*(.*)$", cmd_lines[line_j]):
-                    # insert get_card_info string
-                    assert cond_match.group(2) in {"if", "else", "elif"}
-                    condition_tokens = list(tokenize(cond_match.group(3)))
-                    tok_id = 0
-                    while tok_id < len(condition_tokens):
-                        if condition_tokens[tok_id].value == "exists":
-                            j = tok_id + 1
-                            exist_tokid = tok_id
-                            servant, card = -1, ""
-                            count = 1
-                            while j < len(condition_tokens):
-                                if condition_tokens[j].value == 'x':
-                                    assert condition_tokens[j-1].type == "INT", "Invalid exists() condition"
-                                    count = int(condition_tokens[j-1].value)
-                                elif condition_tokens[j].value == '.':
-                                    servant = int(condition_tokens[j-1].value if condition_tokens[j-1].type == "INT" else -1)
-                                    card = condition_tokens[j+1].value.lower() if j+1 < len(condition_tokens) else ""
-                                    if servant != -1 or card in {"r", "g", "b"}:
-                                        if not get_card_info_str_inserted:
-                                            get_card_info_str_inserted = True
-                                            class_str += ' ' * (indent + 4) + "fgoDevice.device.perform(' ',(2100,))\n" + \
-                                                         ' ' * (indent + 4) + \
-                                                         "color,sealed,hougu,np,resist,critical,group=" \
-                                                         "Detect().getCardColor()+[i[5][1]for i in self.servant],Detect.cache.isCardSealed()," \
-                                                         "Detect.cache.isHouguReady(),[Detect.cache.getFieldServantNp(i)<100 for i in range(3)]," \
-                                                         "[[1,1.7,.6][i]for i in Detect.cache.getCardResist()]," \
-                                                         "[i/10 for i in Detect.cache.getCardCriticalRate()]," \
-                                                         "[next(j for j,k in enumerate(self.servant)if k[0]==i)" \
-                                                         "for i in Detect.cache.getCardServant([i[0] for i in self.servant if i[0]])]+[0,1,2]\n" + \
-                                                         ' ' * (indent + 4) + "fgoDevice.device.perform(' ',(2100,))\n"
-
-                                        servant_str = f"group[i]=={servant}" if servant != -1 else ""
-                                        color_str = f"color[i]=={0 if card == 'b' else (1 if card == 'g' else 2)}" if card in {"r", "g", "b"} else "True"
-                                        cond_str = servant_str + (" and " + color_str if servant_str and color_str else color_str)
-                                        class_str += " " * (indent + 4) + f"count_{exists_flag_num} = 0\n" + \
-                                                     " " * (indent + 4) + "for i in range(5):\n" + \
-                                                     " " * (indent + 8) + "if " + cond_str + ":\n" + \
-                                                     " " * (indent + 12) + f"count_{exists_flag_num} += 1\n" + \
-                                                     " " * (indent + 4) + f"flag_{exists_flag_num} = count_{exists_flag_num} >= {count}\n"
-                                    else:   # invalid condition, let it always be true
-                                        class_str += " " * (indent + 4) + f"flag_{exists_flag_num} = True\n"
-                                elif condition_tokens[j].value == ')':
-                                    to_replace_toks[(line_j, exist_tokid)] = (j + 1, f"flag_{exists_flag_num}")
-                                    exists_flag_num += 1
-                                    break
-                                j += 1
-                            tok_id = j + 1
-                            continue
-                        elif condition_tokens[tok_id].value == ".":
-                            attribute = condition_tokens[tok_id + 1].value
-                            assert attribute in {"np"}
-                            to_replace_toks[(line_j, tok_id - 1)] = (tok_id + 2, attribute + "["+condition_tokens[tok_id - 1].value+"]")
-                            tok_id += 2
-                            continue
-
-                        tok_id += 1
-            next_line_ind_match = re.search(r"^(\s*).+$", cmd_lines[line_id + 1])
-            if (next_line_ind := len(next_line_ind_match.group(1))) == this_cmd_line_indent:
-                indent = FIXED_BASE_INDENT + 4  # entering the domain of this stage / stageTurn
-            elif next_line_ind < this_cmd_line_indent:
-                raise RuntimeError(f'After "{cmd_line.strip()}", expected the same or more indent in the next line, but found less.\n')
-
-        elif cond_match := re.search(r"^(\s*)([elifs]{2,4})\s*(.*):\s*(.*)$", cmd_line):
-            cond_keyword = cond_match.group(2)
-            if (cond_keyword == "else" or cond_keyword == "elif") and not this_info.empty():
-                # If this_info is non-empty when encountering "else" or "elif",
-                # we assume the user has finished specifying the previous selectCard info.
-                # the calling of selectCard_xxx() has been inserted when parsing "hougu"
-                select_card_info_map[this_s_st_str + "_" + str(select_card_id_for_this_s_st)] = this_info
-                this_info = SelectCardInfo(target=-1, hougu_servants=[], pre_eval_str="", post_eval_str="")
-                select_card_id_for_this_s_st += 1
-
-            condition_tokens = list(tokenize(cond_match.group(3)))
-            # print the conditional expression
-            class_str += ' ' * indent + cond_keyword
-            tok_id = 0
-            while tok_id < len(condition_tokens):
-                if (line_id, tok_id) in to_replace_toks:
-                    end, replaced_expr = to_replace_toks[(line_id, tok_id)]
-                    class_str += " " + replaced_expr
-                    tok_id = end
-                else:
-                    class_str += " " + condition_tokens[tok_id].value
-                    tok_id += 1
-            class_str += ":\n"
-
-            # parse action_str
-            if len(cond_match.group(4)) > 0:
-                indent += 4
-                indent, class_str = parseActionString(indent, cond_match.group(4), class_str)
-                indent -= 4
-
-        elif hougu_match := re.search(r"^(\s*)hougu:(.+)$", cmd_line):
-            hougu_servants = []
-            hougu_tokens = list(tokenize(hougu_match.group(2)))
-            for token in hougu_tokens:
-                if token.type == "INT":
-                    hougu_servants.append(int(token.value))
-            this_info = this_info._replace(hougu_servants=hougu_servants)
-            class_str += ' ' * indent + "fgoDevice.device.perform(' ',(2100,))\n" + \
-                         ' ' * indent + "fgoDevice.device.perform(self.selectCard"+"_"+this_s_st_str+"_"+ \
-                         str(select_card_id_for_this_s_st)+"(),(300,300,2300,1300,6000))\n"
-        elif pre_eval_match := re.search(r"^\s*pre:(.+)$", cmd_line):
-            this_info = this_info._replace(pre_eval_str=pre_eval_match.group(1).strip())
-        elif post_eval_match := re.search(r"^\s*post:(.+)$", cmd_line):
-            this_info = this_info._replace(post_eval_str=post_eval_match.group(1).strip())
-        elif target_match := re.search(r"^\s*target:(\d+)$", cmd_line):
-            this_info = this_info._replace(target=int(target_match.group(1)))
-        else:
-            if "selectCard" in cmd_line:    # we may need this info to guide selectCard generation apart from selectCard calling
-                this_info = this_info._replace(preprogrammed_selectCard=cmd_line.strip())
-            indent, class_str = parseActionString(indent, cmd_line.strip(), class_str)
-        last_cmd_line_indent = this_cmd_line_indent
-
-    if not this_info.empty():
-        # when the input ends, save the previous stage/turn
-        select_card_info_map[this_s_st_str + "_" + str(select_card_id_for_this_s_st)] = this_info
-    class_str += '        else:\n' \
-                 '            self.dispatchSkill()\n' \
-                 '            fgoDevice.device.perform(" ",(2100,))\n' \
-                 '            fgoDevice.device.perform(self.selectCard(),(300,300,2300,1300,6000))\n'
-
-    # generate selectCard_*() methods
-    for s_st_str, this_info in select_card_info_map.items():
-        class_str = generateCustiomizedSelectCard(s_st_str, this_info, class_str)
-    return class_str
+        return translateTurnScript(turn_name, fp.read())
+
+
+def compilePlan(turn_name: str, code: str) -> dict:
+    return PlanCompiler(turn_name).compile(TurnScriptParser(list(tokenize(code))).parse())
+
+
+def generatePlan(file):
+    turn_name = os.path.splitext(os.path.basename(file))[0] + "Turn"
+    with open(file) as fp:
+        return compilePlan(turn_name, fp.read())
+
+
+def generatePlanStub(turn_name: str, plan_path: str) -> str:
+    """The class spliced into fgoKernel.py for a plan: the interpreter, pointed at the plan file."""
+    return f"class {turn_name}(PlanTurn):\n    plan={plan_path!r}\n"
 
 
 if __name__ == '__main__':